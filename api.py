@@ -1,333 +1,922 @@
-# -*- coding: utf-8 -*-
-import re
-import sys
-import csv
-import json
-from typing import List, Dict, Optional
-from urllib.parse import urljoin
-
-import requests
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-# Tạo session dùng lại kết nối + tự động retry khi lỗi tạm thời
-_SESSION: Optional[requests.Session] = None
-
-def _get_session() -> requests.Session:
-	global _SESSION
-	if _SESSION is None:
-		s = requests.Session()
-		retry = Retry(
-			total=3,
-			connect=3,
-			read=3,
-			backoff_factor=1.5,
-			status_forcelist=(429, 500, 502, 503, 504),
-			allowed_methods=("GET", "HEAD"),
-		)
-		s.mount("https://", HTTPAdapter(max_retries=retry))
-		s.mount("http://", HTTPAdapter(max_retries=retry))
-		_SESSION = s
-	return _SESSION
-
-def _safe_get(url: str, headers: Dict[str, str], timeout: int) -> Optional[requests.Response]:
-	try:
-		s = _get_session()
-		resp = s.get(url, headers=headers, timeout=(10, timeout))  # (connect, read)
-		resp.raise_for_status()
-		return resp
-	except Exception:
-		return None
-
-def get_domains(url: str = "https://am.22.cn/ykj/", timeout: int = 20) -> List[str]:
-	"""
-	Trích xuất danh sách tên miền từ trang một cách linh hoạt.
-	- Ưu tiên bắt các link đề xuất có dạng /ykj/chujia_XXXXX.html
-	- Fallback: quét bảng nếu có.
-	"""
-	headers = {
-		"User-Agent": (
-			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-			"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-		),
-		"Accept-Language": "vi,vi-VN;q=0.9,en;q=0.8,zh-CN;q=0.7,zh;q=0.6",
-		"Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-		"Connection": "close",
-	}
-
-	resp = _safe_get(url, headers, timeout)
-	if resp is None:
-		return []
-	resp.encoding = resp.apparent_encoding or resp.encoding
-	soup = BeautifulSoup(resp.text, "html.parser")
-
-	domains: List[str] = []
-
-	# 1) Bắt các anchor trong danh sách đề xuất
-	for a in soup.find_all("a", href=True):
-		href = a["href"]
-		# Các trang chi tiết một giá thường có dạng /ykj/chujia_31435274.html
-		if "/ykj/chujia_" in href:
-			text = a.get_text(strip=True)
-			# tên miền thường chứa dấu chấm và không có khoảng trắng
-			if "." in text and " " not in text:
-				domains.append(text)
-
-	# 2) Fallback: nếu rỗng, thử quét bảng (nếu có render sẵn)
-	if not domains:
-		table = soup.find("table")
-		if table:
-			for row in table.find_all("tr")[1:]:
-				first_link = row.find("a")
-				if first_link:
-					text = first_link.get_text(strip=True)
-					if text and "." in text:
-						domains.append(text)
-				else:
-					cols = row.find_all("td")
-					if cols:
-						cell = cols[0].get_text(strip=True)
-						if cell and "." in cell:
-							domains.append(cell)
-
-	# Khử trùng lặp, giữ nguyên thứ tự
-	seen = set()
-	unique_domains = []
-	for d in domains:
-		d = d.strip()
-		# Lọc ra các chuỗi giống tên miền cơ bản
-		if re.match(r"^[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+$", d) and d not in seen:
-			seen.add(d)
-			unique_domains.append(d)
-
-	return unique_domains
-
-
-def _extract_first(pattern: str, text: str) -> Optional[str]:
-	m = re.search(pattern, text, re.I)
-	return m.group(1) if m else None
-
-
-def get_domain_details(detail_url: str, timeout: int = 20) -> Dict[str, Optional[str]]:
-	"""Lấy chi tiết từ trang domain (giá, registrar, ngày đăng ký, thời gian còn lại, ngày hết hạn)."""
-	headers = {
-		"User-Agent": (
-			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-			"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-		)
-	}
-	r = _safe_get(detail_url, headers, timeout)
-	if r is None:
-		return {
-			"domain": None,
-			"price": None,
-			"registrar": None,
-			"registration_date": None,
-			"time_left": None,
-			"days_to_expire": None,
-			"detail_url": detail_url,
-		}
-	r.encoding = r.apparent_encoding or r.encoding
-	soup = BeautifulSoup(r.text, "html.parser")
-	text = soup.get_text(" ", strip=True)
-
-	# Giá: ưu tiên ¥/￥ nnnn
-	price = _extract_first(r"(?:¥|￥)\s*([0-9][0-9,]*)", text) or _extract_first(r"价格\D*([0-9][0-9,]*)", text)
-	if price:
-		price = price.replace(",", "")
-
-	# Registrar: tìm sau từ '注册商'
-	registrar = _extract_first(r"注册商[:：\s]*([^\s，,。；;]+)", text)
-
-	# Ngày đăng ký: yyyy-mm-dd
-	reg_date = _extract_first(r"(20\d{2}-\d{2}-\d{2})", text)
-
-	# Thời gian còn lại: cụm chứa '剩余时间'
-	time_left = _extract_first(r"剩余时间[:：\s]*([^，,。；;]+)", text)
-
-	# Ngày/Ngày đếm ngược đến hết hạn (距到期)
-	days_to_expire = _extract_first(r"距到期[:：\s]*(\d+)天", text)
-
-	# Tên miền: cố gắng lấy từ tiêu đề hoặc breadcrumbs
-	domain = _extract_first(r"\b([A-Za-z0-9-]+\.[A-Za-z0-9.-]+)\b", text)
-
-	return {
-		"domain": domain,
-		"price": price,
-		"registrar": registrar,
-		"registration_date": reg_date,
-		"time_left": time_left,
-		"days_to_expire": days_to_expire,
-		"detail_url": detail_url,
-	}
-
-
-def get_recommended_items(url: str = "https://am.22.cn/ykj/", limit: int = 20) -> List[Dict[str, str]]:
-	"""Trả về danh sách {domain, detail_url} từ trang chính/đề xuất."""
-	headers = {
-		"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125 Safari/537.36"
-	}
-	resp = _safe_get(url, headers, 20)
-	if resp is None:
-		return []
-	resp.encoding = resp.apparent_encoding or resp.encoding
-	soup = BeautifulSoup(resp.text, "html.parser")
-
-	items: List[Dict[str, str]] = []
-	for a in soup.find_all("a", href=True):
-		href = a["href"]
-		if "/ykj/chujia_" in href:
-			domain = a.get_text(strip=True)
-			if "." in domain and " " not in domain:
-				items.append({
-					"domain": domain,
-					"detail_url": urljoin(url, href)
-				})
-				if len(items) >= limit:
-					break
-	return items
-
-
-def get_table_rows(url: str = "https://am.22.cn/ykj/", limit: int = 20) -> List[Dict[str, Optional[str]]]:
-	"""Parse bảng danh sách chính để lấy đầy đủ cột.
-	Trả về list các dict: domain, summary, registrar, price, time_left, registration_date, days_to_expire, detail_url
-	"""
-	headers = {
-		"User-Agent": (
-			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-			"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-		),
-		"Accept-Language": "vi,vi-VN;q=0.9,en;q=0.8,zh-CN;q=0.7,zh;q=0.6",
-	}
-	resp = _safe_get(url, headers, 20)
-	if resp is None:
-		return []
-	resp.encoding = resp.apparent_encoding or resp.encoding
-	soup = BeautifulSoup(resp.text, "html.parser")
-
-	# Tìm table có các header quen thuộc
-	candidate_tables = soup.find_all("table")
-	table = None
-	for t in candidate_tables:
-		head_text = t.get_text(" ", strip=True)
-		if all(k in head_text for k in ["名称", "当前价格", "剩余时间"]):
-			table = t
-			break
-	if table is None and candidate_tables:
-		table = candidate_tables[0]
-
-	rows: List[Dict[str, Optional[str]]] = []
-	if not table:
-		return rows
-
-	for tr in table.find_all("tr"):
-		tds = tr.find_all(["td", "th"])
-		if not tds or tds[0].name == "th":
-			# bỏ header
-			continue
-		try:
-			# Cột 0: tên miền (có thẻ a)
-			a = tds[0].find("a")
-			domain = a.get_text(strip=True) if a else tds[0].get_text(strip=True)
-			detail_url = urljoin(url, a["href"]) if a and a.has_attr("href") else None
-
-			summary = tds[1].get_text(strip=True) if len(tds) > 1 else None
-			registrar = tds[2].get_text(strip=True) if len(tds) > 2 else None
-			price = tds[3].get_text(strip=True) if len(tds) > 3 else None
-			time_left = tds[4].get_text(strip=True) if len(tds) > 4 else None
-			registration_date = tds[5].get_text(strip=True) if len(tds) > 5 else None
-			days_to_expire = tds[6].get_text(strip=True) if len(tds) > 6 else None
-
-			if domain and "." in domain:
-				rows.append({
-					"domain": domain,
-					"summary": summary,
-					"registrar": registrar,
-					"price": price,
-					"time_left": time_left,
-					"registration_date": registration_date,
-					"days_to_expire": days_to_expire,
-					"detail_url": detail_url,
-				})
-				if len(rows) >= limit:
-					break
-		except Exception:
-			continue
-
-	return rows
-
-if __name__ == "__main__":
-	try:
-		# CLI đơn giản: python api.py [url] [--limit N] [--csv out.csv] [--json out.json] [--details]
-		url = "https://am.22.cn/ykj/"
-		limit = 20
-		out_csv: Optional[str] = None
-		out_json: Optional[str] = None
-		with_details = False
-
-		args = sys.argv[1:]
-		i = 0
-		while i < len(args):
-			a = args[i]
-			if a.startswith("http"):
-				url = a
-			elif a == "--limit" and i + 1 < len(args):
-				limit = int(args[i + 1])
-				i += 1
-			elif a == "--csv" and i + 1 < len(args):
-				out_csv = args[i + 1]
-				i += 1
-			elif a == "--json" and i + 1 < len(args):
-				out_json = args[i + 1]
-				i += 1
-			elif a == "--details":
-				with_details = True
-			i += 1
-
-		items = get_recommended_items(url, limit=limit)
-		if not items:
-			# Fallback: chỉ in danh sách domain nếu có
-			domains = get_domains(url)
-			if not domains:
-				print("Không tìm thấy tên miền nào (trang có thể render bằng JS).")
-				sys.exit(0)
-			for d in domains:
-				print(d)
-			sys.exit(0)
-
-		results: List[Dict[str, Optional[str]]] = []
-		if with_details:
-			for it in items:
-				details = get_domain_details(it["detail_url"])
-				# Ghi đè domain nếu thiếu ở chi tiết
-				if not details.get("domain"):
-					details["domain"] = it["domain"]
-				results.append(details)
-		else:
-			results = items  # chỉ domain + link
-
-		# In ra console
-		for r in results:
-			if with_details:
-				print(f"{r.get('domain','')}\t¥{r.get('price','?')}\t{r.get('registration_date','')}\t{r.get('days_to_expire','')}天\t{r.get('detail_url','')}")
-			else:
-				print(f"{r['domain']}\t{r['detail_url']}")
-
-		# Ghi file nếu cần
-		if out_csv:
-			fieldnames = list(results[0].keys()) if results else ["domain", "detail_url"]
-			with open(out_csv, "w", newline="", encoding="utf-8-sig") as f:
-				writer = csv.DictWriter(f, fieldnames=fieldnames)
-				writer.writeheader()
-				for r in results:
-					writer.writerow(r)
-			print(f"Đã ghi CSV: {out_csv}")
-
-		if out_json:
-			with open(out_json, "w", encoding="utf-8") as f:
-				json.dump(results, f, ensure_ascii=False, indent=2)
-			print(f"Đã ghi JSON: {out_json}")
-
-	except Exception as e:
-		print(f"Lỗi khi lấy dữ liệu: {e}")
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import codecs
+import hashlib
+import json
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+import fetcher
+import metrics
+from detail_cache import DetailCache, default_cache
+from json_api import load_spec, pick_endpoint, query_listing
+from exporters import open_sinks, parse_duration, parse_size
+from listing import ListingBatch
+from pipeline import crawl_batches_parallel, fetch_details_parallel
+from parsers import BuynowStreamParser, listing_id_from_url, parse_listing, sniff_encoding
+
+# Tạo session dùng lại kết nối; thử lại / hạn chót / circuit breaker do fetcher.request lo
+_SESSION: Optional[requests.Session] = None
+# Số kết nối tối đa giữ trong pool cho mỗi host (giới hạn luôn số luồng tải song song)
+_POOL_MAXSIZE = 32
+
+def _get_session() -> requests.Session:
+	global _SESSION
+	if _SESSION is None:
+		s = requests.Session()
+		adapter = HTTPAdapter(max_retries=0, pool_connections=8, pool_maxsize=_POOL_MAXSIZE)
+		s.mount("https://", adapter)
+		s.mount("http://", adapter)
+		_SESSION = s
+	return _SESSION
+
+def _get_with_error(url: str, headers: Dict[str, str], timeout: int) -> Tuple[Optional[requests.Response], Optional[str]]:
+	"""Như _safe_get nhưng trả thêm mô tả lỗi (None nếu thành công), dạng "<loại>: <chi tiết>"
+	với loại thuộc fetcher.KINDS (timeout, http_5xx, circuit_open, deadline...)."""
+	metrics.inc("http_requests")
+	with metrics.span("fetch"):
+		resp, err = fetcher.request(_get_session(), url, headers, timeout)
+	if err is not None:
+		metrics.inc("http_errors")
+		return None, str(err)
+	metrics.inc("bytes_downloaded", len(resp.content))
+	return resp, None
+
+
+def _detect_encoding(resp: requests.Response) -> None:
+	"""Đặt resp.encoding theo charset dò từ nội dung (chậm với trang lớn -> đo riêng)."""
+	with metrics.span("encoding"):
+		resp.encoding = resp.apparent_encoding or resp.encoding
+
+def _safe_get(url: str, headers: Dict[str, str], timeout: int) -> Optional[requests.Response]:
+	resp, _ = _get_with_error(url, headers, timeout)
+	return resp
+
+def get_domains(url: str = "https://am.22.cn/ykj/", timeout: int = 20) -> List[str]:
+	"""
+	Trích xuất danh sách tên miền từ trang một cách linh hoạt.
+	- Ưu tiên bắt các link đề xuất có dạng /ykj/chujia_XXXXX.html
+	- Fallback: quét bảng nếu có.
+	"""
+	headers = {
+		"User-Agent": (
+			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+			"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+		),
+		"Accept-Language": "vi,vi-VN;q=0.9,en;q=0.8,zh-CN;q=0.7,zh;q=0.6",
+		"Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+		"Connection": "close",
+	}
+
+	resp = _safe_get(url, headers, timeout)
+	if resp is None:
+		return []
+	_detect_encoding(resp)
+	with metrics.span("parse.domains"):
+		return parse_domains(resp.text)
+
+
+def parse_domains(html: str) -> List[str]:
+	"""Phần parse của get_domains trên HTML đã tải sẵn."""
+	soup = BeautifulSoup(html, "html.parser")
+
+	domains: List[str] = []
+
+	# 1) Bắt các anchor trong danh sách đề xuất
+	for a in soup.find_all("a", href=True):
+		href = a["href"]
+		# Các trang chi tiết một giá thường có dạng /ykj/chujia_31435274.html
+		if "/ykj/chujia_" in href:
+			text = a.get_text(strip=True)
+			# tên miền thường chứa dấu chấm và không có khoảng trắng
+			if "." in text and " " not in text:
+				domains.append(text)
+
+	# 2) Fallback: nếu rỗng, thử quét bảng (nếu có render sẵn)
+	if not domains:
+		table = soup.find("table")
+		if table:
+			for row in table.find_all("tr")[1:]:
+				first_link = row.find("a")
+				if first_link:
+					text = first_link.get_text(strip=True)
+					if text and "." in text:
+						domains.append(text)
+				else:
+					cols = row.find_all("td")
+					if cols:
+						cell = cols[0].get_text(strip=True)
+						if cell and "." in cell:
+							domains.append(cell)
+
+	# Khử trùng lặp, giữ nguyên thứ tự
+	seen = set()
+	unique_domains = []
+	for d in domains:
+		d = d.strip()
+		# Lọc ra các chuỗi giống tên miền cơ bản
+		if re.match(r"^[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+$", d) and d not in seen:
+			seen.add(d)
+			unique_domains.append(d)
+
+	return unique_domains
+
+
+def _extract_first(pattern: str, text: str) -> Optional[str]:
+	m = re.search(pattern, text, re.I)
+	return m.group(1) if m else None
+
+
+def _empty_details(detail_url: str) -> Dict[str, Optional[str]]:
+	return {
+		"domain": None,
+		"price": None,
+		"registrar": None,
+		"registration_date": None,
+		"time_left": None,
+		"days_to_expire": None,
+		"detail_url": detail_url,
+	}
+
+
+def _fetch_domain_details(detail_url: str, timeout: int = 20) -> Tuple[Dict[str, Optional[str]], Optional[str]]:
+	headers = {
+		"User-Agent": (
+			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+			"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+		)
+	}
+	r, err = _get_with_error(detail_url, headers, timeout)
+	if r is None:
+		return _empty_details(detail_url), err
+	_detect_encoding(r)
+	with metrics.span("parse.details"):
+		return parse_domain_details(r.text, detail_url), None
+
+
+def parse_domain_details(html: str, detail_url: str) -> Dict[str, Optional[str]]:
+	"""Phần parse của get_domain_details trên HTML trang chi tiết đã tải sẵn."""
+	soup = BeautifulSoup(html, "html.parser")
+	text = soup.get_text(" ", strip=True)
+
+	# Giá: ưu tiên ¥/￥ nnnn
+	price = _extract_first(r"(?:¥|￥)\s*([0-9][0-9,]*)", text) or _extract_first(r"价格\D*([0-9][0-9,]*)", text)
+	if price:
+		price = price.replace(",", "")
+
+	# Registrar: tìm sau từ '注册商'
+	registrar = _extract_first(r"注册商[:：\s]*([^\s，,。；;]+)", text)
+
+	# Ngày đăng ký: yyyy-mm-dd
+	reg_date = _extract_first(r"(20\d{2}-\d{2}-\d{2})", text)
+
+	# Thời gian còn lại: cụm chứa '剩余时间'
+	time_left = _extract_first(r"剩余时间[:：\s]*([^，,。；;]+)", text)
+
+	# Ngày/Ngày đếm ngược đến hết hạn (距到期)
+	days_to_expire = _extract_first(r"距到期[:：\s]*(\d+)天", text)
+
+	# Tên miền: cố gắng lấy từ tiêu đề hoặc breadcrumbs
+	domain = _extract_first(r"\b([A-Za-z0-9-]+\.[A-Za-z0-9.-]+)\b", text)
+
+	return {
+		"domain": domain,
+		"price": price,
+		"registrar": registrar,
+		"registration_date": reg_date,
+		"time_left": time_left,
+		"days_to_expire": days_to_expire,
+		"detail_url": detail_url,
+	}
+
+
+def _cached_details(detail_url: str, use_cache: bool, fields: Optional[Tuple[str, ...]]) -> Tuple[Optional[DetailCache], Optional[int], Optional[Dict[str, Optional[str]]]]:
+	cache = default_cache() if use_cache else None
+	listing_id = listing_id_from_url(detail_url) if cache is not None else None
+	if listing_id is None:
+		return None, None, None
+	hit = cache.get(listing_id, fields)
+	if hit is not None:
+		hit["detail_url"] = detail_url
+	return cache, listing_id, hit
+
+
+def get_domain_details(
+	detail_url: str,
+	timeout: int = 20,
+	use_cache: bool = True,
+	fields: Optional[Tuple[str, ...]] = None,
+) -> Dict[str, Optional[str]]:
+	"""Lấy chi tiết từ trang domain (giá, registrar, ngày đăng ký, thời gian còn lại, ngày hết hạn).
+	Kết quả được cache theo mã listing (detail_cache.py); `fields` là các trường caller cần còn hạn,
+	`use_cache=False` để luôn tải lại.
+	"""
+	cache, listing_id, hit = _cached_details(detail_url, use_cache, fields)
+	if hit is not None:
+		return hit
+	details, err = _fetch_domain_details(detail_url, timeout)
+	if cache is not None and err is None:
+		cache.put(listing_id, details)
+	return details
+
+
+# Semaphore giới hạn số request đang chạy trên mỗi host (dùng chung giữa các lô)
+_HOST_LIMITS: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+_HOST_LIMITS_LOCK = threading.Lock()
+
+def _host_semaphore(url: str, per_host: int) -> threading.BoundedSemaphore:
+	key = (urlsplit(url).netloc.lower(), per_host)
+	with _HOST_LIMITS_LOCK:
+		sem = _HOST_LIMITS.get(key)
+		if sem is None:
+			sem = threading.BoundedSemaphore(per_host)
+			_HOST_LIMITS[key] = sem
+		return sem
+
+
+def get_domain_details_many(
+	urls: List[str],
+	concurrency: int = 8,
+	per_host: int = 4,
+	timeout: int = 20,
+	use_cache: bool = True,
+	fields: Optional[Tuple[str, ...]] = None,
+) -> List[Dict[str, Optional[str]]]:
+	"""Lấy chi tiết nhiều trang song song (thread pool, dùng chung pool kết nối của session).
+	- Kết quả giữ đúng thứ tự của `urls`.
+	- Mỗi dict có thêm khóa "error": None nếu thành công, ngược lại là mô tả lỗi của URL đó.
+	- `per_host` giới hạn số request đồng thời tới cùng một host.
+	- `use_cache`/`fields`: như get_domain_details; URL có trong cache không tốn request.
+	"""
+	if not urls:
+		return []
+	concurrency = max(1, min(concurrency, _POOL_MAXSIZE, len(urls)))
+	per_host = max(1, per_host)
+	_get_session()  # khởi tạo session trước khi chia luồng
+
+	def _one(u: str) -> Dict[str, Optional[str]]:
+		if not u:
+			out = _empty_details(u)
+			out["error"] = "empty url"
+			return out
+		cache, listing_id, hit = _cached_details(u, use_cache, fields)
+		if hit is not None:
+			hit["error"] = None
+			return hit
+		with _host_semaphore(u, per_host):
+			try:
+				details, err = _fetch_domain_details(u, timeout)
+			except Exception as e:
+				details, err = _empty_details(u), f"{type(e).__name__}: {e}"
+		if cache is not None and err is None:
+			cache.put(listing_id, details)
+		details["error"] = err
+		return details
+
+	with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="details") as pool:
+		return list(pool.map(_one, urls))
+
+
+def get_recommended_items(url: str = "https://am.22.cn/ykj/", limit: int = 20) -> List[Dict[str, str]]:
+	"""Trả về danh sách {domain, detail_url} từ trang chính/đề xuất."""
+	headers = {
+		"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125 Safari/537.36"
+	}
+	resp = _safe_get(url, headers, 20)
+	if resp is None:
+		return []
+	_detect_encoding(resp)
+	with metrics.span("parse.recommended"):
+		return parse_recommended_items(resp.text, url, limit)
+
+
+def parse_recommended_items(html: str, url: str = "https://am.22.cn/ykj/", limit: int = 20) -> List[Dict[str, str]]:
+	"""Phần parse của get_recommended_items trên HTML đã tải sẵn."""
+	soup = BeautifulSoup(html, "html.parser")
+
+	items: List[Dict[str, str]] = []
+	for a in soup.find_all("a", href=True):
+		href = a["href"]
+		if "/ykj/chujia_" in href:
+			domain = a.get_text(strip=True)
+			if "." in domain and " " not in domain:
+				items.append({
+					"domain": domain,
+					"detail_url": urljoin(url, href)
+				})
+				if len(items) >= limit:
+					break
+	return items
+
+
+TABLE_FIELDS = ["domain", "summary", "registrar", "price", "time_left", "registration_date", "days_to_expire", "detail_url"]
+
+_LISTING_HEADERS = {
+	"User-Agent": (
+		"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+		"(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+	),
+	"Accept-Language": "vi,vi-VN;q=0.9,en;q=0.8,zh-CN;q=0.7,zh;q=0.6",
+}
+
+
+def parse_table_rows(
+	html: str,
+	url: str = "https://am.22.cn/ykj/",
+	limit: Optional[int] = 20,
+	backend: Optional[str] = None,
+) -> List[Dict[str, Optional[str]]]:
+	"""Parse HTML bảng danh sách (đã tải sẵn). `limit=None` để lấy hết các hàng.
+	`backend`: auto | attrs | selectolax | lxml | bs4 (xem parsers.py), mặc định theo LISTING_PARSER.
+	"""
+	with metrics.span("parse.listing"):
+		rows = parse_listing(html, url, limit, backend)
+	metrics.inc("rows_parsed", len(rows))
+	return rows
+
+
+def get_table_rows(url: str = "https://am.22.cn/ykj/", limit: int = 20, backend: Optional[str] = None) -> List[Dict[str, Optional[str]]]:
+	"""Parse bảng danh sách chính để lấy đầy đủ cột.
+	Trả về list các dict: domain, summary, registrar, price, time_left, registration_date, days_to_expire, detail_url
+	"""
+	resp = _safe_get(url, dict(_LISTING_HEADERS), 20)
+	if resp is None:
+		return []
+	_detect_encoding(resp)
+	return parse_table_rows(resp.text, url, limit, backend)
+
+
+def stream_table_rows(
+	url: str = "https://am.22.cn/ykj/",
+	limit: Optional[int] = 20,
+	timeout: int = 20,
+	chunk_size: int = 8192,
+	backend: Optional[str] = None,
+	conditional: bool = False,
+) -> Optional[List[Dict[str, Optional[str]]]]:
+	"""Như get_table_rows nhưng tải dạng stream và parse tăng dần từng khúc byte.
+	- Encoding lấy từ header/BOM/thẻ meta ở phần đầu, không dò charset trên toàn bộ body.
+	- Đóng kết nối ngay khi đã đủ `limit` hàng hoặc đã hết tbody#buynow_list.
+	- Nếu trang không có tbody#buynow_list thì parse toàn bộ nội dung đã tải bằng `backend`.
+	- `conditional=True`: gửi If-None-Match/If-Modified-Since, trả về None khi server báo 304.
+	- Lỗi mạng khi tải hoặc khi đang đọc body: trả về [] (không trả phần đã parse được).
+	"""
+	headers = dict(_LISTING_HEADERS)
+	if conditional:
+		_add_conditional_headers(url, headers)
+	metrics.inc("http_requests")
+	with metrics.span("fetch"):
+		resp, err = fetcher.request(_get_session(), url, headers, timeout, stream=True)
+	if err is not None:
+		metrics.inc("http_errors")
+		return []
+	if conditional:
+		if resp.status_code == 304:
+			resp.close()
+			return None
+		_remember_validators(url, resp)
+	parser = BuynowStreamParser(url, limit)
+	decoder = None
+	head = b""
+	text_parts: List[str] = []
+	try:
+		for chunk in resp.iter_content(chunk_size=chunk_size):
+			if not chunk:
+				continue
+			metrics.inc("bytes_downloaded", len(chunk))
+			if decoder is None:
+				# Gom đủ vài KB đầu để đọc được thẻ <meta charset>
+				head += chunk
+				if len(head) < 4096:
+					continue
+				chunk, head = head, b""
+				decoder = codecs.getincrementaldecoder(sniff_encoding(resp.headers.get("Content-Type"), chunk))("replace")
+			text = decoder.decode(chunk)
+			parser.feed(text)
+			if parser.done:
+				break
+			if not parser.found:
+				text_parts.append(text)
+		else:
+			if decoder is None and head:
+				decoder = codecs.getincrementaldecoder(sniff_encoding(resp.headers.get("Content-Type"), head))("replace")
+				text = decoder.decode(head)
+				parser.feed(text)
+				text_parts.append(text)
+			if decoder is not None:
+				tail = decoder.decode(b"", final=True)
+				parser.feed(tail)
+				text_parts.append(tail)
+			parser.close()
+	except (requests.RequestException, LookupError, UnicodeError):
+		# Đứt kết nối / timeout khi đọc / lỗi giải mã giữa chừng: trang dở dang không được coi là
+		# trang hợp lệ (hàng thiếu sẽ thành "đã gỡ" / "không có mục mới") -> vòng này lỗi
+		metrics.inc("http_errors")
+		if conditional:
+			_VALIDATORS.pop(url, None)  # chưa parse được trang này: lần sau đừng nhận 304
+		return []
+	finally:
+		resp.close()
+
+	if parser.found:
+		metrics.inc("rows_parsed", len(parser.rows))
+		return parser.rows
+	return parse_table_rows("".join(text_parts), url, limit, backend)
+
+
+_SPEC_CACHE: Dict[str, Optional[Dict]] = {}
+
+
+def get_table_rows_api(
+	spec_path: str,
+	limit: Optional[int] = 20,
+	fallback_url: Optional[str] = None,
+	registrar: Optional[str] = None,
+	min_price: Optional[float] = None,
+	max_price: Optional[float] = None,
+	page_size: Optional[int] = None,
+	page: Optional[int] = None,
+) -> List[Dict[str, Optional[str]]]:
+	"""Lấy hàng qua endpoint JSON nội bộ đã bắt bằng discover_api.py (xem json_api.py).
+	Lỗi hoặc không có hàng: nếu có `fallback_url` thì quay về parse HTML bằng get_table_rows.
+	"""
+	if spec_path not in _SPEC_CACHE:
+		try:
+			_SPEC_CACHE[spec_path] = pick_endpoint(load_spec(spec_path))
+		except Exception:
+			_SPEC_CACHE[spec_path] = None
+	endpoint = _SPEC_CACHE[spec_path]
+	rows: List[Dict[str, Optional[str]]] = []
+	if endpoint is not None:
+		try:
+			rows = query_listing(
+				endpoint, session=_get_session(), registrar=registrar, min_price=min_price,
+				max_price=max_price, page_size=page_size, page=page,
+			)
+		except Exception:
+			rows = []
+	if not rows and fallback_url:
+		return get_table_rows(fallback_url, limit=limit or 20)
+	return rows[:limit] if limit is not None else rows
+
+
+# Validator HTTP (ETag, Last-Modified) và dấu vân tay vùng buynow_list theo URL
+_VALIDATORS: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+_FINGERPRINTS: Dict[str, str] = {}
+CONDITIONAL_STATS: Dict[str, int] = {"not_modified": 0, "unchanged": 0, "changed": 0}
+
+
+def _add_conditional_headers(url: str, headers: Dict[str, str]) -> None:
+	etag, last_modified = _VALIDATORS.get(url, (None, None))
+	if etag:
+		headers["If-None-Match"] = etag
+	if last_modified:
+		headers["If-Modified-Since"] = last_modified
+
+
+def _remember_validators(url: str, resp: requests.Response) -> None:
+	etag = resp.headers.get("ETag")
+	last_modified = resp.headers.get("Last-Modified")
+	if etag or last_modified:
+		_VALIDATORS[url] = (etag, last_modified)
+
+
+def _changed(url: str, fingerprint: str) -> bool:
+	if _FINGERPRINTS.get(url) == fingerprint:
+		CONDITIONAL_STATS["unchanged"] += 1
+		return False
+	_FINGERPRINTS[url] = fingerprint
+	CONDITIONAL_STATS["changed"] += 1
+	return True
+
+
+def reset_fingerprint(url: str) -> None:
+	"""Quên validator + dấu vân tay của `url` để lần gọi sau luôn tải và parse lại."""
+	_VALIDATORS.pop(url, None)
+	_FINGERPRINTS.pop(url, None)
+
+
+def get_table_rows_if_changed(
+	url: str = "https://am.22.cn/ykj/",
+	limit: int = 20,
+	backend: Optional[str] = None,
+	stream: bool = False,
+) -> Optional[List[Dict[str, Optional[str]]]]:
+	"""Như get_table_rows nhưng trả về None nếu trang không đổi so với lần gọi trước:
+	- server trả 304 cho If-None-Match/If-Modified-Since (nếu server có hỗ trợ), hoặc
+	- hash của vùng tbody#buynow_list (stream: của các hàng đã parse) trùng lần trước,
+	  khi đó bỏ qua luôn bước parse.
+	Lỗi tải trả về [] như get_table_rows (và không ghi nhận dấu vân tay).
+	"""
+	if stream:
+		rows = stream_table_rows(url, limit=limit, backend=backend, conditional=True)
+		if rows is None:
+			CONDITIONAL_STATS["not_modified"] += 1
+			return None
+		if not rows:
+			return rows
+		digest = hashlib.blake2b(repr(rows).encode("utf-8"), digest_size=16).hexdigest()
+		return rows if _changed(url, digest) else None
+
+	headers = dict(_LISTING_HEADERS)
+	_add_conditional_headers(url, headers)
+	resp = _safe_get(url, headers, 20)
+	if resp is None:
+		return []
+	if resp.status_code == 304:
+		CONDITIONAL_STATS["not_modified"] += 1
+		return None
+	_remember_validators(url, resp)
+	# Hash trên byte thô để trang không đổi khỏi tốn cả bước dò encoding lẫn parse
+	content = resp.content
+	start = content.find(b"buynow_list")
+	end = content.find(b"</tbody>", start) if start >= 0 else -1
+	region = content[start:end] if start >= 0 and end >= 0 else content
+	if not _changed(url, hashlib.blake2b(region, digest_size=16).hexdigest()):
+		return None
+	_detect_encoding(resp)
+	return parse_table_rows(resp.text, url, limit, backend)
+
+
+# Phân trang của am.22.cn/ykj/: số trang qua query, số dòng/trang lấy từ cookie
+# (nút <a name="a_change_pagecount" data="200"> đặt cookie rồi tải lại trang)
+PAGE_PARAM = "page"
+PAGE_SIZE_PARAM = "pagecount"
+PAGE_SIZE_COOKIE = "pagecount"
+MAX_PAGE_SIZE = 200
+
+_PAGE_COUNT_RES = [
+	re.compile(r"共\s*(\d+)\s*页"),
+	re.compile(r"[?&]page=(\d+)", re.I),
+	re.compile(r"gotopage\(\s*(\d+)\s*\)", re.I),
+]
+
+
+def page_url(url: str, page: int, page_size: int = MAX_PAGE_SIZE) -> str:
+	"""Dựng URL cho trang `page` (bắt đầu từ 1) của danh sách."""
+	parts = urlsplit(url)
+	query = dict(parse_qsl(parts.query, keep_blank_values=True))
+	query[PAGE_PARAM] = str(page)
+	query[PAGE_SIZE_PARAM] = str(page_size)
+	return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+def find_page_count(html: str) -> Tuple[Optional[int], bool]:
+	"""Đoán số trang từ thanh phân trang: (N, True) nếu có "共N页"; không thì (link ?page=N lớn
+	nhất, False) - thanh phân trang chỉ hiện vài trang quanh trang hiện tại nên đó chỉ là cận dưới."""
+	m = _PAGE_COUNT_RES[0].search(html)
+	if m:
+		return int(m.group(1)), True
+	pages = [int(x) for rx in _PAGE_COUNT_RES[1:] for x in rx.findall(html)]
+	return (max(pages) if pages else None), False
+
+
+def _fetch_listing_page(url: str, page: int, page_size: int, timeout: int = 20) -> Optional[str]:
+	headers = dict(_LISTING_HEADERS)
+	headers["Cookie"] = f"{PAGE_SIZE_COOKIE}={page_size}"
+	resp = _safe_get(page_url(url, page, page_size), headers, timeout)
+	if resp is None:
+		return None
+	_detect_encoding(resp)
+	return resp.text
+
+
+def _load_cursor(path: str, url: str) -> Optional[int]:
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			data = json.load(f)
+		if data.get("url") == url:
+			return int(data["next_page"])
+	except Exception:
+		pass
+	return None
+
+
+def _save_cursor(path: str, url: str, next_page: int, page_count: Optional[int]) -> None:
+	try:
+		tmp = path + ".tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump({"url": url, "next_page": next_page, "page_count": page_count}, f)
+		os.replace(tmp, path)
+	except Exception:
+		pass
+
+
+def crawl_pages(
+	url: str = "https://am.22.cn/ykj/",
+	page_size: int = MAX_PAGE_SIZE,
+	start_page: Optional[int] = None,
+	max_pages: Optional[int] = None,
+	concurrency: int = 4,
+	cursor_path: Optional[str] = None,
+	backend: Optional[str] = None,
+) -> Iterator[List[Dict[str, Optional[str]]]]:
+	"""Duyệt toàn bộ danh sách 一口价, trả về danh sách hàng của từng trang (generator).
+	- Tải trước tối đa `concurrency` trang song song nhưng vẫn trả hàng theo đúng thứ tự trang,
+	  nên bộ nhớ chỉ giữ vài trang cùng lúc.
+	- `cursor_path`: file JSON lưu trang kế tiếp sau mỗi trang đã trả xong; chạy lại sẽ tiếp tục
+	  từ đó (một trang có thể bị trả lại nếu dừng giữa chừng). File bị xóa khi duyệt xong.
+	- Nếu không đọc được "共N页" (chỉ có link phân trang, là cận dưới) thì dừng ở trang rỗng đầu tiên.
+	"""
+	page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+	if start_page is None:
+		start_page = (_load_cursor(cursor_path, url) if cursor_path else None) or 1
+
+	first_html = _fetch_listing_page(url, start_page, page_size)
+	if first_html is None:
+		return
+	page_count, exact = find_page_count(first_html)
+	last_page = page_count if exact else None
+	if max_pages is not None:
+		last_page = min(last_page, start_page + max_pages - 1) if last_page else start_page + max_pages - 1
+
+	def _done(page: int) -> None:
+		if cursor_path:
+			_save_cursor(cursor_path, url, page + 1, page_count)
+
+	rows = parse_table_rows(first_html, url, limit=None, backend=backend)
+	del first_html
+	if rows:
+		yield rows
+	_done(start_page)
+	if not rows or (last_page is not None and start_page >= last_page):
+		if cursor_path and os.path.exists(cursor_path):
+			os.remove(cursor_path)
+		return
+
+	_get_session()
+	concurrency = max(1, min(concurrency, _POOL_MAXSIZE))
+	next_page = start_page + 1
+	pending: "deque[Tuple[int, Future]]" = deque()
+	finished = False
+	with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="crawl") as pool:
+		try:
+			while True:
+				# Giữ cửa sổ `concurrency` trang đang tải
+				while len(pending) < concurrency and (last_page is None or next_page <= last_page):
+					pending.append((next_page, pool.submit(_fetch_listing_page, url, next_page, page_size)))
+					next_page += 1
+				if not pending:
+					finished = True
+					break
+				page, fut = pending.popleft()
+				html = fut.result()
+				if html is None:
+					# Lỗi mạng: dừng lại, cursor vẫn trỏ tới trang này để chạy lại sau
+					break
+				rows = parse_table_rows(html, url, limit=None, backend=backend)
+				del html
+				if not rows and last_page is None:
+					finished = True
+					break
+				yield rows
+				_done(page)
+		finally:
+			for _, fut in pending:
+				fut.cancel()
+	if finished and cursor_path and os.path.exists(cursor_path):
+		os.remove(cursor_path)
+
+
+def crawl_table_rows(
+	url: str = "https://am.22.cn/ykj/",
+	page_size: int = MAX_PAGE_SIZE,
+	start_page: Optional[int] = None,
+	max_pages: Optional[int] = None,
+	concurrency: int = 4,
+	cursor_path: Optional[str] = None,
+	backend: Optional[str] = None,
+) -> Iterator[Dict[str, Optional[str]]]:
+	"""Như crawl_pages nhưng trả về từng hàng."""
+	for rows in crawl_pages(url, page_size, start_page, max_pages, concurrency, cursor_path, backend):
+		yield from rows
+
+
+def crawl_batches(
+	url: str = "https://am.22.cn/ykj/",
+	page_size: int = MAX_PAGE_SIZE,
+	start_page: Optional[int] = None,
+	max_pages: Optional[int] = None,
+	concurrency: int = 4,
+	cursor_path: Optional[str] = None,
+	backend: Optional[str] = None,
+) -> Iterator[ListingBatch]:
+	"""Như crawl_pages nhưng mỗi trang là một ListingBatch (cột có kiểu, ít bộ nhớ hơn list dict).
+	Dict thô của trang bị bỏ ngay sau khi chuyển, nên giữ nhiều lô cùng lúc vẫn rẻ."""
+	for rows in crawl_pages(url, page_size, start_page, max_pages, concurrency, cursor_path, backend):
+		yield ListingBatch(rows)
+
+
+def get_listings(url: str = "https://am.22.cn/ykj/", limit: int = 20, backend: Optional[str] = None) -> ListingBatch:
+	"""get_table_rows dạng có kiểu: giá/ngày/thời gian còn lại đã parse sẵn."""
+	return ListingBatch(get_table_rows(url, limit=limit, backend=backend))
+
+
+if __name__ == "__main__":
+	try:
+		# CLI đơn giản: python api.py [url] [--limit N] [--csv out.csv] [--json out.json] [--details] [--concurrency N] [--no-cache]
+		#   Xuất file (ghi dần, xem exporters.py): [--ndjson out.ndjson] [--parquet out.parquet] [--arrow out.arrow] [--out file.<csv|ndjson|jsonl|json|parquet|arrow>[.gz|.zst]]
+		#     [--compress gzip|zstd] [--rotate-size 100M] [--rotate-every 1h]
+		#   Parse bằng process pool (xem pipeline.py, cho --all / --details): [--workers N] [--chunk-size N]
+		#   Duyệt toàn bộ: python api.py --all [--page-size 200] [--start-page N] [--max-pages N] [--cursor crawl.json] [--parser auto|attrs|lxml|selectolax|bs4]
+		#   Gọi API nội bộ: python api.py --spec api_spec.json [--registrar 爱名网] [--min-price 0] [--max-price 100] [--page-size 200] [--page N]
+		url = "https://am.22.cn/ykj/"
+		limit = 20
+		outputs: List[Tuple[str, Optional[str]]] = []
+		compress: Optional[str] = None
+		rotate_bytes: Optional[int] = None
+		rotate_secs: Optional[float] = None
+		with_details = False
+		concurrency = 8
+		crawl_all = False
+		page_size = MAX_PAGE_SIZE
+		start_page: Optional[int] = None
+		max_pages: Optional[int] = None
+		cursor_path: Optional[str] = None
+		backend: Optional[str] = None
+		use_cache = True
+		spec_path: Optional[str] = None
+		api_filters: Dict[str, object] = {}
+		workers: Optional[int] = None
+		chunk_size: Optional[int] = None
+
+		args = sys.argv[1:]
+		i = 0
+		while i < len(args):
+			a = args[i]
+			if a.startswith("http"):
+				url = a
+			elif a == "--limit" and i + 1 < len(args):
+				limit = int(args[i + 1])
+				i += 1
+			elif a in ("--csv", "--json", "--ndjson", "--parquet", "--arrow", "--out") and i + 1 < len(args):
+				outputs.append((args[i + 1], None if a == "--out" else a[2:]))
+				i += 1
+			elif a == "--compress" and i + 1 < len(args):
+				compress = args[i + 1]
+				i += 1
+			elif a == "--rotate-size" and i + 1 < len(args):
+				rotate_bytes = parse_size(args[i + 1])
+				i += 1
+			elif a == "--rotate-every" and i + 1 < len(args):
+				rotate_secs = parse_duration(args[i + 1])
+				i += 1
+			elif a == "--details":
+				with_details = True
+			elif a == "--concurrency" and i + 1 < len(args):
+				concurrency = int(args[i + 1])
+				i += 1
+			elif a == "--all":
+				crawl_all = True
+			elif a == "--page-size" and i + 1 < len(args):
+				page_size = int(args[i + 1])
+				i += 1
+			elif a == "--start-page" and i + 1 < len(args):
+				start_page = int(args[i + 1])
+				i += 1
+			elif a == "--max-pages" and i + 1 < len(args):
+				max_pages = int(args[i + 1])
+				i += 1
+			elif a == "--cursor" and i + 1 < len(args):
+				cursor_path = args[i + 1]
+				i += 1
+			elif a == "--spec" and i + 1 < len(args):
+				spec_path = args[i + 1]
+				i += 1
+			elif a == "--registrar" and i + 1 < len(args):
+				api_filters["registrar"] = args[i + 1]
+				i += 1
+			elif a in ("--min-price", "--max-price") and i + 1 < len(args):
+				api_filters[a[2:].replace("-", "_")] = float(args[i + 1])
+				i += 1
+			elif a == "--page" and i + 1 < len(args):
+				api_filters["page"] = int(args[i + 1])
+				i += 1
+			elif a == "--no-cache":
+				use_cache = False
+			elif a == "--parser" and i + 1 < len(args):
+				backend = args[i + 1]
+				i += 1
+			elif a == "--workers" and i + 1 < len(args):
+				workers = int(args[i + 1])
+				i += 1
+			elif a == "--chunk-size" and i + 1 < len(args):
+				chunk_size = int(args[i + 1])
+				i += 1
+			i += 1
+
+		if spec_path:
+			api_filters["page_size"] = page_size
+			api_rows = get_table_rows_api(spec_path, limit=limit, fallback_url=url, **api_filters)
+			if not api_rows:
+				print("Không lấy được dữ liệu từ API nội bộ lẫn trang HTML.")
+				sys.exit(0)
+			for r in api_rows:
+				print(f"{r.get('domain','')}\t{r.get('price') or ''}\t{r.get('registrar') or ''}\t{r.get('detail_url') or ''}")
+			sink = open_sinks(outputs, TABLE_FIELDS, compress, False, rotate_bytes, rotate_secs)
+			if sink:
+				with sink:
+					sink.write_many(api_rows)
+				print(f"Đã ghi: {', '.join(sink.files)}")
+			sys.exit(0)
+
+		if crawl_all:
+			# Ghi dần từng trang (flush sau mỗi trang) để bộ nhớ không tăng theo số trang;
+			# chạy tiếp (--start-page / file --cursor đã có của cùng URL) thì ghi nối vào file cũ
+			resume = bool(start_page) or bool(cursor_path and _load_cursor(cursor_path, url))
+			sink = open_sinks(outputs, TABLE_FIELDS, compress, resume, rotate_bytes, rotate_secs)
+			count = 0
+			try:
+				if workers:
+					pages = crawl_batches_parallel(
+						url, page_size=page_size, start_page=start_page, max_pages=max_pages,
+						concurrency=concurrency, cursor_path=cursor_path, backend=backend,
+						workers=workers, chunk_size=chunk_size or 1,
+					)
+				else:
+					pages = crawl_pages(
+						url, page_size=page_size, start_page=start_page, max_pages=max_pages,
+						concurrency=min(concurrency, 4), cursor_path=cursor_path, backend=backend,
+					)
+				for rows in pages:
+					for r in rows:
+						print(f"{r.get('domain','')}\t{r.get('price') or ''}\t{r.get('registration_date') or ''}\t{r.get('detail_url') or ''}")
+					if sink:
+						sink.write_many(rows)
+					count += len(rows)
+			finally:
+				if sink:
+					sink.close()
+			if sink:
+				print(f"Đã ghi: {', '.join(sink.files)}", file=sys.stderr)
+			print(f"Tổng số hàng: {count}", file=sys.stderr)
+			sys.exit(0)
+
+		items = get_recommended_items(url, limit=limit)
+		if not items:
+			# Fallback: chỉ in danh sách domain nếu có
+			domains = get_domains(url)
+			if not domains:
+				print("Không tìm thấy tên miền nào (trang có thể render bằng JS).")
+				sys.exit(0)
+			for d in domains:
+				print(d)
+			sys.exit(0)
+
+		# Schema cố định: chi tiết = các khóa của _empty_details (+ lỗi nếu có), không thì domain + link
+		fields = list(_empty_details("")) + ["error"] if with_details else ["domain", "detail_url"]
+		sink = open_sinks(outputs, fields, compress, False, rotate_bytes, rotate_secs)
+		# --workers: một pipeline (process pool) cho cả danh sách, lấy dần theo từng nhóm bên dưới
+		parallel_details = None
+		if with_details and workers:
+			parallel_details = fetch_details_parallel(
+				[it["detail_url"] for it in items], concurrency=concurrency, workers=workers, chunk_size=chunk_size or 8,
+				use_cache=use_cache,
+			)
+		try:
+			# Lấy chi tiết theo từng nhóm nhỏ để ghi ra file ngay, không chờ hết danh sách
+			step = max(1, concurrency) * 4 if with_details else len(items)
+			for start in range(0, len(items), step):
+				chunk = items[start:start + step]
+				if with_details:
+					if parallel_details is not None:
+						results = list(islice(parallel_details, len(chunk)))
+					else:
+						results = get_domain_details_many([it["detail_url"] for it in chunk], concurrency=concurrency, use_cache=use_cache)
+					for it, details in zip(chunk, results):
+						# Ghi đè domain nếu thiếu ở chi tiết
+						if not details.get("domain"):
+							details["domain"] = it["domain"]
+						if details.get("error"):
+							print(f"[details] lỗi {it['detail_url']}: {details['error']}", file=sys.stderr)
+				else:
+					results = chunk  # chỉ domain + link
+
+				# In ra console
+				for r in results:
+					if with_details:
+						print(f"{r.get('domain','')}\t¥{r.get('price','?')}\t{r.get('registration_date','')}\t{r.get('days_to_expire','')}天\t{r.get('detail_url','')}")
+					else:
+						print(f"{r['domain']}\t{r['detail_url']}")
+				if sink:
+					sink.write_many(results)
+		finally:
+			if parallel_details is not None:
+				parallel_details.close()
+			if sink:
+				sink.close()
+		if sink:
+			print(f"Đã ghi: {', '.join(sink.files)}")
+
+	except Exception as e:
+		print(f"Lỗi khi lấy dữ liệu: {e}")
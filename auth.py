@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+auth.py
+
+Đăng nhập 22.cn một lần bằng Playwright rồi dùng lại cookie trong session `requests` chung
+(api._get_session()), thay vì lái trình duyệt cho mỗi lần scrape.
+- login(): mở https://my.22.cn/, điền tài khoản (#input_register / #input_registera), ấn
+  #denglu_button, chờ link https://i.22.cn (dấu hiệu đã đăng nhập), ghé am.22.cn/ykj/ để lấy
+  cookie của site đấu giá, rồi lưu storage state (cookie + localStorage, định dạng Playwright)
+  ra data/auth_state.json (quyền 600). Tài khoản lấy từ biến môi trường I22_USERNAME / I22_PASSWORD.
+- load_cookies(): nạp cookie từ file state vào một requests.Session (bỏ cookie đã hết hạn).
+- AuthManager: gắn vào session qua response hook của requests. Mỗi trang HTML của 22.cn tải về
+  (không stream) được kiểm tra có link https://i.22.cn không; mất link = phiên đã hết hạn ->
+  đăng nhập lại trong một luồng nền (một lần một lúc, cách nhau ít nhất `retry_every` giây),
+  vòng monitor không phải chờ. Response stream (--stream) không đọc được body trong hook nên
+  thỉnh thoảng (`check_every`) tải riêng CHECK_URL ở nền để kiểm tra.
+Có captcha thì headless không qua được: chạy tay `python auth.py login --headed` để giải.
+CLI: python auth.py login [--headed] [--state data/auth_state.json] | check [--state ...]
+Cần: pip install playwright && python -m playwright install chromium (chỉ khi đăng nhập).
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.cookies import create_cookie
+
+DEFAULT_STATE = os.path.join(os.path.dirname(__file__), "data", "auth_state.json")
+LOGIN_URL = "https://my.22.cn/"
+CHECK_URL = "https://am.22.cn/ykj/"
+AUTH_HOSTS = ("22.cn",)
+
+_LOGGED_IN_RE = re.compile(rb"""<a[^>]+href=["']?(?:https?:)?//i\.22\.cn[/?#"'\s>]""", re.I)
+
+_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+)
+
+
+class LoginError(RuntimeError):
+    pass
+
+
+def is_logged_in(html: Any) -> bool:
+    """Trang có link https://i.22.cn (trung tâm tài khoản) -> đang đăng nhập."""
+    if isinstance(html, str):
+        html = html.encode("utf-8", "replace")
+    return bool(_LOGGED_IN_RE.search(html))
+
+
+def credentials() -> Tuple[str, str]:
+    user = os.getenv("I22_USERNAME", "")
+    password = os.getenv("I22_PASSWORD", "")
+    if not user or not password:
+        raise LoginError("thiếu tài khoản: đặt biến môi trường I22_USERNAME và I22_PASSWORD")
+    return user, password
+
+
+def login(state_path: str = DEFAULT_STATE, headless: bool = True, timeout_ms: int = 30000) -> Dict[str, Any]:
+    """Đăng nhập bằng Playwright, ghi storage state ra `state_path`, trả về state (dict)."""
+    user, password = credentials()
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError as e:
+        raise LoginError("đăng nhập cần playwright: pip install playwright && python -m playwright install chromium") from e
+    # Có captcha: cho người dùng thời gian giải trong cửa sổ trình duyệt
+    wait_ms = timeout_ms if headless else max(timeout_ms, 180000)
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=headless)
+        try:
+            context = browser.new_context(user_agent=_USER_AGENT, locale="zh-CN", viewport={"width": 1366, "height": 768})
+            page = context.new_page()
+            page.set_default_timeout(timeout_ms)
+            page.goto(LOGIN_URL, wait_until="domcontentloaded")
+            page.click("#input_register")
+            page.type("#input_register", user, delay=80)
+            page.click("#input_registera")
+            page.type("#input_registera", password, delay=80)
+            if page.is_visible("#cbx_agree") and not page.is_checked("#cbx_agree"):
+                page.check("#cbx_agree")
+            page.wait_for_timeout(400)
+            page.click("#denglu_button")
+            try:
+                page.wait_for_selector('a[href^="https://i.22.cn"]', timeout=wait_ms)
+            except Exception as e:
+                hint = "" if not headless else " (có thể cần captcha: chạy python auth.py login --headed)"
+                raise LoginError(f"không thấy link https://i.22.cn sau khi đăng nhập{hint}") from e
+            # Lấy thêm cookie của am.22.cn (trang danh sách 一口价)
+            page.goto(CHECK_URL, wait_until="domcontentloaded")
+            state = context.storage_state()
+        finally:
+            browser.close()
+    save_state(state, state_path)
+    return state
+
+
+def save_state(state: Dict[str, Any], path: str) -> None:
+    """Ghi storage state (có cookie đăng nhập) an toàn khi crash, chỉ chủ sở hữu đọc được."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_cookies(session: requests.Session, state_path: str = DEFAULT_STATE) -> int:
+    """Nạp cookie còn hạn từ storage state vào `session`. Trả về số cookie đã nạp (0 nếu chưa có file)."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    now = time.time()
+    n = 0
+    for c in state.get("cookies", []):
+        expires = c.get("expires")
+        # Playwright: -1 = cookie phiên
+        if expires is not None and 0 <= expires < now:
+            continue
+        session.cookies.set_cookie(create_cookie(
+            c["name"], c["value"],
+            domain=c.get("domain", ""),
+            path=c.get("path", "/"),
+            secure=bool(c.get("secure")),
+            expires=int(expires) if expires is not None and expires >= 0 else None,
+            rest={"HttpOnly": None} if c.get("httpOnly") else {},
+        ))
+        n += 1
+    return n
+
+
+def _auth_host(url: str) -> bool:
+    host = urlsplit(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in AUTH_HOSTS)
+
+
+class AuthManager:
+    """Giữ session đăng nhập: nạp cookie lúc đầu, phát hiện hết hạn qua các trang tải về và
+    đăng nhập lại ở nền."""
+
+    def __init__(self, state_path: str = DEFAULT_STATE, headless: bool = True, retry_every: float = 300.0, check_every: float = 600.0):
+        self.state_path = state_path
+        self.headless = headless
+        self.retry_every = retry_every
+        self.check_every = check_every
+        self.logged_in: Optional[bool] = None
+        self.stats = {"checks": 0, "expired": 0, "logins": 0, "login_errors": 0}
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0.0
+        self._last_check = 0.0
+
+    def attach(self, session: requests.Session, login_if_missing: bool = True) -> "AuthManager":
+        """Nạp cookie đã lưu vào `session` (chưa có thì đăng nhập ngay một lần) và bật kiểm tra."""
+        self._session = session
+        n = load_cookies(session, self.state_path)
+        if n:
+            print(f"[auth] nạp {n} cookie từ {self.state_path}")
+        elif login_if_missing:
+            self._login()
+        session.hooks["response"].append(self._on_response)
+        return self
+
+    def _on_response(self, resp: requests.Response, *args, **kwargs) -> requests.Response:
+        if resp.status_code != 200 or not _auth_host(resp.url) or "html" not in resp.headers.get("Content-Type", "html"):
+            return resp
+        if kwargs.get("stream"):
+            # Không đọc body của response stream; kiểm tra riêng ở nền nếu đã lâu chưa kiểm tra
+            if time.monotonic() - self._last_check >= self.check_every:
+                self._last_check = time.monotonic()
+                threading.Thread(target=self._probe, name="auth-probe", daemon=True).start()
+            return resp
+        self.observe(resp.content)
+        return resp
+
+    def observe(self, html: Any) -> bool:
+        """Kiểm tra một trang của 22.cn; phiên hết hạn thì đăng nhập lại ở nền."""
+        self._last_check = time.monotonic()
+        self.stats["checks"] += 1
+        ok = is_logged_in(html)
+        if not ok:
+            if self.logged_in is not False:
+                self.stats["expired"] += 1
+                print("[auth] không thấy link i.22.cn -> phiên đăng nhập đã hết hạn")
+            self.refresh_async()
+        self.logged_in = ok
+        return ok
+
+    def _probe(self) -> None:
+        try:
+            self._session.get(CHECK_URL, timeout=(10, 20))  # hook kiểm tra trang
+        except requests.RequestException:
+            pass
+
+    def refresh_async(self) -> bool:
+        """Đăng nhập lại trong luồng nền; False nếu đang đăng nhập hoặc vừa thử chưa lâu."""
+        with self._lock:
+            if self._refreshing:
+                return False
+            if self._last_attempt and time.monotonic() - self._last_attempt < self.retry_every:
+                return False
+            self._refreshing = True
+        threading.Thread(target=self._login, name="auth-login", daemon=True).start()
+        return True
+
+    def _login(self) -> bool:
+        with self._lock:
+            self._refreshing = True
+            self._last_attempt = time.monotonic()
+        try:
+            login(self.state_path, headless=self.headless)
+            n = load_cookies(self._session, self.state_path)
+        except Exception as e:
+            self.stats["login_errors"] += 1
+            print(f"[auth] đăng nhập lỗi: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._refreshing = False
+        self.stats["logins"] += 1
+        self.logged_in = True
+        print(f"[auth] đã đăng nhập, nạp {n} cookie")
+        return True
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    state_path = DEFAULT_STATE
+    headless = True
+    rest = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--state" and i + 1 < len(args):
+            state_path = args[i + 1]; i += 1
+        elif a == "--headed":
+            headless = False
+        else:
+            rest.append(a)
+        i += 1
+    if not rest or rest[0] not in ("login", "check"):
+        print("usage: python auth.py login [--headed] [--state path] | check [--state path]")
+        sys.exit(2)
+
+    if rest[0] == "login":
+        try:
+            state = login(state_path, headless=headless)
+        except LoginError as e:
+            print(f"[auth] {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"[auth] đã lưu {len(state.get('cookies', []))} cookie vào {state_path}")
+        return
+
+    from api import _get_session
+
+    session = _get_session()
+    n = load_cookies(session, state_path)
+    resp = session.get(CHECK_URL, timeout=(10, 20))
+    ok = is_logged_in(resp.content)
+    print(f"[auth] {n} cookie, {CHECK_URL}: {'đã đăng nhập' if ok else 'chưa đăng nhập / hết hạn'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
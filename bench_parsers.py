@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+bench_parsers.py
+
+Benchmark offline cho các parser trong api.py / parsers.py, không cần mạng:
+  - bảng danh sách: từng backend của parsers.parse_listing + BuynowStreamParser (stream)
+  - api.parse_domains, api.parse_recommended_items (cùng trang danh sách)
+  - api.parse_domain_details (trang chi tiết)
+Dữ liệu: fixtures/listing_sample.html, fixtures/detail_sample.html (trang mẫu viết tay theo
+markup của am.22.cn, không phải trang tải về) và trang giả lập (synthetic.py) với 200, 2.000,
+20.000 hàng.
+
+Mỗi phép đo báo: rows/giây (lần chạy nhanh nhất), bộ nhớ đỉnh và live_blocks - số block còn
+sống lúc chụp snapshot ngay khi parse xong (kể cả kết quả trả về), không phải tổng số lần cấp
+phát (tracemalloc, chạy riêng để không làm sai thời gian).
+
+Chạy:
+  python bench_parsers.py                              # in bảng kết quả
+  python bench_parsers.py --out bench.json             # ghi kết quả dạng JSON
+  python bench_parsers.py --baseline bench.json --threshold 0.25
+      # so với lần đo trước; thoát mã 1 nếu rows/giây giảm hoặc bộ nhớ đỉnh tăng quá 25%
+  python bench_parsers.py --sizes 200,2000 --repeat 3 --only attrs,lxml
+"""
+from __future__ import annotations
+
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import api
+import parsers
+import synthetic
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASE_URL = "https://am.22.cn/ykj/"
+
+
+def _stream_parse(html: str) -> int:
+    p = parsers.BuynowStreamParser(BASE_URL)
+    for i in range(0, len(html), 8192):
+        p.feed(html[i:i + 8192])
+    p.close()
+    return len(p.rows)
+
+
+def listing_cases() -> Dict[str, Callable[[str], int]]:
+    cases: Dict[str, Callable[[str], int]] = {}
+    for name in parsers.available_backends():
+        cases[f"table:{name}"] = (lambda n: lambda h: len(parsers.parse_listing(h, BASE_URL, None, n)))(name)
+    cases["table:stream"] = _stream_parse
+    cases["get_domains"] = lambda h: len(api.parse_domains(h))
+    cases["get_recommended_items"] = lambda h: len(api.parse_recommended_items(h, BASE_URL, limit=10 ** 9))
+    return cases
+
+
+def load_inputs(sizes: List[int]) -> List[Tuple[str, str, int]]:
+    """Trả về danh sách (tên, html, số hàng kỳ vọng)."""
+    inputs: List[Tuple[str, str, int]] = []
+    with open(os.path.join(FIXTURES, "listing_sample.html"), "r", encoding="utf-8") as f:
+        inputs.append(("listing_sample", f.read(), 2))
+    for n in sizes:
+        inputs.append((f"synthetic_{n}", synthetic.render_listing(synthetic.make_rows(n, seed=n), page_count=max(1, n // 200)), n))
+    return inputs
+
+
+def measure(fn: Callable[[str], int], html: str, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    rows = 0
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        rows = fn(html)
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        out = fn(html)
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    del out
+    return {
+        "rows": rows,
+        "seconds": best,
+        "rows_per_sec": rows / best if best > 0 else 0.0,
+        "peak_bytes": peak,
+        "live_blocks": blocks,
+    }
+
+
+def run(sizes: List[int], repeat: int, only: Optional[List[str]] = None) -> Dict[str, object]:
+    results: List[Dict[str, object]] = []
+    cases = listing_cases()
+    for input_name, html, expected in load_inputs(sizes):
+        for case_name, fn in cases.items():
+            if only and not any(o in case_name for o in only):
+                continue
+            # Trang lớn chạy ít lần hơn để tổng thời gian chấp nhận được
+            r = measure(fn, html, repeat if len(html) < 5_000_000 else max(1, repeat // 2))
+            r.update({"parser": case_name, "input": input_name, "bytes": len(html.encode("utf-8")), "expected_rows": expected})
+            results.append(r)
+            print(f"{case_name:<24} {input_name:<18} rows={r['rows']:<6} {r['rows_per_sec']:>12,.0f} rows/s "
+                  f"peak={r['peak_bytes'] / 1e6:8.2f} MB live_blocks={r['live_blocks']}", flush=True)
+
+    with open(os.path.join(FIXTURES, "detail_sample.html"), "r", encoding="utf-8") as f:
+        detail_html = f.read()
+    if not only or any(o in "get_domain_details" for o in only):
+        r = measure(lambda h: int(bool(api.parse_domain_details(h, BASE_URL).get("domain"))), detail_html, max(repeat, 20))
+        r.update({"parser": "get_domain_details", "input": "detail_sample", "bytes": len(detail_html.encode("utf-8")), "expected_rows": 1})
+        results.append(r)
+        print(f"{'get_domain_details':<24} {'detail_sample':<18} rows={r['rows']:<6} {r['rows_per_sec']:>12,.0f} rows/s "
+              f"peak={r['peak_bytes'] / 1e6:8.2f} MB live_blocks={r['live_blocks']}")
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backends": parsers.available_backends(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[str]:
+    """Liệt kê các phép đo kém hơn baseline quá `threshold` (tỉ lệ)."""
+    base = {(r["parser"], r["input"]): r for r in baseline.get("results", [])}
+    problems: List[str] = []
+    for r in current["results"]:
+        b = base.get((r["parser"], r["input"]))
+        if not b:
+            continue
+        if b["rows_per_sec"] and r["rows_per_sec"] < b["rows_per_sec"] * (1 - threshold):
+            problems.append(f"{r['parser']} @ {r['input']}: rows/s {b['rows_per_sec']:,.0f} -> {r['rows_per_sec']:,.0f}")
+        if b["peak_bytes"] and r["peak_bytes"] > b["peak_bytes"] * (1 + threshold):
+            problems.append(f"{r['parser']} @ {r['input']}: peak {b['peak_bytes']:,} -> {r['peak_bytes']:,} bytes")
+        if r["rows"] != b["rows"]:
+            problems.append(f"{r['parser']} @ {r['input']}: rows {b['rows']} -> {r['rows']}")
+    return problems
+
+
+def main() -> int:
+    sizes = [200, 2000, 20000]
+    repeat = 5
+    out_path: Optional[str] = None
+    baseline_path: Optional[str] = None
+    threshold = 0.25
+    only: Optional[List[str]] = None
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--sizes" and i + 1 < len(args):
+            sizes = [int(x) for x in args[i + 1].split(",") if x]
+            i += 1
+        elif a == "--repeat" and i + 1 < len(args):
+            repeat = max(1, int(args[i + 1]))
+            i += 1
+        elif a == "--out" and i + 1 < len(args):
+            out_path = args[i + 1]
+            i += 1
+        elif a == "--baseline" and i + 1 < len(args):
+            baseline_path = args[i + 1]
+            i += 1
+        elif a == "--threshold" and i + 1 < len(args):
+            threshold = float(args[i + 1])
+            i += 1
+        elif a == "--only" and i + 1 < len(args):
+            only = [x for x in args[i + 1].split(",") if x]
+            i += 1
+        i += 1
+
+    report = run(sizes, repeat, only)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[bench] đã ghi {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, threshold)
+        if problems:
+            print(f"[bench] HỒI QUY (ngưỡng {threshold:.0%}):")
+            for p in problems:
+                print(f"  - {p}")
+            return 1
+        print(f"[bench] không có hồi quy so với {baseline_path} (ngưỡng {threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,278 +1,597 @@
-import os
-import sys
-import time
-import json
-import re
-from datetime import datetime
-import requests
-from urllib.parse import quote
-
-from api import get_table_rows, get_recommended_items, get_domain_details
-
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8499581087:AAHlVefHV4zAcjlLlVr9NbE5eDxxmhbx9rc")
-CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "7159305763")
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-
-
-def send_message(text: str) -> bool:
-    api = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    # Dùng POST để không phải tự encode
-    try:
-        resp = requests.post(api, data={"chat_id": CHAT_ID, "text": text}, timeout=20)
-        ok = False
-        if 200 <= resp.status_code < 300:
-            try:
-                ok = bool(resp.json().get("ok", True))
-            except Exception:
-                ok = True
-        print(f"[send] status={resp.status_code} ok={ok} text={(text[:60] + '...') if len(text)>60 else text}")
-        return ok
-    except Exception:
-        print("[send] exception when sending message")
-        return False
-
-
-def _chunked(seq, size):
-    buf = []
-    for x in seq:
-        buf.append(x)
-        if len(buf) >= size:
-            yield buf
-            buf = []
-    if buf:
-        yield buf
-
-def build_domain_list_text(domains: list[str], title: str = "New domain found:") -> str:
-    lines = [title]
-    lines.extend(domains)
-    return "\n".join(lines)
-
-
-_DOMAIN_RE = re.compile(r"([a-z0-9-]+(?:\.[a-z0-9-]+)+)", re.I)
-
-def _norm_domain(s: str | None) -> str:
-    return (s or "").strip().lower()
-
-def _extract_domain(s: str) -> str | None:
-    # Tìm chuỗi có dạng domain ở cuối hoặc trong chuỗi
-    m = _DOMAIN_RE.search(s)
-    return _norm_domain(m.group(1)) if m else None
-
-def load_state(path: str) -> set:
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            raw_list: list[str] = []
-            if isinstance(data, list):
-                raw_list = data
-            elif isinstance(data, dict) and "sent" in data and isinstance(data["sent"], list):
-                raw_list = data["sent"]
-            # Chuẩn hóa: lưu state theo domain (lowercase)
-            out: set[str] = set()
-            for x in raw_list:
-                if not isinstance(x, str):
-                    continue
-                d = _extract_domain(x)
-                if d:
-                    out.add(d)
-            return out
-    except Exception:
-        pass
-    return set()
-
-
-def save_state(path: str, keys: set) -> None:
-    try:
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(sorted(list(keys)), f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
-
-
-def is_today(date_str: str | None) -> bool:
-    if not date_str:
-        return False
-    try:
-        # Kỳ vọng yyyy-mm-dd
-        d = datetime.strptime(date_str.strip(), "%Y-%m-%d").date()
-        return d == datetime.now().date()
-    except Exception:
-        return False
-
-
-def monitor(url: str, limit: int, delay: float, interval: float, tld: str, state_path: str, only_today: bool, heartbeat_mins: float | None = None):
-    sent = load_state(state_path)  # set các domain đã gửi
-    print(f"[monitor] start: url={url} tld={tld} limit={limit} interval={interval}s only_today={only_today}")
-    last_new_ts = time.time()
-    try:
-        while True:
-            # 1) Thử lấy dữ liệu bảng trực tiếp
-            rows = get_table_rows(url, limit=limit)
-
-            # 2) Nếu không có, fallback qua danh sách đề xuất + nạp chi tiết
-            if not rows:
-                print("[monitor] bảng rỗng -> dùng fallback đề xuất + chi tiết")
-                items = get_recommended_items(url, limit=limit)
-                rows = []
-                for it in items:
-                    d = get_domain_details(it.get("detail_url", ""))
-                    if not d.get("domain"):
-                        d["domain"] = it.get("domain", "")
-                    rows.append(d)
-
-            total = len(rows)
-            new_rows = []
-            for r in rows:
-                domain = _norm_domain(r.get("domain"))
-                if not domain.endswith(tld.lower()):
-                    continue
-                if only_today and not is_today(r.get("registration_date")):
-                    continue
-                if domain not in sent:
-                    new_rows.append(r)
-
-            # Khử trùng lặp trong cùng một lô theo domain
-            batch_seen: set[str] = set()
-            unique_new_rows: list[dict] = []
-            for r in new_rows:
-                d = _norm_domain(r.get("domain"))
-                if d and d not in batch_seen:
-                    batch_seen.add(d)
-                    unique_new_rows.append(r)
-
-            # Gửi dạng danh sách gọn: "New domain found:\n<domain>\n..."
-            new_domains = [d for d in ( _norm_domain(r.get("domain")) for r in unique_new_rows ) if d]
-            new_domains = [d for d in new_domains if d]
-            for chunk in _chunked(new_domains, 40):  # an toàn < 4096 ký tự
-                text = build_domain_list_text(chunk)
-                print(f"[monitor] sending list: {len(chunk)} domains")
-                send_message(text)
-                time.sleep(delay)
-            if new_rows:
-                last_new_ts = time.time()
-                # Cập nhật state + log
-                sent.update(new_domains)
-                save_state(state_path, sent)
-                try:
-                    os.makedirs(DATA_DIR, exist_ok=True)
-                    log_path = os.path.join(DATA_DIR, "domains.jsonl")
-                    ts = datetime.utcnow().isoformat() + "Z"
-                    with open(log_path, "a", encoding="utf-8") as f:
-                        for d in new_domains:
-                            rec = {"domain": d, "first_seen": ts, "source": url}
-                            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                except Exception:
-                    pass
-
-            print(f"[monitor] fetched={total} new={len(new_rows)} tracked={len(sent)}")
-            # Lưu state mỗi vòng để tránh mất tiến trình nếu thoát đột ngột (đã lưu khi có new)
-            if not new_rows:
-                save_state(state_path, sent)
-
-            # Heartbeat: nếu không có mục mới trong heartbeat_mins, gửi thông báo bot vẫn chạy
-            if heartbeat_mins and heartbeat_mins > 0:
-                idle_mins = (time.time() - last_new_ts) / 60.0
-                if idle_mins >= heartbeat_mins:
-                    send_message(f"Vẫn đang theo dõi {tld}. Chưa có mục mới. idle ~{idle_mins:.1f} phút")
-                    last_new_ts = time.time()
-
-            print(f"[monitor] sleep {interval}s ...")
-            time.sleep(interval)
-    except KeyboardInterrupt:
-        # yên lặng khi dừng
-        save_state(state_path, sent)
-
-
-def main():
-    # CLI: python botte.py [url] [--limit N] [--delay sec] [--monitor] [--interval sec] [--tld .com] [--state path] [--only-today] [--heartbeat-mins M]
-    url = "https://am.22.cn/ykj/"
-    limit = 20
-    delay = 2.0
-    interval = 60.0
-    monitor_mode = False
-    tld = ".com"
-    state_path = os.path.join(os.path.dirname(__file__), "sent_state.json")
-    only_today = False
-    heartbeat_mins: float | None = None
-    args = sys.argv[1:]
-    i = 0
-    while i < len(args):
-        a = args[i]
-        if a.startswith("http"):
-            url = a
-        elif a == "--limit" and i + 1 < len(args):
-            limit = int(args[i + 1]); i += 1
-        elif a == "--delay" and i + 1 < len(args):
-            delay = float(args[i + 1]); i += 1
-        elif a == "--interval" and i + 1 < len(args):
-            interval = float(args[i + 1]); i += 1
-        elif a == "--monitor":
-            monitor_mode = True
-        elif a == "--tld" and i + 1 < len(args):
-            tld = args[i + 1]; i += 1
-        elif a == "--state" and i + 1 < len(args):
-            state_path = args[i + 1]; i += 1
-        elif a == "--only-today":
-            only_today = True
-        elif a == "--heartbeat-mins" and i + 1 < len(args):
-            heartbeat_mins = float(args[i + 1]); i += 1
-        i += 1
-
-    if monitor_mode:
-        monitor(url, limit, delay, interval, tld, state_path, only_today, heartbeat_mins)
-        return
-
-    rows = get_table_rows(url, limit=limit)
-    if not rows:
-        # Fallback: lấy danh sách đề xuất + nạp chi tiết để có giá/ngày...
-        items = get_recommended_items(url, limit=limit)
-        if not items:
-            print("[run] Không lấy được dữ liệu")
-            return
-        rows = []
-        for it in items:
-            d = get_domain_details(it["detail_url"])
-            if not d.get("domain"):
-                d["domain"] = it["domain"]
-            rows.append(d)
-
-    rows = [r for r in rows if (r.get("domain") or "").lower().endswith(tld.lower())]
-
-    # Áp dụng kho dữ liệu: chỉ gửi domain mới so với state
-    sent = load_state(state_path)
-    domains_all = [ _norm_domain(r.get("domain")) for r in rows if r.get("domain") ]
-    # Khử trùng lặp trong lô
-    seen_once: set[str] = set()
-    domains_unique = []
-    for d in domains_all:
-        if d and d not in seen_once:
-            seen_once.add(d)
-            domains_unique.append(d)
-    # Lọc các domain chưa gửi trước đó
-    new_domains = [d for d in domains_unique if d not in sent]
-
-    print(f"[run] will send list with {len(new_domains)} new domains (total fetched {len(domains_unique)})")
-    for chunk in _chunked(new_domains, 40):
-        text = build_domain_list_text(chunk)
-        send_message(text)
-        time.sleep(delay)
-    print("[run] done")
-    # Cập nhật kho dữ liệu + state
-    if new_domains:
-        sent.update(new_domains)
-        save_state(state_path, sent)
-        try:
-            os.makedirs(DATA_DIR, exist_ok=True)
-            log_path = os.path.join(DATA_DIR, "domains.jsonl")
-            ts = datetime.utcnow().isoformat() + "Z"
-            with open(log_path, "a", encoding="utf-8") as f:
-                for d in new_domains:
-                    rec = {"domain": d, "first_seen": ts, "source": url}
-                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        except Exception:
-            pass
-
-
-if __name__ == "__main__":
-    main()
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+from urllib.parse import quote
+
+import fetcher
+import metrics
+from detail_cache import default_cache
+from auth import DEFAULT_STATE as AUTH_STATE_PATH, AuthManager
+from domain_log import DomainLog
+from listing_diff import SnapshotDiff, Subscription, parse_subscription, route
+from exporters import parse_size
+from price_history import PriceHistory
+from state_store import open_state_store
+from telegram_queue import TelegramSender
+from scheduler import AdaptiveScheduler, parse_profiles
+from renderer import RendererPool
+from profiles import WatchProfile, group_sources, load_profiles
+from rules import RuleSet, compile_rules, read_rule_specs, simple_rules
+from api import parse_table_rows, get_table_rows, get_table_rows_api, get_table_rows_if_changed, stream_table_rows, get_recommended_items, get_domain_details_many
+
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8499581087:AAHlVefHV4zAcjlLlVr9NbE5eDxxmhbx9rc")
+CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "7159305763")
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+OUTBOX_PATH = os.path.join(DATA_DIR, "outbox.sqlite3")
+# Xoay data/domains.jsonl khi vượt dung lượng này / khi sang ngày mới (xem domain_log.py)
+DOMAINS_LOG_MAX_BYTES: int | None = 64 * 1024 * 1024
+DOMAINS_LOG_DAILY = False
+
+# Bộ đếm của monitor: số vòng đã chạy và số vòng bỏ qua vì trang không đổi
+MONITOR_STATS = {"cycles": 0, "skipped_cycles": 0}
+# Số domain mới đã gửi theo từng profile (monitor_profiles)
+PROFILE_STATS: dict[str, int] = {}
+# Các trường monitor cần từ trang chi tiết (đều là trường ổn định -> cache sống lâu)
+MONITOR_DETAIL_FIELDS = ("domain", "registration_date")
+# Có lịch sử giá / sự kiện thì giá từ cache cũng phải còn hạn
+MONITOR_PRICE_FIELDS = MONITOR_DETAIL_FIELDS + ("price",)
+
+
+def make_sender(delay: float) -> TelegramSender:
+    # delay (giây giữa 2 tin) -> tốc độ token bucket của hàng đợi gửi nền
+    rate = 1.0 / delay if delay and delay > 0 else 1.0
+    return TelegramSender(TOKEN, CHAT_ID, OUTBOX_PATH, rate=rate).start()
+
+
+def _norm_domain(s: str | None) -> str:
+    return (s or "").strip().lower()
+
+
+def _fetch_rows(url: str, limit: int, detail_concurrency: int = 8, stream: bool = False, conditional: bool = True, use_detail_cache: bool = True, api_spec: str | None = None, renderer: RendererPool | None = None, detail_fields: tuple[str, ...] = MONITOR_DETAIL_FIELDS) -> list[dict] | None:
+    """Lấy các hàng của trang danh sách cho một vòng monitor; None nếu trang không đổi.
+    `detail_fields`: các trường chi tiết (fallback) phải còn hạn trong cache."""
+    # 1) Thử lấy dữ liệu bảng trực tiếp (stream: dừng tải khi đủ limit hàng)
+    rows = None
+    if api_spec:
+        # Ưu tiên endpoint JSON nội bộ (discover_api.py --save); rỗng thì quay về HTML
+        rows = get_table_rows_api(api_spec, limit=limit) or None
+    if rows is None:
+        if conditional:
+            rows = get_table_rows_if_changed(url, limit=limit, stream=stream)
+        else:
+            rows = stream_table_rows(url, limit=limit) if stream else get_table_rows(url, limit=limit)
+    if rows is None:
+        return None
+
+    # Bảng rỗng vì host đang lỗi (breaker mở / yêu cầu vừa rồi thất bại) hoặc đã hết hạn chót
+    # của vòng: không chạy render/fallback (thêm hàng chục yêu cầu vào đúng host đang lỗi)
+    if not rows and not fetcher.healthy(url):
+        print(f"[monitor] {url}: host lỗi / hết thời gian vòng -> bỏ qua fallback")
+        return rows
+
+    # 2) Bảng render bằng JS: render bằng pool trình duyệt (giữ ấm giữa các vòng) rồi parse
+    if not rows and renderer is not None:
+        html = renderer.render(url)
+        rows = parse_table_rows(html, url, limit) if html else []
+        print(f"[monitor] render JS -> {len(rows)} hàng (renders={renderer.stats['renders']} recycled={renderer.stats['recycled']})")
+
+    # 3) Nếu vẫn không có, fallback qua danh sách đề xuất + nạp chi tiết
+    if not rows:
+        print("[monitor] bảng rỗng -> dùng fallback đề xuất + chi tiết")
+        items = get_recommended_items(url, limit=limit)
+        rows = []
+        details_list = get_domain_details_many(
+            [it.get("detail_url", "") for it in items], concurrency=detail_concurrency,
+            use_cache=use_detail_cache, fields=detail_fields,
+        )
+        failed = 0
+        for it, d in zip(items, details_list):
+            if d.pop("error", None):
+                failed += 1
+            if not d.get("domain"):
+                d["domain"] = it.get("domain", "")
+            rows.append(d)
+        if failed:
+            print(f"[monitor] chi tiết lỗi: {failed}/{len(items)}")
+        cache = default_cache() if use_detail_cache else None
+        if cache is not None:
+            print(f"[monitor] cache chi tiết: hit={cache.stats['hits']} miss={cache.stats['misses']} ({cache.hit_rate():.0%})")
+    return rows
+
+
+def _select_new(rows: list[dict], ruleset: RuleSet, sent, today: str | None = None) -> list[tuple[str, str]]:
+    """(domain, tên luật khớp) của các hàng qua `ruleset` (đánh giá cả lô một lần) và chưa có trong
+    `sent`; domain lowercase, không trùng trong lô."""
+    with metrics.span("filter"):
+        matched: list[tuple[str, str]] = []
+        batch_seen: set[str] = set()
+        for r, rule in zip(rows, ruleset.evaluate(rows, today)):
+            if rule is None:
+                continue
+            d = _norm_domain(r.get("domain"))
+            # Khử trùng lặp trong cùng một lô theo domain
+            if d and d not in batch_seen and d not in sent:
+                batch_seen.add(d)
+                matched.append((d, rule))
+    metrics.inc("rows_filtered_out", len(rows) - len(matched))
+    metrics.inc("new_domains", len(matched))
+    return matched
+
+
+def _rule_counts(matched: list[tuple[str, str]]) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for _, rule in matched:
+        counts[rule] = counts.get(rule, 0) + 1
+    return counts
+
+
+def _record_sent(sent, matched: list[tuple[str, str]], source: str, profile: str | None = None, domain_log: DomainLog | None = None) -> None:
+    """Cập nhật state (chỉ ghi thêm lô mới) + log data/domains.jsonl (kèm luật đã khớp).
+    `domain_log`: instance giữ suốt vòng monitor (không có thì mở tạm một cái)."""
+    sent.add_many([d for d, _ in matched])
+    sent.flush()
+    try:
+        with metrics.span("domains_log"):
+            ts = datetime.utcnow().isoformat() + "Z"
+            records = []
+            for d, rule in matched:
+                rec = {"domain": d, "first_seen": ts, "source": source, "rule": rule}
+                if profile is not None:
+                    rec["profile"] = profile
+                records.append(rec)
+            (domain_log or _domain_log()).append(records)
+    except Exception as e:
+        print(f"[monitor] không ghi được domains.jsonl: {e}")
+
+
+def _domain_log() -> DomainLog:
+    return DomainLog(DATA_DIR, max_bytes=DOMAINS_LOG_MAX_BYTES, daily=DOMAINS_LOG_DAILY)
+
+
+def _route_events(differ: SnapshotDiff, rows: list[dict], subscriptions: list[Subscription], sender) -> None:
+    """Diff với snapshot trước của nguồn rồi gửi các sự kiện khớp đăng ký (--event).
+    Trang monitor chỉ là một cửa sổ của catalogue (cỡ trang do site quyết định, không phải --limit)
+    nên không bao giờ coi là đầy đủ: "delisted" chỉ khi listing mất từ giữa cửa sổ."""
+    events = differ.diff(rows)
+    if not events:
+        return
+    with metrics.span("enqueue"):
+        sent = route(events, subscriptions, sender)
+    counts: dict[str, int] = {}
+    for e in events:
+        counts[e.kind] = counts.get(e.kind, 0) + 1
+    print(f"[events] {counts} -> gửi {sent or 0}")
+
+
+def _fetch_report() -> dict:
+    """Số liệu tải theo host của vòng vừa rồi (fetcher.cycle_report); in ra khi có lỗi / breaker mở."""
+    report = fetcher.cycle_report()
+    if any(r["failure_rate"] or r["breaker"] != "closed" for r in report.values()):
+        print(f"[fetch] {fetcher.format_report(report)}")
+    return report
+
+
+def _sleep(seconds: float, stop_event: threading.Event | None) -> bool:
+    """Ngủ giữa hai vòng; trả về True nếu được báo dừng (chạy nhúng: loadtest.py, ...)."""
+    if stop_event is not None:
+        return stop_event.wait(seconds)
+    time.sleep(seconds)
+    return False
+
+
+def monitor(url: str, limit: int, delay: float, interval: float, tld: str, state_path: str, only_today: bool, heartbeat_mins: float | None = None, detail_concurrency: int = 8, stream: bool = False, conditional: bool = True, use_detail_cache: bool = True, state_backend: str = "sqlite", retention_days: float | None = None, scheduler: AdaptiveScheduler | None = None, api_spec: str | None = None, renderer: RendererPool | None = None, stop_event: threading.Event | None = None, metrics_log: str | None = None, rules: RuleSet | None = None, history_path: str | None = None, cycle_budget: float | None = None, subscriptions: list[Subscription] | None = None):
+    sent = open_state_store(state_path, state_backend, retention_days)  # kho các domain đã gửi
+    domain_log = _domain_log()  # data/domains.jsonl, giữ suốt vòng monitor
+    history = PriceHistory(history_path) if history_path else None  # lịch sử giá / thời gian còn lại
+    differ = SnapshotDiff() if subscriptions else None  # sự kiện new / price_drop / delisted
+    detail_fields = MONITOR_PRICE_FIELDS if history is not None or differ is not None else MONITOR_DETAIL_FIELDS
+    sender = make_sender(delay)
+    last_prune_ts = time.time()
+    print(f"[monitor] start: url={url} tld={tld} limit={limit} interval={interval}s only_today={only_today} stream={stream}")
+    last_new_ts = time.time()
+    # Không có --rule/--rules: một luật tương đương bộ lọc cũ (hậu tố tld + tùy chọn only_today)
+    ruleset = rules if rules else simple_rules(tld, only_today)
+    if rules:
+        print(f"[monitor] {len(rules)} luật: {', '.join(r.name for r in rules.rules)}")
+
+    try:
+        while True:
+            MONITOR_STATS["cycles"] += 1
+            cycle_new = 0
+            cycle_error = False
+            cycle_total: int | None = None
+            cycle_t0 = time.perf_counter()
+            # Mọi lần tải của vòng (bảng, fallback, chi tiết) chung một hạn chót
+            with fetcher.cycle_deadline(cycle_budget):
+                rows = _fetch_rows(url, limit, detail_concurrency, stream, conditional, use_detail_cache, api_spec, renderer, detail_fields)
+
+            if rows is None:
+                # Trang không đổi (304 hoặc cùng dấu vân tay) -> bỏ qua parse/lọc/ghi state
+                MONITOR_STATS["skipped_cycles"] += 1
+                print(f"[monitor] không đổi -> bỏ qua (skipped={MONITOR_STATS['skipped_cycles']}/{MONITOR_STATS['cycles']})")
+            else:
+                total = cycle_total = len(rows)
+                cycle_error = total == 0  # cả bảng lẫn fallback đều rỗng -> coi như lỗi tải
+                if history is not None:
+                    history.record(rows)
+                if differ is not None and rows:
+                    _route_events(differ, rows, subscriptions, sender)
+                # Gửi dạng danh sách gọn: "New domain found:\n<domain>\n..."
+                matched = _select_new(rows, ruleset, sent)
+                new_domains = [d for d, _ in matched]
+                cycle_new = len(new_domains)
+                if new_domains:
+                    # Đưa vào hàng đợi gửi nền (gộp sát 4096 ký tự), không chặn vòng scrape
+                    with metrics.span("enqueue"):
+                        n_msgs = sender.enqueue_domains(new_domains)
+                    print(f"[monitor] queued list: {len(new_domains)} domains in {n_msgs} messages (pending={sender.pending()}) rules={_rule_counts(matched)}")
+                    last_new_ts = time.time()
+                    _record_sent(sent, matched, url, None, domain_log)
+
+                print(f"[monitor] fetched={total} new={cycle_new} tracked={len(sent)}")
+
+            # Dọn domain quá hạn lưu giữ (nếu có --retention-days), tối đa 1 lần/giờ
+            if sent.retention and time.time() - last_prune_ts >= 3600:
+                removed = sent.prune()
+                last_prune_ts = time.time()
+                if removed:
+                    print(f"[monitor] state: xóa {removed} domain quá hạn")
+
+            # Heartbeat: nếu không có mục mới trong heartbeat_mins, gửi thông báo bot vẫn chạy
+            if heartbeat_mins and heartbeat_mins > 0:
+                idle_mins = (time.time() - last_new_ts) / 60.0
+                if idle_mins >= heartbeat_mins:
+                    sender.enqueue(f"Vẫn đang theo dõi {tld}. Chưa có mục mới. idle ~{idle_mins:.1f} phút")
+                    last_new_ts = time.time()
+
+            metrics.observe("cycle", time.perf_counter() - cycle_t0)
+            metrics.inc("cycles")
+            if rows is None:
+                metrics.inc("skipped_cycles")
+            # Một dòng JSONL mỗi vòng: số liệu vòng + chênh lệch bộ đếm/thời gian từng pha
+            fetch_report = _fetch_report()
+            metrics.write_cycle(metrics_log, cycle=MONITOR_STATS["cycles"], fetched=cycle_total, new=cycle_new, skipped=rows is None, fetch=fetch_report)
+
+            sleep_s = interval
+            if scheduler is not None:
+                sleep_s = scheduler.record(cycle_new, error=cycle_error)
+                MONITOR_STATS["interval"] = round(sleep_s, 2)
+                MONITOR_STATS["interval_reason"] = scheduler.reason
+                print(f"[scheduler] {scheduler.explain()}")
+            print(f"[monitor] sleep {sleep_s:.1f}s ...")
+            if _sleep(sleep_s, stop_event):
+                break
+    except KeyboardInterrupt:
+        # yên lặng khi dừng
+        pass
+    finally:
+        sent.close()
+        if history is not None:
+            history.close()
+        sender.stop(drain_timeout=5)
+        if renderer is not None:
+            renderer.close()
+
+
+def monitor_profiles(profiles: list[WatchProfile], delay: float, interval: float, heartbeat_mins: float | None = None, detail_concurrency: int = 8, stream: bool = False, conditional: bool = True, use_detail_cache: bool = True, state_backend: str = "sqlite", retention_days: float | None = None, scheduler: AdaptiveScheduler | None = None, stop_event: threading.Event | None = None, metrics_log: str | None = None, history_path: str | None = None, cycle_budget: float | None = None, subscriptions: list[Subscription] | None = None, api_spec: str | None = None, renderer: RendererPool | None = None):
+    """Như monitor() nhưng cho nhiều profile trong một tiến trình:
+    mỗi URL nguồn chỉ tải một lần mỗi vòng (limit lớn nhất của các profile dùng nó), rồi chia hàng
+    cho từng profile với bộ lọc, state khử trùng lặp và chat Telegram riêng. Dùng chung session
+    HTTP (api._get_session), một hàng đợi gửi và pool render (nếu có). `api_spec` chỉ dùng được khi
+    mọi profile chung một URL nguồn (endpoint JSON không theo URL trang).
+    """
+    sources = group_sources(profiles)
+    if api_spec and len(sources) > 1:
+        raise ValueError("--api-spec chỉ dùng được khi mọi profile chung một URL nguồn")
+    stores = {p.name: open_state_store(p.state_path, state_backend, retention_days) for p in profiles}
+    domain_log = _domain_log()
+    history = PriceHistory(history_path) if history_path else None
+    differs = {src: SnapshotDiff() for src in sources} if subscriptions else {}
+    detail_fields = MONITOR_PRICE_FIELDS if history is not None or differs else MONITOR_DETAIL_FIELDS
+    sender = make_sender(delay)
+    last_prune_ts = time.time()
+    last_new_ts = time.time()
+    print(f"[monitor] start: {len(profiles)} profile, {len(sources)} nguồn, interval={interval}s stream={stream}")
+    for p in profiles:
+        print(f"[monitor]   {p.name}: url={p.url} tld={','.join(p.tlds) or '*'} rules={','.join(r.name for r in p.ruleset.rules)} limit={p.limit} chat={p.chat_id or CHAT_ID} state={p.state_path}")
+    try:
+        while True:
+            MONITOR_STATS["cycles"] += 1
+            cycle_t0 = time.perf_counter()
+            cycle_new = 0
+            cycle_total = 0
+            fetched_any = False
+            skipped_all = True
+            today = datetime.now().date().isoformat()
+            for src, limit in sources.items():
+                with fetcher.cycle_deadline(cycle_budget):
+                    rows = _fetch_rows(src, limit, detail_concurrency, stream, conditional, use_detail_cache, api_spec, renderer, detail_fields)
+                if rows is None:
+                    print(f"[monitor] {src}: không đổi -> bỏ qua")
+                    continue
+                skipped_all = False
+                fetched_any = fetched_any or bool(rows)
+                cycle_total += len(rows)
+                if history is not None:
+                    history.record(rows)
+                if src in differs and rows:
+                    _route_events(differs[src], rows, subscriptions, sender)
+                for p in profiles:
+                    if p.url != src:
+                        continue
+                    sent = stores[p.name]
+                    matched = _select_new(rows[:p.limit], p.ruleset, sent, today)
+                    new_domains = [d for d, _ in matched]
+                    if new_domains:
+                        with metrics.span("enqueue"):
+                            n_msgs = sender.enqueue_domains(new_domains, title=p.title, chat_id=p.chat_id)
+                        print(f"[monitor] {p.name}: queued {len(new_domains)} domains in {n_msgs} messages rules={_rule_counts(matched)}")
+                        _record_sent(sent, matched, src, p.name, domain_log)
+                        cycle_new += len(new_domains)
+                    PROFILE_STATS[p.name] = PROFILE_STATS.get(p.name, 0) + len(new_domains)
+            if skipped_all:
+                MONITOR_STATS["skipped_cycles"] += 1
+            else:
+                print(f"[monitor] fetched={cycle_total} new={cycle_new} per-profile={PROFILE_STATS}")
+            if cycle_new:
+                last_new_ts = time.time()
+
+            if retention_days and time.time() - last_prune_ts >= 3600:
+                for name, store in stores.items():
+                    removed = store.prune()
+                    if removed:
+                        print(f"[monitor] state {name}: xóa {removed} domain quá hạn")
+                last_prune_ts = time.time()
+
+            if heartbeat_mins and heartbeat_mins > 0:
+                idle_mins = (time.time() - last_new_ts) / 60.0
+                if idle_mins >= heartbeat_mins:
+                    sender.enqueue(f"Vẫn đang theo dõi {len(profiles)} profile. Chưa có mục mới. idle ~{idle_mins:.1f} phút")
+                    last_new_ts = time.time()
+
+            metrics.observe("cycle", time.perf_counter() - cycle_t0)
+            metrics.inc("cycles")
+            if skipped_all:
+                metrics.inc("skipped_cycles")
+            fetch_report = _fetch_report()
+            metrics.write_cycle(metrics_log, cycle=MONITOR_STATS["cycles"], fetched=cycle_total, new=cycle_new, skipped=skipped_all, fetch=fetch_report)
+
+            sleep_s = interval
+            if scheduler is not None:
+                sleep_s = scheduler.record(cycle_new, error=not skipped_all and not fetched_any)
+                MONITOR_STATS["interval"] = round(sleep_s, 2)
+                MONITOR_STATS["interval_reason"] = scheduler.reason
+                print(f"[scheduler] {scheduler.explain()}")
+            print(f"[monitor] sleep {sleep_s:.1f}s ...")
+            if _sleep(sleep_s, stop_event):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for store in stores.values():
+            store.close()
+        if history is not None:
+            history.close()
+        sender.stop(drain_timeout=5)
+        if renderer is not None:
+            renderer.close()
+
+
+def main():
+    global DOMAINS_LOG_MAX_BYTES, DOMAINS_LOG_DAILY
+    # CLI: python botte.py [url] [--limit N] [--delay sec] [--monitor] [--interval sec] [--tld .com] [--state path] [--only-today] [--heartbeat-mins M] [--concurrency N] [--stream] [--no-conditional] [--no-detail-cache] [--state-backend sqlite|log|json] [--retention-days D]
+    #   Poll thích ứng: [--adaptive] [--min-interval sec] [--max-interval sec] [--target-per-poll N] [--profile "08-20:15-120,20-08:60-900"]
+    #   API nội bộ (spec từ discover_api.py --save): [--api-spec api_spec.json]
+    #   Render JS bằng Playwright khi bảng rỗng: [--render] [--render-contexts N] [--render-recycle N]
+    #   Metrics: [--metrics-port 9108] (GET /metrics dạng Prometheus) [--metrics-log data/metrics.jsonl] (1 dòng/vòng)
+    #   Nhiều profile trong một tiến trình (xem profiles.py): [--profiles profiles.json]
+    #   Luật lọc (xem rules.py, thay cho --tld/--only-today): [--rule "com: tld=.com len<=6 price<=100"]... [--rules rules.json]
+    #   Lịch sử giá mỗi listing (xem price_history.py): [--price-history data/price_history.sqlite3]
+    #   Xoay data/domains.jsonl (xem domain_log.py): [--log-max-size 64M] [--log-daily]
+    #   Đăng nhập 22.cn (xem auth.py, tài khoản qua I22_USERNAME/I22_PASSWORD): [--login] [--auth-state data/auth_state.json]
+    #   Sự kiện new/price_drop/delisted (xem listing_diff.py, có thể lặp): [--event "price_drop: drop>=20 pct>=50 tld=.com"]
+    #   Tải (xem fetcher.py): [--cycle-budget 60] (giây cho mọi lần tải của một vòng, 0 = không giới hạn) [--hedge-after 2|auto]
+    url = "https://am.22.cn/ykj/"
+    limit = 20
+    delay = 2.0
+    interval = 60.0
+    monitor_mode = False
+    tld = ".com"
+    state_path = os.path.join(os.path.dirname(__file__), "sent_state.json")
+    only_today = False
+    heartbeat_mins: float | None = None
+    detail_concurrency = 8
+    stream = False
+    conditional = True
+    use_detail_cache = True
+    state_backend = "sqlite"
+    retention_days: float | None = None
+    adaptive = False
+    min_interval = 10.0
+    max_interval = 600.0
+    target_per_poll = 1.0
+    profiles_spec: str | None = None
+    api_spec: str | None = None
+    render = False
+    render_contexts = 1
+    render_recycle = 50
+    metrics_port: int | None = None
+    metrics_log: str | None = None
+    profiles_path: str | None = None
+    rule_specs: list[str] = []
+    rules_path: str | None = None
+    history_path: str | None = None
+    cycle_budget = 60.0
+    subscriptions: list[Subscription] = []
+    login = False
+    auth_state = AUTH_STATE_PATH
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a.startswith("http"):
+            url = a
+        elif a == "--limit" and i + 1 < len(args):
+            limit = int(args[i + 1]); i += 1
+        elif a == "--delay" and i + 1 < len(args):
+            delay = float(args[i + 1]); i += 1
+        elif a == "--interval" and i + 1 < len(args):
+            interval = float(args[i + 1]); i += 1
+        elif a == "--monitor":
+            monitor_mode = True
+        elif a == "--tld" and i + 1 < len(args):
+            tld = args[i + 1]; i += 1
+        elif a == "--state" and i + 1 < len(args):
+            state_path = args[i + 1]; i += 1
+        elif a == "--only-today":
+            only_today = True
+        elif a == "--heartbeat-mins" and i + 1 < len(args):
+            heartbeat_mins = float(args[i + 1]); i += 1
+        elif a == "--concurrency" and i + 1 < len(args):
+            detail_concurrency = int(args[i + 1]); i += 1
+        elif a == "--stream":
+            stream = True
+        elif a == "--no-conditional":
+            conditional = False
+        elif a == "--no-detail-cache":
+            use_detail_cache = False
+        elif a == "--state-backend" and i + 1 < len(args):
+            state_backend = args[i + 1]; i += 1
+        elif a == "--retention-days" and i + 1 < len(args):
+            retention_days = float(args[i + 1]); i += 1
+        elif a == "--adaptive":
+            adaptive = True
+        elif a == "--min-interval" and i + 1 < len(args):
+            min_interval = float(args[i + 1]); i += 1
+        elif a == "--max-interval" and i + 1 < len(args):
+            max_interval = float(args[i + 1]); i += 1
+        elif a == "--target-per-poll" and i + 1 < len(args):
+            target_per_poll = float(args[i + 1]); i += 1
+        elif a == "--profile" and i + 1 < len(args):
+            profiles_spec = args[i + 1]; i += 1
+        elif a == "--api-spec" and i + 1 < len(args):
+            api_spec = args[i + 1]; i += 1
+        elif a == "--render":
+            render = True
+        elif a == "--render-contexts" and i + 1 < len(args):
+            render_contexts = int(args[i + 1]); i += 1
+        elif a == "--render-recycle" and i + 1 < len(args):
+            render_recycle = int(args[i + 1]); i += 1
+        elif a == "--metrics-port" and i + 1 < len(args):
+            metrics_port = int(args[i + 1]); i += 1
+        elif a == "--metrics-log" and i + 1 < len(args):
+            metrics_log = args[i + 1]; i += 1
+        elif a == "--profiles" and i + 1 < len(args):
+            profiles_path = args[i + 1]; i += 1
+        elif a == "--rule" and i + 1 < len(args):
+            rule_specs.append(args[i + 1]); i += 1
+        elif a == "--rules" and i + 1 < len(args):
+            rules_path = args[i + 1]; i += 1
+        elif a == "--price-history" and i + 1 < len(args):
+            history_path = args[i + 1]; i += 1
+        elif a == "--log-max-size" and i + 1 < len(args):
+            DOMAINS_LOG_MAX_BYTES = parse_size(args[i + 1]) or None; i += 1
+        elif a == "--log-daily":
+            DOMAINS_LOG_DAILY = True
+        elif a == "--event" and i + 1 < len(args):
+            subscriptions.append(parse_subscription(args[i + 1])); i += 1
+        elif a == "--login":
+            login = True
+        elif a == "--auth-state" and i + 1 < len(args):
+            auth_state = args[i + 1]; i += 1
+        elif a == "--cycle-budget" and i + 1 < len(args):
+            cycle_budget = float(args[i + 1]); i += 1
+        elif a == "--hedge-after" and i + 1 < len(args):
+            fetcher.HEDGE_AFTER = args[i + 1] if args[i + 1] == "auto" else float(args[i + 1]); i += 1
+        i += 1
+
+    rules: RuleSet | None = None
+    if rules_path or rule_specs:
+        rules = compile_rules((read_rule_specs(rules_path) if rules_path else []) + rule_specs)
+
+    if login:
+        # Nạp cookie đã lưu (chưa có thì đăng nhập một lần); hết hạn thì tự đăng nhập lại ở nền
+        from api import _get_session
+        AuthManager(auth_state).attach(_get_session())
+
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    if metrics_log:
+        metrics.enable()
+
+    if monitor_mode or profiles_path:
+        scheduler = None
+        if adaptive:
+            scheduler = AdaptiveScheduler(
+                base_interval=interval, min_interval=min_interval, max_interval=max_interval,
+                target_per_poll=target_per_poll, profiles=parse_profiles(profiles_spec),
+            )
+        if profiles_path:
+            profiles = load_profiles(profiles_path, DATA_DIR, rules)
+            if api_spec and len(group_sources(profiles)) > 1:
+                print("[monitor] --api-spec chỉ dùng được khi mọi profile chung một URL nguồn (endpoint JSON không theo URL trang)", file=sys.stderr)
+                sys.exit(2)
+            renderer = RendererPool(size=render_contexts, max_pages_per_context=render_recycle, storage_state=auth_state if login else None) if render else None
+            monitor_profiles(profiles, delay, interval, heartbeat_mins, detail_concurrency, stream, conditional, use_detail_cache, state_backend, retention_days, scheduler, None, metrics_log, history_path, cycle_budget or None, subscriptions, api_spec, renderer)
+            return
+        monitor(url, limit, delay, interval, tld, state_path, only_today, heartbeat_mins, detail_concurrency, stream, conditional, use_detail_cache, state_backend, retention_days, scheduler, api_spec,
+                RendererPool(size=render_contexts, max_pages_per_context=render_recycle, storage_state=auth_state if login else None) if render else None, None, metrics_log, rules, history_path, cycle_budget or None, subscriptions)
+        return
+
+    rows = get_table_rows_api(api_spec, limit=limit) if api_spec else []
+    if not rows:
+        rows = stream_table_rows(url, limit=limit) if stream else get_table_rows(url, limit=limit)
+    if not rows:
+        # Fallback: lấy danh sách đề xuất + nạp chi tiết để có giá/ngày...
+        items = get_recommended_items(url, limit=limit)
+        if not items:
+            print("[run] Không lấy được dữ liệu")
+            return
+        rows = []
+        details_list = get_domain_details_many(
+            [it["detail_url"] for it in items], concurrency=detail_concurrency,
+            use_cache=use_detail_cache, fields=MONITOR_DETAIL_FIELDS,
+        )
+        for it, d in zip(items, details_list):
+            d.pop("error", None)
+            if not d.get("domain"):
+                d["domain"] = it["domain"]
+            rows.append(d)
+
+    rows = [r for r, _ in (rules or simple_rules(tld)).matches(rows)]
+
+    # Áp dụng kho dữ liệu: chỉ gửi domain mới so với state
+    sent = open_state_store(state_path, state_backend, retention_days)
+    domains_all = [ _norm_domain(r.get("domain")) for r in rows if r.get("domain") ]
+    # Khử trùng lặp trong lô
+    seen_once: set[str] = set()
+    domains_unique = []
+    for d in domains_all:
+        if d and d not in seen_once:
+            seen_once.add(d)
+            domains_unique.append(d)
+    # Lọc các domain chưa gửi trước đó
+    new_domains = [d for d in domains_unique if d not in sent]
+
+    print(f"[run] will send list with {len(new_domains)} new domains (total fetched {len(domains_unique)})")
+    sender = make_sender(delay)
+    sender.enqueue_domains(new_domains)
+    # Chạy một lần: chờ hàng đợi gửi xong (tin chưa gửi được vẫn nằm trong outbox cho lần sau)
+    sender.stop(drain_timeout=max(30.0, delay * len(new_domains) / 40 + 10))
+    print("[run] done")
+    metrics.write_cycle(metrics_log, cycle=1, fetched=len(domains_unique), new=len(new_domains), skipped=False)
+    # Cập nhật kho dữ liệu + state
+    sent.add_many(new_domains)
+    sent.close()
+    if new_domains:
+        try:
+            ts = datetime.utcnow().isoformat() + "Z"
+            _domain_log().append({"domain": d, "first_seen": ts, "source": url} for d in new_domains)
+        except Exception as e:
+            print(f"[run] không ghi được domains.jsonl: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+daemon.py
+
+Tiến trình thường trú cho các lần quét gọi từ cron/script: giữ sẵn session HTTP (kết nối TLS
+tới am.22.cn), state khử trùng lặp đã mở, cache chi tiết và hàng đợi gửi Telegram, nên mỗi lần
+quét không phải trả lại chi phí khởi động interpreter, import requests/bs4, nạp state, bắt tay TLS.
+
+Điều khiển qua Unix socket (mặc định data/botte.sock, hoặc biến môi trường BOTTE_SOCKET), giao
+thức: một dòng JSON {"cmd": ..., ...} -> một dòng JSON trả lời ({"ok": true, ...} hoặc {"ok": false, "error": ...}).
+  ping                                   -> {"pid", "uptime"}
+  scan  [url] [limit] [rule...]          -> quét một lần: lọc, gửi domain mới, ghi state
+  fetch [url] [limit]                    -> các hàng của trang danh sách (như api.get_table_rows)
+  state [domain]                         -> đã gửi chưa + bản ghi gộp trong domains.jsonl; không có domain: số domain đang theo dõi
+  stats                                  -> số lần quét, hàng đợi gửi, cache chi tiết, metrics
+  compact                                -> gộp domains.jsonl + file đã xoay (job định kỳ, vd. từ cron)
+  stop                                   -> dừng daemon
+Chạy:   python daemon.py serve [url] [--limit N] [--tld .com] [--state path] [--rule ...] [--rules rules.json] [--delay sec] [--socket path]
+Client: python daemon.py scan [url] [--limit N] [--rule ...] | fetch | state [domain] | stats | compact | ping | stop
+Phần client chỉ import thư viện chuẩn (requests/bs4/... chỉ nạp ở phía serve) nên trả lời trong vài ms.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SOCKET = os.getenv("BOTTE_SOCKET") or os.path.join(os.path.dirname(__file__), "data", "botte.sock")
+COMMANDS = ("ping", "scan", "fetch", "state", "stats", "compact", "stop")
+
+
+class Daemon:
+    """Trạng thái giữ ấm giữa các lệnh. Lệnh quét/đọc state chạy tuần tự (một khóa)."""
+
+    def __init__(self, url: str, limit: int, tld: str, state_path: str, state_backend: str = "sqlite", rule_specs: Optional[List[Any]] = None, delay: float = 2.0, use_detail_cache: bool = True):
+        import api
+        import botte
+        from rules import compile_rules, simple_rules
+
+        self._botte = botte
+        self._api = api
+        self._compile_rules = compile_rules
+        self.url = url
+        self.limit = limit
+        self.use_detail_cache = use_detail_cache
+        self.ruleset = compile_rules(rule_specs) if rule_specs else simple_rules(tld)
+        self.sent = botte.open_state_store(state_path, state_backend)
+        self.domain_log = botte._domain_log()  # giữ một instance: chỉ mục bộ nhớ của file đang ghi
+        self.sender = botte.make_sender(delay)
+        self.started = time.time()
+        self.stats = {"scans": 0, "unchanged": 0, "fetches": 0, "new_domains": 0, "errors": 0, "last_scan": None}
+        self._lock = threading.Lock()
+        api._get_session()
+
+    # --- lệnh ----------------------------------------------------------------------------
+    def ping(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "uptime": round(time.time() - self.started, 1)}
+
+    def scan(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        botte = self._botte
+        url = req.get("url") or self.url
+        limit = int(req.get("limit") or self.limit)
+        ruleset = self._compile_rules(req["rules"]) if req.get("rules") else self.ruleset
+        t0 = time.perf_counter()
+        with self._lock:
+            self.stats["scans"] += 1
+            rows = botte._fetch_rows(url, limit, use_detail_cache=self.use_detail_cache, conditional=not req.get("force"))
+            if rows is None:
+                self.stats["unchanged"] += 1
+                return {"unchanged": True, "fetched": 0, "new": [], "seconds": round(time.perf_counter() - t0, 3)}
+            matched = botte._select_new(rows, ruleset, self.sent)
+            if matched:
+                self.sender.enqueue_domains([d for d, _ in matched])
+                botte._record_sent(self.sent, matched, url, None, self.domain_log)
+            self.stats["new_domains"] += len(matched)
+            self.stats["last_scan"] = time.time()
+        return {
+            "unchanged": False,
+            "fetched": len(rows),
+            "new": [d for d, _ in matched],
+            "rules": botte._rule_counts(matched),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def fetch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["fetches"] += 1
+        rows = self._api.get_table_rows(req.get("url") or self.url, limit=int(req.get("limit") or self.limit))
+        return {"rows": rows}
+
+    def state(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        domain = (req.get("domain") or "").strip().lower()
+        with self._lock:
+            if not domain:
+                return {"tracked": len(self.sent)}
+            sent = domain in self.sent
+        return {"domain": domain, "sent": sent, "log": self.domain_log.lookup(domain)}
+
+    def stats_cmd(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        import metrics
+        from detail_cache import default_cache
+
+        cache = default_cache() if self.use_detail_cache else None
+        return {
+            "daemon": dict(self.stats, uptime=round(time.time() - self.started, 1)),
+            "tracked": len(self.sent),
+            "telegram_pending": self.sender.pending(),
+            "detail_cache": dict(cache.stats) if cache is not None else None,
+            "metrics": metrics.snapshot() if metrics.enabled() else None,
+        }
+
+    def compact(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        # Không giữ self._lock: DomainLog tự khóa file, lệnh scan chỉ chờ khi có domain mới cần ghi log
+        t0 = time.perf_counter()
+        out: Dict[str, Any] = dict(self.domain_log.compact())
+        out["seconds"] = round(time.perf_counter() - t0, 3)
+        return out
+
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = req.get("cmd")
+        handler = {"ping": self.ping, "scan": self.scan, "fetch": self.fetch, "state": self.state, "stats": self.stats_cmd, "compact": self.compact}.get(cmd)
+        if handler is None:
+            return {"ok": False, "error": f"lệnh không hỗ trợ: {cmd!r} (có: {', '.join(COMMANDS)})"}
+        try:
+            out = handler(req)
+        except Exception as e:
+            self.stats["errors"] += 1
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        out["ok"] = True
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self.sent.close()
+        self.sender.stop(drain_timeout=5)
+
+
+def serve(daemon: Daemon, socket_path: str = DEFAULT_SOCKET) -> None:
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            line = self.rfile.readline()
+            try:
+                req = json.loads(line or b"{}")
+            except ValueError:
+                resp: Dict[str, Any] = {"ok": False, "error": "yêu cầu không phải JSON"}
+            else:
+                if req.get("cmd") == "stop":
+                    resp = {"ok": True, "stopping": True}
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                else:
+                    resp = daemon.handle(req)
+            self.wfile.write((json.dumps(resp, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    if os.path.exists(socket_path):
+        # Socket cũ: còn daemon khác đang nghe thì thôi, không thì xóa file sót lại
+        if _alive(socket_path):
+            raise SystemExit(f"[daemon] đã có daemon chạy ở {socket_path}")
+        os.remove(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    os.chmod(socket_path, 0o600)
+    print(f"[daemon] nghe ở {socket_path} (pid={os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
+        daemon.close()
+        print("[daemon] đã dừng")
+
+
+def _alive(socket_path: str) -> bool:
+    try:
+        request({"cmd": "ping"}, socket_path, timeout=1.0)
+        return True
+    except OSError:
+        return False
+
+
+def request(req: Dict[str, Any], socket_path: str = DEFAULT_SOCKET, timeout: float = 120.0) -> Dict[str, Any]:
+    """Gửi một lệnh tới daemon, trả về dict trả lời. OSError nếu không kết nối được."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        s.sendall((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf or b"{}")
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if not args or args[0] not in COMMANDS + ("serve",):
+        print(f"usage: python daemon.py serve [url] [options] | {' | '.join(COMMANDS)} [...]")
+        sys.exit(2)
+    cmd = args[0]
+    socket_path = DEFAULT_SOCKET
+    url: Optional[str] = None
+    limit: Optional[int] = None
+    tld = ".com"
+    state_path = os.path.join(os.path.dirname(__file__), "sent_state.json")
+    state_backend = "sqlite"
+    delay = 2.0
+    rule_specs: List[Any] = []
+    rules_path: Optional[str] = None
+    force = False
+    use_detail_cache = True
+    domain: Optional[str] = None
+    i = 1
+    while i < len(args):
+        a = args[i]
+        if a.startswith("http"):
+            url = a
+        elif a == "--socket" and i + 1 < len(args):
+            socket_path = args[i + 1]; i += 1
+        elif a == "--limit" and i + 1 < len(args):
+            limit = int(args[i + 1]); i += 1
+        elif a == "--tld" and i + 1 < len(args):
+            tld = args[i + 1]; i += 1
+        elif a == "--state" and i + 1 < len(args):
+            state_path = args[i + 1]; i += 1
+        elif a == "--state-backend" and i + 1 < len(args):
+            state_backend = args[i + 1]; i += 1
+        elif a == "--delay" and i + 1 < len(args):
+            delay = float(args[i + 1]); i += 1
+        elif a == "--rule" and i + 1 < len(args):
+            rule_specs.append(args[i + 1]); i += 1
+        elif a == "--rules" and i + 1 < len(args):
+            rules_path = args[i + 1]; i += 1
+        elif a == "--force":
+            force = True
+        elif a == "--no-detail-cache":
+            use_detail_cache = False
+        elif not a.startswith("--"):
+            domain = a
+        i += 1
+
+    if cmd == "serve":
+        from rules import read_rule_specs
+
+        specs = (read_rule_specs(rules_path) if rules_path else []) + rule_specs
+        daemon = Daemon(url or "https://am.22.cn/ykj/", limit or 20, tld, state_path, state_backend, specs, delay, use_detail_cache)
+        serve(daemon, socket_path)
+        return
+
+    req: Dict[str, Any] = {"cmd": cmd}
+    if url:
+        req["url"] = url
+    if limit:
+        req["limit"] = limit
+    if rule_specs:
+        req["rules"] = rule_specs
+    if force:
+        req["force"] = True
+    if domain:
+        req["domain"] = domain
+    try:
+        resp = request(req, socket_path)
+    except OSError as e:
+        print(f"không kết nối được daemon ở {socket_path}: {e} (chạy: python daemon.py serve)", file=sys.stderr)
+        sys.exit(3)
+    print(json.dumps(resp, ensure_ascii=False, indent=None if cmd in ("ping", "scan") else 2))
+    sys.exit(0 if resp.get("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
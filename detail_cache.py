@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+detail_cache.py
+
+Cache kết quả trang chi tiết /ykj/chujia_<id>.html theo mã listing.
+- Lưu trên đĩa bằng SQLite, phía trước là LRU trong bộ nhớ.
+- TTL theo từng trường: thông tin ổn định (tên miền, nhà đăng ký, ngày đăng ký) sống lâu,
+  thông tin hay đổi (giá, thời gian còn lại) chỉ sống vài phút.
+- Một lần get() chỉ "hit" khi mọi trường được yêu cầu còn hạn; caller chỉ cần domain +
+  ngày đăng ký sẽ hit lâu hơn caller cần giá. Trường không được yêu cầu mà đã hết hạn riêng
+  (vd. giá, thời gian còn lại) trả về None, không bao giờ trả giá trị cũ.
+- Kết quả không parse được tên miền (đổi giao diện, trang captcha / đăng nhập) không được lưu,
+  để lần sau tải lại thay vì trả về bản rỗng suốt TTL.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+DETAIL_FIELDS = ("domain", "price", "registrar", "registration_date", "time_left", "days_to_expire")
+
+# TTL mặc định (giây) cho từng trường
+FIELD_TTLS: Dict[str, float] = {
+    "domain": 30 * 86400,
+    "registrar": 7 * 86400,
+    "registration_date": 30 * 86400,
+    "days_to_expire": 6 * 3600,
+    "price": 300,
+    "time_left": 60,
+}
+
+
+class DetailCache:
+    def __init__(self, path: str, memory_size: int = 2048, ttls: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.memory_size = max(0, memory_size)
+        self.ttls = dict(FIELD_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "expired": 0, "stores": 0, "skipped": 0}
+        self._lru: "OrderedDict[int, Tuple[Dict[str, Optional[str]], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " listing_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+
+    def _ttl(self, fields: Iterable[str]) -> float:
+        return min(self.ttls.get(f, 0.0) for f in fields)
+
+    def _load(self, listing_id: int) -> Optional[Tuple[Dict[str, Optional[str]], float]]:
+        entry = self._lru.get(listing_id)
+        if entry is not None:
+            self._lru.move_to_end(listing_id)
+            self.stats["memory_hits"] += 1
+            return entry
+        row = self._db.execute("SELECT data, fetched_at FROM details WHERE listing_id = ?", (listing_id,)).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self._remember(listing_id, entry)
+        return entry
+
+    def _remember(self, listing_id: int, entry: Tuple[Dict[str, Optional[str]], float]) -> None:
+        if not self.memory_size:
+            return
+        self._lru[listing_id] = entry
+        self._lru.move_to_end(listing_id)
+        while len(self._lru) > self.memory_size:
+            self._lru.popitem(last=False)
+
+    def get(self, listing_id: int, fields: Optional[Iterable[str]] = None, now: Optional[float] = None) -> Optional[Dict[str, Optional[str]]]:
+        """Trả về bản sao dict chi tiết nếu mọi trường trong `fields` (mặc định: tất cả) còn hạn;
+        các trường khác đã quá TTL của chính nó thành None."""
+        fields = tuple(fields) if fields else DETAIL_FIELDS
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._load(listing_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            data, fetched_at = entry
+            if now - fetched_at > self._ttl(fields):
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            age = now - fetched_at
+            return {k: (v if age <= self.ttls.get(k, 0.0) else None) for k, v in data.items()}
+
+    def put(self, listing_id: int, details: Dict[str, Optional[str]], now: Optional[float] = None) -> None:
+        data = {k: details.get(k) for k in DETAIL_FIELDS}
+        if not data["domain"]:
+            self.stats["skipped"] += 1
+            return
+        fetched_at = time.time() if now is None else now
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO details (listing_id, data, fetched_at) VALUES (?, ?, ?)",
+                (listing_id, json.dumps(data, ensure_ascii=False), fetched_at),
+            )
+            self._remember(listing_id, (data, fetched_at))
+            self.stats["stores"] += 1
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """Xóa bản ghi cũ hơn `max_age` giây (mặc định: TTL dài nhất)."""
+        max_age = max(self.ttls.values()) if max_age is None else max_age
+        cutoff = time.time() - max_age
+        with self._lock:
+            cur = self._db.execute("DELETE FROM details WHERE fetched_at < ?", (cutoff,))
+            for k in [k for k, (_, ts) in self._lru.items() if ts < cutoff]:
+                del self._lru[k]
+            return cur.rowcount
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_DEFAULT: Optional[DetailCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return os.getenv("DETAIL_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def default_cache() -> Optional[DetailCache]:
+    """Cache dùng chung của tiến trình (None nếu bị tắt bằng DETAIL_CACHE=0 hoặc không mở được)."""
+    global _DEFAULT
+    if not cache_enabled():
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            path = os.getenv("DETAIL_CACHE_PATH") or os.path.join(os.path.dirname(__file__), "data", "detail_cache.sqlite3")
+            try:
+                _DEFAULT = DetailCache(path)
+            except Exception:
+                return None
+        return _DEFAULT
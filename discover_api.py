@@ -1,88 +1,144 @@
-# -*- coding: utf-8 -*-
-"""
-discover_api.py
-
-Mục đích: Mở trang am.22.cn/ykj/ bằng Playwright và ghi log các request XHR/fetch
-để tìm ra endpoint API nội bộ (URL, method, status, headers cơ bản và trích mẫu body).
-
-Chạy:
-  1) Cài đặt:  
-     C:\\TenMien\\.venv\\Scripts\\python.exe -m pip install playwright
-     C:\\TenMien\\.venv\\Scripts\\python.exe -m playwright install chromium
-
-  2) Chạy script:  
-     C:\\TenMien\\.venv\\Scripts\\python.exe C:\\TenMien\\discover_api.py
-
-  3) Tại cửa sổ trình duyệt hiện ra, bạn có thể thử bấm lọc/tìm kiếm/phân trang.
-     Script sẽ ghi log các request XHR/fetch (ưu tiên những URL chứa "/ykj/").
-"""
-from __future__ import annotations
-
-import json
-import re
-import sys
-from typing import Optional
-
-from playwright.sync_api import sync_playwright
-
-
-def short(s: str, n: int = 400) -> str:
-    s = s.replace("\r", " ").replace("\n", " ")
-    return s[:n] + ("..." if len(s) > n else "")
-
-
-def run(url: str = "https://am.22.cn/ykj/") -> None:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-            )
-        )
-        page = context.new_page()
-
-        def on_response(response):
-            try:
-                req = response.request
-                rtype = req.resource_type
-                if rtype not in ("xhr", "fetch"):
-                    return
-                url_ = response.url
-                # Ưu tiên các URL liên quan đến ykj
-                if "/ykj/" not in url_ and "/paimai/" not in url_:
-                    return
-                status = response.status
-                method = req.method
-                ctype = response.headers.get("content-type", "")
-                body_preview = ""
-                if "application/json" in ctype:
-                    body = response.text()
-                    body_preview = short(body, 800)
-                elif "text/html" in ctype or "text/plain" in ctype:
-                    body_preview = short(response.text(), 800)
-
-                print("\n=== XHR/FETCH ===")
-                print(f"{method} {status} {url_}")
-                if req.post_data:
-                    pdata = req.post_data
-                    print(f"POST DATA: {short(pdata, 300)}")
-                if body_preview:
-                    print(f"RESPONSE SAMPLE: {body_preview}")
-            except Exception:
-                pass
-
-        page.on("response", on_response)
-        page.goto(url, wait_until="domcontentloaded")
-
-        print("\n[discover_api] Trình duyệt đã mở. Hãy thao tác tìm kiếm/lọc/phân trang trong 30-60s...")
-        page.wait_for_timeout(45000)
-
-        print("\n[discover_api] Hoàn tất lắng nghe. Đóng trình duyệt.")
-        context.close()
-        browser.close()
-
-
-if __name__ == "__main__":
-    u = sys.argv[1] if len(sys.argv) > 1 else "https://am.22.cn/ykj/"
-    run(u)
+# -*- coding: utf-8 -*-
+"""
+discover_api.py
+
+Mục đích: Mở trang am.22.cn/ykj/ bằng Playwright và ghi log các request XHR/fetch
+để tìm ra endpoint API nội bộ (URL, method, status, headers cơ bản và trích mẫu body).
+
+Chạy:
+  1) Cài đặt:  
+     C:\\TenMien\\.venv\\Scripts\\python.exe -m pip install playwright
+     C:\\TenMien\\.venv\\Scripts\\python.exe -m playwright install chromium
+
+  2) Chạy script:  
+     C:\\TenMien\\.venv\\Scripts\\python.exe C:\\TenMien\\discover_api.py
+
+  3) Tại cửa sổ trình duyệt hiện ra, bạn có thể thử bấm lọc/tìm kiếm/phân trang.
+     Script sẽ ghi log các request XHR/fetch (ưu tiên những URL chứa "/ykj/").
+
+  4) Lưu các endpoint bắt được thành spec để api.py gọi lại trực tiếp (xem json_api.py):
+     C:\\TenMien\\.venv\\Scripts\\python.exe C:\\TenMien\\discover_api.py --save api_spec.json
+"""
+from __future__ import annotations
+
+import json
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+from playwright.sync_api import sync_playwright
+
+
+def short(s: str, n: int = 400) -> str:
+    s = s.replace("\r", " ").replace("\n", " ")
+    return s[:n] + ("..." if len(s) > n else "")
+
+
+# Header request được giữ lại trong spec để gọi lại giống trình duyệt
+_REPLAY_HEADERS = ("content-type", "x-requested-with", "referer", "accept")
+
+
+def spec_entry(method: str, url_: str, status: int, ctype: str, req_headers: Dict[str, str], post_data: Optional[str], body: str) -> Dict[str, object]:
+    """Dựng một mục spec có thể phát lại: method, URL gốc, params, post data và mẫu response."""
+    parts = urlsplit(url_)
+    entry: Dict[str, object] = {
+        "method": method,
+        "url": urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")),
+        "params": dict(parse_qsl(parts.query, keep_blank_values=True)),
+        "headers": {k: v for k, v in req_headers.items() if k.lower() in _REPLAY_HEADERS},
+        "post_data": post_data,
+        "post_params": None,
+        "status": status,
+        "content_type": ctype,
+        "response_sample": body[:4000],
+        "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if post_data and "json" not in (req_headers.get("content-type") or "") and "=" in post_data:
+        entry["post_params"] = dict(parse_qsl(post_data, keep_blank_values=True))
+    return entry
+
+
+def save_spec(path: str, entries: List[Dict[str, object]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "endpoints": entries}, f, ensure_ascii=False, indent=2)
+
+
+def run(url: str = "https://am.22.cn/ykj/", save_path: Optional[str] = None) -> None:
+    # (method, URL gốc) -> mục spec; giữ lần bắt gần nhất của mỗi endpoint
+    captured: Dict[tuple, Dict[str, object]] = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=False)
+        context = browser.new_context(
+            user_agent=(
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+            )
+        )
+        page = context.new_page()
+
+        def on_response(response):
+            try:
+                req = response.request
+                rtype = req.resource_type
+                if rtype not in ("xhr", "fetch"):
+                    return
+                url_ = response.url
+                # Ưu tiên các URL liên quan đến ykj
+                if "/ykj/" not in url_ and "/paimai/" not in url_:
+                    return
+                status = response.status
+                method = req.method
+                ctype = response.headers.get("content-type", "")
+                body_preview = ""
+                if "application/json" in ctype:
+                    body = response.text()
+                    body_preview = short(body, 800)
+                elif "text/html" in ctype or "text/plain" in ctype:
+                    body_preview = short(response.text(), 800)
+
+                if save_path and 200 <= status < 300:
+                    body = response.text() if ("json" in ctype or "text/" in ctype) else ""
+                    entry = spec_entry(method, url_, status, ctype, req.headers, req.post_data, body)
+                    captured[(method, entry["url"])] = entry
+
+                print("\n=== XHR/FETCH ===")
+                print(f"{method} {status} {url_}")
+                if req.post_data:
+                    pdata = req.post_data
+                    print(f"POST DATA: {short(pdata, 300)}")
+                if body_preview:
+                    print(f"RESPONSE SAMPLE: {body_preview}")
+            except Exception:
+                pass
+
+        page.on("response", on_response)
+        page.goto(url, wait_until="domcontentloaded")
+
+        print("\n[discover_api] Trình duyệt đã mở. Hãy thao tác tìm kiếm/lọc/phân trang trong 30-60s...")
+        page.wait_for_timeout(45000)
+
+        print("\n[discover_api] Hoàn tất lắng nghe. Đóng trình duyệt.")
+        context.close()
+        browser.close()
+
+    if save_path:
+        save_spec(save_path, list(captured.values()))
+        print(f"[discover_api] Đã lưu {len(captured)} endpoint vào {save_path}")
+
+
+if __name__ == "__main__":
+    # python discover_api.py [url] [--save api_spec.json]
+    u = "https://am.22.cn/ykj/"
+    save: Optional[str] = None
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] == "--save" and i + 1 < len(args):
+            save = args[i + 1]
+            i += 1
+        elif args[i].startswith("http"):
+            u = args[i]
+        i += 1
+    run(u, save)
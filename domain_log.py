@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+domain_log.py
+
+Quản lý data/domains.jsonl (nhật ký các domain đã gửi, mỗi dòng {"domain", "first_seen", "source", ...}):
+- Xoay file: khi file đang ghi vượt `max_bytes` hoặc (daily=True) sang ngày mới, file được nén
+  thành domains-<yyyymmddTHHMMSS>.jsonl.gz và ghi tiếp vào file mới.
+- Gộp (compact): đọc domains.compact.jsonl cũ + mọi file đã xoay, gộp trùng theo domain
+  (first_seen sớm nhất, last_seen muộn nhất, danh sách source/rule/profile) thành
+  domains.compact.jsonl mới, xóa các file đã gộp. Gộp lại nhiều lần cho cùng kết quả.
+  Gộp đọc cả log vào bộ nhớ nên không chạy trong vòng monitor: chạy như một job riêng
+  (`python domain_log.py compact` từ cron, hoặc lệnh `compact` của daemon.py). Giữa hai lần gộp
+  các file đã xoay vẫn nén gzip. `compact_every` > 0 thì tự gộp khi số file đã xoay đạt ngưỡng
+  (mặc định 0: tắt).
+- Chỉ mục domains.compact.idx: header + mảng (hash 64 bit của domain, offset dòng) sắp theo hash,
+  đọc bằng mmap -> tra "lần đầu thấy X là khi nào" bằng tìm kiếm nhị phân thay vì quét cả log.
+  Chỉ mục không khớp kích thước file compact (bị ghi dở) thì bỏ qua và quét tuần tự.
+- File đang ghi có chỉ mục trong bộ nhớ (domain -> offset), mỗi lần lookup chỉ đọc thêm phần mới
+  ghi từ lần trước; tiến trình chạy lâu (daemon) không quét lại cả file. File đã xoay chưa gộp
+  được quét tuần tự. CLI `lookup` gộp trước nếu còn phần chưa gộp, để tra bằng chỉ mục.
+CLI: python domain_log.py [--dir data] lookup <domain>... | stats | rotate | compact
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: không khóa liên tiến trình
+    fcntl = None
+
+ACTIVE = "domains.jsonl"
+COMPACT = "domains.compact.jsonl"
+INDEX = "domains.compact.idx"
+LOCK = "domains.lock"
+SEGMENT_PREFIX = "domains-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+_MAGIC = b"DOMIDX01"
+_HEADER = struct.Struct("<8sQQ")  # magic, số mục, kích thước file compact lúc tạo chỉ mục
+_ENTRY = struct.Struct("<QQ")  # hash domain, offset dòng trong file compact
+
+Record = Dict[str, Any]
+
+
+def domain_hash(domain: str) -> int:
+    return int.from_bytes(hashlib.blake2b(domain.strip().lower().encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _merge(into: Optional[Record], rec: Record) -> Record:
+    """Gộp một bản ghi log (hoặc bản ghi đã gộp) vào bản ghi gộp của cùng domain."""
+    first = rec.get("first_seen") or ""
+    last = rec.get("last_seen") or first
+    lists = {
+        "sources": rec.get("sources") or ([rec["source"]] if rec.get("source") else []),
+        "rules": rec.get("rules") or ([rec["rule"]] if rec.get("rule") else []),
+        "profiles": rec.get("profiles") or ([rec["profile"]] if rec.get("profile") else []),
+    }
+    if into is None:
+        out: Record = {"domain": rec["domain"].strip().lower(), "first_seen": first, "last_seen": last}
+        for key, values in lists.items():
+            if values:
+                out[key] = list(dict.fromkeys(values))
+        return out
+    if first and (not into.get("first_seen") or first < into["first_seen"]):
+        into["first_seen"] = first
+    if last and last > (into.get("last_seen") or ""):
+        into["last_seen"] = last
+    for key, values in lists.items():
+        if values:
+            into[key] = list(dict.fromkeys((into.get(key) or []) + values))
+    return into
+
+
+def _read_lines(path: str) -> Iterator[Record]:
+    """Đọc các bản ghi JSONL (nén gzip nếu đuôi .gz); bỏ dòng hỏng / dòng ghi dở."""
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and rec.get("domain"):
+                    yield rec
+    except (OSError, EOFError):
+        return
+
+
+class DomainLog:
+    def __init__(self, data_dir: str, max_bytes: Optional[int] = 64 * 1024 * 1024, daily: bool = False, compact_every: int = 0):
+        self.data_dir = data_dir
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.compact_every = compact_every
+        self.active_path = os.path.join(data_dir, ACTIVE)
+        self.compact_path = os.path.join(data_dir, COMPACT)
+        self.index_path = os.path.join(data_dir, INDEX)
+        # Chỉ mục trong bộ nhớ của file đang ghi: (inode, offset đã đọc tới, domain -> các offset)
+        self._active_ino: Optional[int] = None
+        self._active_pos = 0
+        self._active_index: Dict[str, List[int]] = {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        os.makedirs(self.data_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.data_dir, LOCK), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def segments(self) -> List[str]:
+        """Các file đã xoay (cũ -> mới)."""
+        try:
+            names = os.listdir(self.data_dir)
+        except OSError:
+            return []
+        return [os.path.join(self.data_dir, n) for n in sorted(names) if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX)]
+
+    # --- ghi -----------------------------------------------------------------------------
+    def append(self, records: Iterable[Record]) -> None:
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        if not lines:
+            return
+        with self._locked():
+            if self.daily and self._active_day() not in (None, date.today()):
+                self._rotate()
+            with open(self.active_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            if self.max_bytes and os.path.getsize(self.active_path) >= self.max_bytes:
+                self._rotate()
+            if self.compact_every and len(self.segments()) >= self.compact_every:
+                self._compact()
+
+    def _active_day(self) -> Optional[date]:
+        try:
+            return date.fromtimestamp(os.path.getmtime(self.active_path))
+        except OSError:
+            return None
+
+    def _rotate(self) -> Optional[str]:
+        if not os.path.exists(self.active_path) or os.path.getsize(self.active_path) == 0:
+            return None
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        target = os.path.join(self.data_dir, f"{SEGMENT_PREFIX}{stamp}{SEGMENT_SUFFIX}")
+        n = 1
+        while os.path.exists(target):
+            n += 1
+            target = os.path.join(self.data_dir, f"{SEGMENT_PREFIX}{stamp}-{n}{SEGMENT_SUFFIX}")
+        moving = self.active_path + ".rotating"
+        os.replace(self.active_path, moving)
+        tmp = target + ".tmp"
+        with open(moving, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, target)
+        os.remove(moving)
+        return target
+
+    def rotate(self) -> Optional[str]:
+        """Xoay file đang ghi ngay (nếu không rỗng); trả về đường dẫn file nén."""
+        with self._locked():
+            return self._rotate()
+
+    def compact(self) -> Dict[str, int]:
+        with self._locked():
+            return self._compact()
+
+    def _compact(self) -> Dict[str, int]:
+        self._rotate()
+        # File .rotating còn sót (dừng giữa lúc xoay) cũng được gộp
+        leftover = self.active_path + ".rotating"
+        segments = self.segments()
+        sources = [self.compact_path] + segments + ([leftover] if os.path.exists(leftover) else [])
+        merged: Dict[str, Record] = {}
+        read = 0
+        for path in sources:
+            for rec in _read_lines(path):
+                key = rec["domain"].strip().lower()
+                merged[key] = _merge(merged.get(key), rec)
+                read += 1
+
+        tmp_data = self.compact_path + ".tmp"
+        tmp_index = self.index_path + ".tmp"
+        entries: List[Tuple[int, int]] = []
+        with open(tmp_data, "wb") as f:
+            for key in sorted(merged):
+                entries.append((domain_hash(key), f.tell()))
+                f.write((json.dumps(merged[key], ensure_ascii=False) + "\n").encode("utf-8"))
+            size = f.tell()
+        entries.sort()
+        with open(tmp_index, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(entries), size))
+            for h, off in entries:
+                f.write(_ENTRY.pack(h, off))
+        os.replace(tmp_data, self.compact_path)
+        os.replace(tmp_index, self.index_path)
+        for path in sources[1:]:
+            os.remove(path)
+        return {"records_read": read, "domains": len(merged), "segments_merged": len(sources) - 1}
+
+    # --- đọc -----------------------------------------------------------------------------
+    def _index_lookup(self, key: str) -> Optional[Optional[Record]]:
+        """Tra trong file compact qua chỉ mục; None nếu không dùng được chỉ mục."""
+        try:
+            fi = open(self.index_path, "rb")
+        except OSError:
+            return None
+        with fi:
+            if os.fstat(fi.fileno()).st_size < _HEADER.size:
+                return None
+            with mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, count, size = _HEADER.unpack_from(mm, 0)
+                if magic != _MAGIC or not os.path.exists(self.compact_path) or os.path.getsize(self.compact_path) != size:
+                    return None
+                h = domain_hash(key)
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if _ENTRY.unpack_from(mm, _HEADER.size + mid * _ENTRY.size)[0] < h:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                offsets = []
+                while lo < count:
+                    eh, off = _ENTRY.unpack_from(mm, _HEADER.size + lo * _ENTRY.size)
+                    if eh != h:
+                        break
+                    offsets.append(off)
+                    lo += 1
+        if not offsets:
+            return {}
+        with open(self.compact_path, "rb") as f:
+            for off in offsets:
+                f.seek(off)
+                rec = json.loads(f.readline())
+                if rec.get("domain") == key:
+                    return rec
+        return {}
+
+    def _active_records(self, key: str) -> List[Record]:
+        """Các bản ghi của `key` trong file đang ghi, qua chỉ mục bộ nhớ (chỉ đọc phần mới ghi thêm)."""
+        try:
+            f = open(self.active_path, "rb")
+        except OSError:
+            return []
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._active_ino or st.st_size < self._active_pos:
+                # File mới (đã xoay) -> đọc lại từ đầu
+                self._active_ino, self._active_pos, self._active_index = st.st_ino, 0, {}
+            f.seek(self._active_pos)
+            pos = self._active_pos
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # dòng đang ghi dở: đọc lại lần sau
+                try:
+                    k = json.loads(line)["domain"].strip().lower()
+                except (ValueError, KeyError, AttributeError):
+                    k = None
+                if k:
+                    self._active_index.setdefault(k, []).append(pos)
+                pos += len(line)
+            self._active_pos = pos
+            out = []
+            for off in self._active_index.get(key, ()):
+                f.seek(off)
+                out.append(json.loads(f.readline()))
+        return out
+
+    def stale(self) -> bool:
+        """Còn phần chưa gộp vào file compact (file đang ghi không rỗng hoặc có file đã xoay)."""
+        return bool(self.segments()) or (os.path.exists(self.active_path) and os.path.getsize(self.active_path) > 0)
+
+    def lookup(self, domain: str) -> Optional[Record]:
+        """Bản ghi gộp của `domain` (first_seen, last_seen, sources...) hoặc None nếu chưa từng thấy."""
+        key = domain.strip().lower()
+        found = self._index_lookup(key)
+        result: Optional[Record] = found or None
+        if found is None:
+            # Không có chỉ mục hợp lệ -> quét file compact
+            for rec in _read_lines(self.compact_path):
+                if rec["domain"] == key:
+                    result = rec
+                    break
+        # File đã xoay chưa gộp (chưa chạy job compact) -> quét tuần tự
+        for path in self.segments():
+            for rec in _read_lines(path):
+                if rec["domain"].strip().lower() == key:
+                    result = _merge(result, rec)
+        for rec in self._active_records(key):
+            result = _merge(result, rec)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        def _size(p: str) -> int:
+            return os.path.getsize(p) if os.path.exists(p) else 0
+
+        segments = self.segments()
+        indexed = 0
+        if _size(self.index_path) >= _HEADER.size:
+            with open(self.index_path, "rb") as f:
+                indexed = _HEADER.unpack(f.read(_HEADER.size))[1]
+        return {
+            "active_bytes": _size(self.active_path),
+            "segments": len(segments),
+            "segment_bytes": sum(_size(p) for p in segments),
+            "compact_bytes": _size(self.compact_path),
+            "indexed_domains": indexed,
+        }
+
+
+def main() -> None:
+    data_dir = os.path.join(os.path.dirname(__file__), "data")
+    rest: List[str] = []
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--dir" and i + 1 < len(args):
+            data_dir = args[i + 1]; i += 1
+        else:
+            rest.append(a)
+        i += 1
+    cmd = rest[0] if rest else ""
+    if cmd not in ("lookup", "stats", "rotate", "compact") or (cmd == "lookup" and len(rest) < 2):
+        print("usage: python domain_log.py [--dir data] lookup <domain>... | stats | rotate | compact")
+        sys.exit(2)
+
+    log = DomainLog(data_dir)
+    if cmd == "lookup":
+        if log.stale():
+            log.compact()
+        missing = 0
+        for d in rest[1:]:
+            t0 = time.perf_counter()
+            rec = log.lookup(d)
+            ms = (time.perf_counter() - t0) * 1000
+            if rec is None:
+                missing += 1
+                print(f"{d}\tchưa thấy\t({ms:.1f}ms)")
+            else:
+                print(f"{d}\tfirst_seen={rec.get('first_seen')}\tlast_seen={rec.get('last_seen')}\t{json.dumps({k: v for k, v in rec.items() if k not in ('domain', 'first_seen', 'last_seen')}, ensure_ascii=False)}\t({ms:.1f}ms)")
+        sys.exit(1 if missing == len(rest) - 1 else 0)
+    elif cmd == "stats":
+        print(json.dumps(log.stats(), ensure_ascii=False))
+    elif cmd == "rotate":
+        print(log.rotate() or "file đang ghi rỗng, không xoay")
+    else:
+        t0 = time.perf_counter()
+        res = log.compact()
+        print(f"{json.dumps(res, ensure_ascii=False)} ({time.perf_counter() - t0:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+exporters.py
+
+Ghi kết quả api.py ra file theo kiểu streaming: mỗi hàng (hoặc mỗi trang) được ghi và flush
+ngay khi có, nên bộ nhớ không tăng theo số hàng và chạy hỏng giữa chừng vẫn giữ được phần đã ghi.
+- ndjson: một object JSON mỗi dòng (.ndjson / .jsonl).
+- csv: schema cố định (mặc định api.TABLE_FIELDS), thiếu khóa -> ô rỗng, thừa khóa -> bỏ qua.
+  Ghi nối được: file cũ phải cùng header; dòng dở dang do lần chạy trước bị ngắt sẽ bị cắt bỏ.
+- json: mảng JSON (định dạng cũ của --json), ghi dần nhưng không ghi nối được.
+- parquet / arrow: cần pyarrow; gom `batch_rows` hàng thành một row group / record batch với cột
+  có kiểu (giá, ngày đăng ký, số ngày đến hạn... qua listing.ListingBatch).
+Nén: gzip (.gz) hoặc zstd (.zst, cần zstandard hoặc Python 3.14+); với parquet/arrow thì dùng
+nén trong định dạng. Xoay file theo dung lượng (rotate_bytes) hoặc thời gian (rotate_secs): mỗi
+phần có tên <tên>-<yyyymmddTHHMMSS>-<số thứ tự><đuôi>.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from listing import ListingBatch
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+
+except Exception:
+    _zstd = None
+
+try:
+    import zstandard as _zstandard
+except Exception:  # chưa cài zstandard
+    _zstandard = None
+
+Row = Dict[str, Any]
+
+FORMATS = ("ndjson", "csv", "json", "parquet", "arrow")
+_FORMAT_EXT = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".json": "json", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+_COMPRESS_EXT = {".gz": "gzip", ".zst": "zstd"}
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+_TIME_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_size(text: str) -> int:
+    """"100M" / "512k" / "1g" / "2048" -> số byte."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*", str(text).lower())
+    if not m:
+        raise ValueError(f"dung lượng không hợp lệ: {text!r} (ví dụ 100M)")
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2)])
+
+
+def parse_duration(text: str) -> float:
+    """"1h" / "30m" / "1d" / "90" (giây) -> số giây."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(text).lower())
+    if not m:
+        raise ValueError(f"khoảng thời gian không hợp lệ: {text!r} (ví dụ 1h)")
+    return float(m.group(1)) * _TIME_UNITS[m.group(2)]
+
+
+def split_path(path: str) -> Tuple[str, Optional[str], Optional[str], str]:
+    """"out/rows.ndjson.gz" -> ("out/rows", "ndjson", "gzip", ".ndjson.gz")."""
+    stem, ext = os.path.splitext(path)
+    compress = _COMPRESS_EXT.get(ext.lower())
+    suffix = ""
+    if compress:
+        suffix = ext
+        stem, ext = os.path.splitext(stem)
+    fmt = _FORMAT_EXT.get(ext.lower())
+    if fmt:
+        suffix = ext + suffix
+    else:
+        stem += ext
+    return stem, fmt, compress, suffix
+
+
+def _zstd_writer(raw: io.BufferedWriter):
+    if _zstd is not None:
+        return _zstd.ZstdFile(raw, mode="w")
+    if _zstandard is not None:
+        return _zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    raise ImportError("nén zstd cần zstandard (pip install zstandard) hoặc Python 3.14+")
+
+
+def _read_first_line(path: str, compress: Optional[str]) -> str:
+    try:
+        if compress == "gzip":
+            with gzip.open(path, "rb") as f:
+                line = f.readline()
+        elif compress == "zstd" and _zstandard is not None:
+            with open(path, "rb") as raw, _zstandard.ZstdDecompressor().stream_reader(raw) as f:
+                line = io.BufferedReader(f).readline()
+        elif compress == "zstd" and _zstd is not None:
+            with _zstd.ZstdFile(path) as f:
+                line = f.readline()
+        else:
+            with open(path, "rb") as f:
+                line = f.readline()
+    except Exception:
+        return ""
+    return line.decode("utf-8-sig", "replace").rstrip("\r\n")
+
+
+def _drop_partial_line(path: str) -> None:
+    """Cắt phần sau ký tự xuống dòng cuối cùng (dòng ghi dở khi lần chạy trước bị ngắt)."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end == 0:
+            return
+        pos = end
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl >= 0:
+                cut = pos - step + nl + 1
+                if cut != end:
+                    f.truncate(cut)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+class RowSink(ABC):
+    """Bộ ghi hàng chung: đặt tên/xoay file, mở luồng (có nén) và flush định kỳ.
+    Lớp con cài đặt _begin() (đầu file), _encode(rows) -> bytes và _end() (cuối file)."""
+
+    appendable = True
+    compressible = True
+
+    def __init__(
+        self,
+        path: str,
+        fields: Sequence[str],
+        compress: Optional[str] = None,
+        append: bool = False,
+        rotate_bytes: Optional[int] = None,
+        rotate_secs: Optional[float] = None,
+        flush_every: int = 1000,
+    ):
+        if compress and not self.compressible:
+            raise ValueError(f"{type(self).__name__} không hỗ trợ nén {compress}")
+        if compress not in (None, "gzip", "zstd"):
+            raise ValueError(f"kiểu nén không hỗ trợ: {compress!r} (gzip|zstd)")
+        self.path = path
+        self.fields = list(fields)
+        self.compress = compress
+        self.resume = append
+        self.append = append and self.appendable
+        self.rotate_bytes = rotate_bytes
+        self.rotate_secs = rotate_secs
+        self.flush_every = max(1, flush_every)
+        self.rows = 0
+        self.files: List[str] = []
+        self._stem, _, _, self._suffix = split_path(path)
+        if self.compress and not _COMPRESS_EXT.get(os.path.splitext(path)[1].lower()):
+            self._suffix += ".gz" if self.compress == "gzip" else ".zst"
+        self._seq = 0
+        self._raw: Optional[io.BufferedWriter] = None
+        self._out: Any = None
+        self._opened_at = 0.0
+        self._pending = 0
+
+    # --- file ------------------------------------------------------------------------
+    def _next_path(self) -> str:
+        rotating = self.rotate_bytes or self.rotate_secs
+        plain = self._stem + self._suffix
+        if not rotating and self._seq == 0 and (self.append or not os.path.exists(plain) or not self._keep_existing()):
+            return plain
+        while True:
+            self._seq += 1
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            candidate = f"{self._stem}-{stamp}-{self._seq:04d}{self._suffix}"
+            if not os.path.exists(candidate):
+                return candidate
+
+    def _keep_existing(self) -> bool:
+        """File đã có mà không ghi nối được (parquet/arrow khi chạy tiếp) -> ghi sang file mới."""
+        return False
+
+    def _open(self) -> None:
+        path = self._next_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fresh = not (self.append and os.path.exists(path) and os.path.getsize(path) > 0)
+        if not fresh:
+            self._check_existing(path)
+            if not self.compress:
+                _drop_partial_line(path)
+        self._raw = open(path, "ab" if self.append else "wb")
+        if self.compress == "gzip":
+            self._out = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif self.compress == "zstd":
+            self._out = _zstd_writer(self._raw)
+        else:
+            self._out = self._raw
+        self._opened_at = time.monotonic()
+        self.files.append(path)
+        head = self._begin(fresh)
+        if head:
+            self._out.write(head)
+
+    def _check_existing(self, path: str) -> None:
+        pass
+
+    def _close_file(self) -> None:
+        if self._out is None:
+            return
+        tail = self._end()
+        if tail:
+            self._out.write(tail)
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.close()
+        self._out = self._raw = None
+
+    def _maybe_rotate(self) -> None:
+        if self._raw is None:
+            return
+        if self.rotate_bytes and self._raw.tell() >= self.rotate_bytes:
+            self._close_file()
+        elif self.rotate_secs and time.monotonic() - self._opened_at >= self.rotate_secs:
+            self._close_file()
+
+    def _flush(self) -> None:
+        if self._out is None:
+            return
+        if self._out is not self._raw:
+            if _zstandard is not None and isinstance(self._out, _zstandard.ZstdCompressionWriter):
+                self._out.flush(_zstandard.FLUSH_BLOCK)
+            else:
+                self._out.flush()
+        self._raw.flush()
+        self._pending = 0
+
+    # --- định dạng (lớp con) -----------------------------------------------------------
+    def _begin(self, fresh: bool) -> bytes:
+        return b""
+
+    @abstractmethod
+    def _encode(self, rows: Sequence[Row]) -> bytes:
+        ...
+
+    def _end(self) -> bytes:
+        return b""
+
+    # --- API ---------------------------------------------------------------------------
+    def write(self, row: Row) -> None:
+        self._write([row])
+        if self._pending >= self.flush_every:
+            self._flush()
+            self._maybe_rotate()
+
+    def write_many(self, rows: Iterable[Row]) -> None:
+        """Ghi một lô (ví dụ một trang) rồi flush ngay."""
+        rows = list(rows)
+        if rows:
+            self._write(rows)
+        self._flush()
+        self._maybe_rotate()
+
+    def _write(self, rows: Sequence[Row]) -> None:
+        if self._out is None:
+            self._open()
+        self._out.write(self._encode(rows))
+        self.rows += len(rows)
+        self._pending += len(rows)
+
+    def close(self) -> None:
+        if self._out is None and not self.files:
+            self._open()  # vẫn tạo file (rỗng / chỉ có header) khi không có hàng nào
+        self._close_file()
+
+    def __enter__(self) -> "RowSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class NdjsonSink(RowSink):
+    def _encode(self, rows: Sequence[Row]) -> bytes:
+        return "".join(json.dumps(dict(r), ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+class CsvSink(RowSink):
+    def _header(self) -> str:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(self.fields)
+        return buf.getvalue().rstrip("\r\n")
+
+    def _check_existing(self, path: str) -> None:
+        header = _read_first_line(path, self.compress)
+        if header and header != self._header():
+            raise ValueError(f"{path}: header CSV ({header}) khác schema ({self._header()}); hãy ghi sang file khác")
+
+    def _begin(self, fresh: bool) -> bytes:
+        if not fresh:
+            return b""
+        # BOM cho Excel như bản cũ (utf-8-sig); file nén thì không cần
+        bom = "" if self.compress else "\ufeff"
+        return (bom + self._header() + "\r\n").encode("utf-8")
+
+    def _encode(self, rows: Sequence[Row]) -> bytes:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=self.fields, extrasaction="ignore")
+        writer.writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+
+class JsonArraySink(RowSink):
+    """Mảng JSON như --json cũ; phải close() thì file mới hợp lệ."""
+
+    appendable = False
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._first = True
+
+    def _begin(self, fresh: bool) -> bytes:
+        self._first = True
+        return b"["
+
+    def _encode(self, rows: Sequence[Row]) -> bytes:
+        parts = []
+        for r in rows:
+            parts.append(("\n" if self._first else ",\n") + json.dumps(dict(r), ensure_ascii=False))
+            self._first = False
+        return "".join(parts).encode("utf-8")
+
+    def _end(self) -> bytes:
+        return b"\n]\n"
+
+
+def _arrow_schema(pa: Any) -> Any:
+    return pa.schema([
+        ("listing_id", pa.int64()),
+        ("domain", pa.string()),
+        ("summary", pa.string()),
+        ("registrar", pa.string()),
+        ("price", pa.int64()),
+        ("time_left_s", pa.int64()),
+        ("registration_date", pa.date32()),
+        ("days_to_expire", pa.int64()),
+        ("detail_url", pa.string()),
+    ])
+
+
+def _arrow_batch(pa: Any, schema: Any, rows: Sequence[Row]) -> Any:
+    b = ListingBatch(rows)
+    columns = [
+        b.column("ids"),
+        b.domains,
+        b.summaries,
+        b.registrars,
+        b.column("prices"),
+        b.column("time_left"),
+        [date.fromordinal(o) if o is not None else None for o in b.column("reg_ordinals")],
+        b.column("days_to_expire"),
+        [r.detail_url for r in b],
+    ]
+    return pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+
+
+class ArrowSink(RowSink):
+    """Parquet (row group mỗi `batch_rows` hàng) hoặc Arrow IPC file, cột có kiểu. Cần pyarrow."""
+
+    appendable = False
+    compressible = False
+
+    def __init__(self, path: str, fields: Sequence[str], fmt: str = "parquet", compress: Optional[str] = None, batch_rows: int = 50_000, **kwargs: Any):
+        try:
+            import pyarrow as pa
+        except Exception:
+            raise ImportError("xuất parquet/arrow cần pyarrow (pip install pyarrow)")
+        if fmt == "arrow" and compress == "gzip":
+            raise ValueError("Arrow IPC chỉ hỗ trợ nén zstd/lz4")
+        super().__init__(path, fields, **kwargs)
+        self.fmt = fmt
+        self.codec = compress
+        self.batch_rows = max(1, batch_rows)
+        self._pa = pa
+        self._schema = _arrow_schema(pa)
+        self._writer: Any = None
+        self._buffer: List[Row] = []
+
+    def _keep_existing(self) -> bool:
+        return self.resume
+
+    def _open(self) -> None:
+        path = self._next_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self._schema, compression=self.codec or "snappy")
+        else:
+            options = self._pa.ipc.IpcWriteOptions(compression=self.codec) if self.codec else None
+            self._writer = self._pa.ipc.new_file(path, self._schema, options=options)
+        self._opened_at = time.monotonic()
+        self.files.append(path)
+
+    def _write(self, rows: Sequence[Row]) -> None:
+        self._buffer.extend(rows)
+        self.rows += len(rows)
+        if len(self._buffer) >= self.batch_rows:
+            self._flush()
+
+    def write(self, row: Row) -> None:
+        self._write([row])
+        self._maybe_rotate()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        if self._writer is None:
+            self._open()
+        batch = self._encode(self._buffer)
+        self._buffer = []
+        self._writer.write_batch(batch)
+
+    def _encode(self, rows: Sequence[Row]) -> Any:
+        """Lô hàng -> RecordBatch (writer của pyarrow tự mã hóa ra file)."""
+        return _arrow_batch(self._pa, self._schema, rows)
+
+    def write_many(self, rows: Iterable[Row]) -> None:
+        """Parquet/Arrow chỉ flush khi đủ `batch_rows` (row group quá nhỏ đọc rất chậm)."""
+        self._write(list(rows))
+        self._maybe_rotate()
+
+    def _maybe_rotate(self) -> None:
+        if self._writer is None:
+            return
+        path = self.files[-1]
+        if self.rotate_bytes and os.path.exists(path) and os.path.getsize(path) >= self.rotate_bytes:
+            self._close_file()
+        elif self.rotate_secs and time.monotonic() - self._opened_at >= self.rotate_secs:
+            self._flush()
+            self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is None and not self.files:
+            self._open()
+        self._close_file()
+
+
+class MultiSink:
+    """Ghi cùng lúc ra nhiều sink (ví dụ --csv và --ndjson)."""
+
+    def __init__(self, sinks: Iterable[RowSink]):
+        self.sinks = list(sinks)
+
+    def write(self, row: Row) -> None:
+        for s in self.sinks:
+            s.write(row)
+
+    def write_many(self, rows: Iterable[Row]) -> None:
+        rows = list(rows)
+        for s in self.sinks:
+            s.write_many(rows)
+
+    def close(self) -> None:
+        errors = []
+        for s in self.sinks:
+            try:
+                s.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    @property
+    def files(self) -> List[str]:
+        return [p for s in self.sinks for p in s.files]
+
+    def __enter__(self) -> "MultiSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_sink(
+    path: str,
+    fmt: Optional[str] = None,
+    fields: Sequence[str] = (),
+    compress: Optional[str] = None,
+    append: bool = False,
+    rotate_bytes: Optional[int] = None,
+    rotate_secs: Optional[float] = None,
+    batch_rows: int = 50_000,
+) -> RowSink:
+    """Mở sink theo `fmt` (mặc định đoán từ đuôi file; không rõ thì ndjson). Nén mặc định đoán
+    từ đuôi .gz/.zst. `fields` rỗng = api.TABLE_FIELDS."""
+    if not fields:
+        from api import TABLE_FIELDS
+        fields = TABLE_FIELDS
+    _, guessed_fmt, guessed_compress, _ = split_path(path)
+    fmt = fmt or guessed_fmt or "ndjson"
+    compress = compress or guessed_compress
+    if fmt not in FORMATS:
+        raise ValueError(f"định dạng không hỗ trợ: {fmt!r} ({'|'.join(FORMATS)})")
+    kwargs = dict(append=append, rotate_bytes=rotate_bytes, rotate_secs=rotate_secs)
+    if fmt in ("parquet", "arrow"):
+        return ArrowSink(path, fields, fmt=fmt, compress=compress, batch_rows=batch_rows, **kwargs)
+    cls = {"ndjson": NdjsonSink, "csv": CsvSink, "json": JsonArraySink}[fmt]
+    return cls(path, fields, compress=compress, **kwargs)
+
+
+def open_sinks(
+    targets: Iterable[Tuple[str, Optional[str]]],
+    fields: Sequence[str] = (),
+    compress: Optional[str] = None,
+    append: bool = False,
+    rotate_bytes: Optional[int] = None,
+    rotate_secs: Optional[float] = None,
+) -> Optional[MultiSink]:
+    """[(đường dẫn, định dạng hoặc None)] -> MultiSink; None nếu không có đích nào."""
+    sinks = [
+        open_sink(path, fmt, fields=fields, compress=compress, append=append, rotate_bytes=rotate_bytes, rotate_secs=rotate_secs)
+        for path, fmt in targets
+    ]
+    return MultiSink(sinks) if sinks else None
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+fetcher.py
+
+Lớp tải HTTP cho api.py có giới hạn thời gian theo vòng, lỗi có kiểu, circuit breaker theo host
+và (tùy chọn) hedged request:
+- Lỗi có kiểu: FetchError(kind, message, status) với kind thuộc KINDS, thay cho việc nuốt mọi
+  exception rồi trả None. api._get_with_error vẫn trả chuỗi mô tả (str(FetchError)).
+- Hạn chót theo vòng: `with cycle_deadline(60):` (botte.monitor bọc mỗi vòng) -> mọi lần tải trong
+  vòng (kể cả các luồng tải trang chi tiết) bị cắt timeout theo thời gian còn lại; hết hạn thì
+  trả lỗi "deadline" ngay. Thử lại (RETRIES lần, backoff lũy thừa, tôn trọng Retry-After) do lớp
+  này làm thay cho urllib3 Retry, và chỉ thử khi còn đủ thời gian.
+- Circuit breaker mỗi host: mở khi lỗi liên tiếp >= BREAKER_FAILURES hoặc tỉ lệ lỗi trong
+  BREAKER_WINDOW lần gần nhất >= BREAKER_RATE; khi mở, mọi yêu cầu tới host trả "circuit_open"
+  ngay; sau thời gian nghỉ (tăng gấp đôi mỗi lần mở lại, tối đa BREAKER_MAX_COOLDOWN) cho đúng một
+  yêu cầu thử (half-open). healthy(url) cho botte biết có nên chạy fallback trang chi tiết không.
+  Lỗi 4xx (trừ 429) không tính là lỗi của host: host đã trả lời, nên yêu cầu thử half-open nhận
+  4xx cũng đóng breaker; yêu cầu thử bị bỏ vì hết hạn chót thì nhường lượt thử cho lần sau.
+- Hedged request: HEDGE_AFTER giây (hoặc "auto" = p95 độ trễ gần đây của host) mà yêu cầu chưa
+  xong thì gửi thêm một yêu cầu giống hệt, lấy kết quả về trước (chỉ với GET).
+- request() mặc định là GET; endpoint JSON phát lại (json_api.py) truyền method/params/data.
+- Thống kê theo host (requests, failures, từng loại lỗi, hedges...) qua stats()/cycle_report()
+  để monitor in ra log mỗi vòng.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+KINDS = ("timeout", "connect", "http_5xx", "rate_limited", "http_4xx", "circuit_open", "deadline", "other")
+# Các loại lỗi được tính vào breaker / được thử lại
+_HOST_FAILURES = ("timeout", "connect", "http_5xx", "rate_limited", "other")
+
+RETRIES = 2
+BACKOFF = 1.5
+MAX_RETRY_AFTER = 30.0
+CONNECT_TIMEOUT = 10.0
+HEDGE_AFTER: Union[float, str, None] = None
+BREAKER_FAILURES = 5
+BREAKER_WINDOW = 20
+BREAKER_RATE = 0.5
+BREAKER_COOLDOWN = 15.0
+BREAKER_MAX_COOLDOWN = 300.0
+
+
+class FetchError:
+    __slots__ = ("kind", "message", "status", "retry_after")
+
+    def __init__(self, kind: str, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        self.kind = kind
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"FetchError({self.kind!r}, {self.message!r}, status={self.status})"
+
+
+def _classify(exc: BaseException) -> FetchError:
+    if isinstance(exc, requests.Timeout):
+        return FetchError("timeout", f"{type(exc).__name__}: {exc}")
+    if isinstance(exc, requests.ConnectionError):
+        return FetchError("connect", f"{type(exc).__name__}: {exc}")
+    return FetchError("other", f"{type(exc).__name__}: {exc}")
+
+
+def _status_error(resp: requests.Response) -> Optional[FetchError]:
+    code = resp.status_code
+    if code < 400:
+        return None
+    retry_after = None
+    try:
+        retry_after = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        pass
+    if code == 429:
+        return FetchError("rate_limited", f"HTTP 429 {resp.reason}", code, retry_after)
+    if code >= 500:
+        return FetchError("http_5xx", f"HTTP {code} {resp.reason}", code, retry_after)
+    return FetchError("http_4xx", f"HTTP {code} {resp.reason}", code)
+
+
+# --- hạn chót theo vòng ----------------------------------------------------------------------
+_DEADLINE: Optional[float] = None
+
+
+@contextmanager
+def cycle_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Mọi lần tải trong khối `with` (mọi luồng) phải xong trong `seconds` giây; None = không giới hạn."""
+    global _DEADLINE
+    prev = _DEADLINE
+    _DEADLINE = time.monotonic() + seconds if seconds else None
+    try:
+        yield
+    finally:
+        _DEADLINE = prev
+
+
+def remaining() -> Optional[float]:
+    return None if _DEADLINE is None else _DEADLINE - time.monotonic()
+
+
+# --- circuit breaker ---------------------------------------------------------------------------
+class CircuitBreaker:
+    """closed -> open (fail fast) -> half_open (một yêu cầu thử) -> closed / open."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = "closed"
+        self.consecutive = 0
+        self.window: Deque[bool] = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.opens = 0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probe = False
+            if self.state == "half_open" and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self.window.append(ok)
+            if ok:
+                self.consecutive = 0
+                if self.state != "closed":
+                    print(f"[fetch] {self.host}: breaker đóng lại")
+                    self.state = "closed"
+                    self.cooldown = BREAKER_COOLDOWN
+                return
+            self.consecutive += 1
+            if self.state == "half_open":
+                self._open(min(self.cooldown * 2, BREAKER_MAX_COOLDOWN))
+                return
+            fails = self.window.count(False)
+            if self.state == "closed" and (
+                self.consecutive >= BREAKER_FAILURES
+                or (len(self.window) >= BREAKER_WINDOW // 2 and fails / len(self.window) >= BREAKER_RATE)
+            ):
+                self._open(self.cooldown)
+
+    def release(self) -> None:
+        """Yêu cầu thử (half-open) bị bỏ dở (hết hạn chót vòng) -> cho phép thử lại lần sau."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probe = False
+
+    def _open(self, cooldown: float) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.cooldown = cooldown
+        self.opens += 1
+        metrics.inc("breaker_opens")
+        print(f"[fetch] {self.host}: breaker mở {cooldown:.0f}s (lỗi liên tiếp={self.consecutive})")
+
+
+class _HostStats:
+    def __init__(self, host: str):
+        self.breaker = CircuitBreaker(host)
+        self.latencies: Deque[float] = deque(maxlen=50)
+        self.counts: Dict[str, int] = {"requests": 0, "ok": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        self.last_ok = True
+
+    def hedge_after(self) -> Optional[float]:
+        if HEDGE_AFTER is None:
+            return None
+        if HEDGE_AFTER != "auto":
+            return float(HEDGE_AFTER)
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return max(0.2, ordered[int(len(ordered) * 0.95) - 1])
+
+
+_HOSTS: Dict[str, _HostStats] = {}
+_HOSTS_LOCK = threading.Lock()
+_LAST_REPORT: Dict[str, Dict[str, int]] = {}
+_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _host(url: str) -> _HostStats:
+    host = urlsplit(url).netloc.lower()
+    h = _HOSTS.get(host)
+    if h is None:
+        with _HOSTS_LOCK:
+            h = _HOSTS.setdefault(host, _HostStats(host))
+    return h
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _HOSTS_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fetch")
+    return _POOL
+
+
+def healthy(url: str) -> bool:
+    """Host của `url` còn dùng được: breaker đóng và yêu cầu gần nhất thành công, còn thời gian."""
+    h = _host(url)
+    left = remaining()
+    return h.breaker.state == "closed" and h.last_ok and (left is None or left > 1.0)
+
+
+def _count(h: _HostStats, key: str, n: int = 1) -> None:
+    with _HOSTS_LOCK:
+        h.counts[key] = h.counts.get(key, 0) + n
+
+
+# --- tải -------------------------------------------------------------------------------------
+def _attempt(session: requests.Session, url: str, headers: Dict[str, str], timeout: float, stream: bool, method: str = "GET", params: Any = None, data: Any = None) -> Tuple[Optional[requests.Response], Optional[FetchError], float]:
+    t0 = time.perf_counter()
+    try:
+        resp = session.request(method, url, params=params, data=data, headers=headers, timeout=(min(CONNECT_TIMEOUT, timeout), timeout), stream=stream)
+    except Exception as e:
+        return None, _classify(e), time.perf_counter() - t0
+    err = _status_error(resp)
+    if err is not None:
+        resp.close()
+        return None, err, time.perf_counter() - t0
+    return resp, None, time.perf_counter() - t0
+
+
+def _hedged(session: requests.Session, url: str, headers: Dict[str, str], timeout: float, stream: bool, h: _HostStats, method: str = "GET", params: Any = None, data: Any = None) -> Tuple[Optional[requests.Response], Optional[FetchError], float]:
+    """Một lần thử có giới hạn tổng thời gian (hạn chót vòng) và có thể gửi yêu cầu dự phòng."""
+    left = remaining()
+    hedge = None if stream or method != "GET" else h.hedge_after()
+    if left is None and hedge is None:
+        return _attempt(session, url, headers, timeout, stream, method, params, data)
+    budget = timeout if left is None else min(timeout, left)
+    t0 = time.perf_counter()
+    futures = [_pool().submit(_attempt, session, url, headers, budget, stream, method, params, data)]
+    if hedge is not None and hedge < budget:
+        done, _ = wait(futures, timeout=hedge)
+        if not done:
+            _count(h, "hedges")
+            metrics.inc("hedged_requests")
+            futures.append(_pool().submit(_attempt, session, url, headers, budget - hedge, stream))
+    pending = set(futures)
+    result: Optional[Tuple[Optional[requests.Response], Optional[FetchError], float]] = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, budget - (time.perf_counter() - t0)), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            res = fut.result()
+            if res[0] is not None:
+                if fut is not futures[0]:
+                    _count(h, "hedge_wins")
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return res
+            result = result or res
+    for other in pending:
+        other.add_done_callback(_discard)
+    if result is not None:
+        return result
+    return None, FetchError("deadline", f"quá {budget:.1f}s (hạn chót vòng)"), time.perf_counter() - t0
+
+
+def _discard(fut: Future) -> None:
+    """Yêu cầu bị bỏ (thua hedge / quá hạn): đóng response nếu nó vẫn về."""
+    try:
+        resp = fut.result()[0]
+    except Exception:
+        return
+    if resp is not None:
+        resp.close()
+
+
+def request(session: requests.Session, url: str, headers: Dict[str, str], timeout: float = 20, stream: bool = False, method: str = "GET", params: Any = None, data: Any = None) -> Tuple[Optional[requests.Response], Optional[FetchError]]:
+    """Tải qua breaker + hạn chót + thử lại (+ hedge với GET). Trả về (response, None) hoặc (None, FetchError)."""
+    h = _host(url)
+    attempt = 0
+    while True:
+        err: Optional[FetchError] = None
+        left = remaining()
+        if left is not None and left <= 0:
+            err = FetchError("deadline", "hết thời gian của vòng")
+        elif not h.breaker.allow():
+            err = FetchError("circuit_open", f"{h.breaker.host} đang bị ngắt (breaker mở)")
+        if err is not None:
+            _count(h, err.kind)
+            metrics.inc(f"fetch_{err.kind}")
+            break
+        _count(h, "requests")
+        resp, err, elapsed = _hedged(session, url, headers, timeout, stream, h, method, params, data)
+        if err is None:
+            h.breaker.record(True)
+            h.last_ok = True
+            h.latencies.append(elapsed)
+            _count(h, "ok")
+            return resp, None
+        _count(h, err.kind)
+        metrics.inc(f"fetch_{err.kind}")
+        if err.kind in _HOST_FAILURES:
+            h.breaker.record(False)
+        elif err.kind == "http_4xx":
+            h.breaker.record(True)  # host vẫn trả lời (404...), không phải lỗi của host
+        else:
+            h.breaker.release()
+        if err.kind not in _HOST_FAILURES or attempt >= RETRIES:
+            break
+        # Chờ trước khi thử lại (Retry-After nếu có), nhưng không vượt hạn chót
+        delay = min(err.retry_after if err.retry_after is not None else BACKOFF * (2 ** attempt), MAX_RETRY_AFTER)
+        left = remaining()
+        if left is not None and delay >= left:
+            break
+        attempt += 1
+        _count(h, "retries")
+        metrics.inc("http_retries")
+        time.sleep(delay)
+    if err.kind != "http_4xx":
+        h.last_ok = False
+    return None, err
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    with _HOSTS_LOCK:
+        for host, h in _HOSTS.items():
+            out[host] = dict(h.counts, breaker=h.breaker.state, breaker_opens=h.breaker.opens)
+    return out
+
+
+def cycle_report() -> Dict[str, Dict[str, Any]]:
+    """Chênh lệch số liệu theo host từ lần gọi trước, kèm tỉ lệ lỗi; chỉ các host có hoạt động."""
+    report: Dict[str, Dict[str, Any]] = {}
+    for host, cur in stats().items():
+        prev = _LAST_REPORT.get(host, {})
+        delta = {k: v - prev.get(k, 0) for k, v in cur.items() if isinstance(v, int) and v != prev.get(k, 0)}
+        _LAST_REPORT[host] = {k: v for k, v in cur.items() if isinstance(v, int)}
+        if not delta and cur["breaker"] == "closed":
+            continue
+        requests_n = delta.get("requests", 0)
+        failures = sum(delta.get(k, 0) for k in _HOST_FAILURES + ("deadline", "circuit_open"))
+        delta["failure_rate"] = round(failures / max(1, requests_n + delta.get("circuit_open", 0) + delta.get("deadline", 0)), 3)
+        delta["breaker"] = cur["breaker"]
+        report[host] = delta
+    return report
+
+
+def format_report(report: Dict[str, Dict[str, Any]]) -> str:
+    parts = []
+    for host, d in report.items():
+        kinds = " ".join(f"{k}={d[k]}" for k in KINDS if d.get(k))
+        parts.append(f"{host} req={d.get('requests', 0)} ok={d.get('ok', 0)} fail={d['failure_rate']:.0%} breaker={d['breaker']}" + (f" {kinds}" if kinds else "") + (f" hedges={d['hedges']}/{d.get('hedge_wins', 0)}" if d.get("hedges") else ""))
+    return "; ".join(parts)
+
+
+def reset() -> None:
+    with _HOSTS_LOCK:
+        _HOSTS.clear()
+    _LAST_REPORT.clear()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+json_api.py
+
+Gọi trực tiếp các endpoint nội bộ (XHR/fetch) mà discover_api.py đã bắt và lưu thành spec
+(`python discover_api.py --save api_spec.json`), thay vì tải + parse cả trang HTML.
+
+- Phát lại request với đúng method/params/post data đã bắt, ghi đè các bộ lọc:
+  nhà đăng ký, khoảng giá, số dòng mỗi trang, số trang.
+- Response JSON: tìm danh sách bản ghi lớn nhất rồi ánh xạ tên khóa về dict hàng chuẩn
+  (domain, summary, registrar, price, time_left, registration_date, days_to_expire, detail_url).
+- Response là mảnh HTML (<tr>...) thì dùng lại parsers.parse_listing.
+Tên tham số/khóa thật của am.22.cn phụ thuộc dữ liệu bắt được nên được đoán qua bảng alias;
+có thể ghi đè bằng "param_map" trong từng endpoint của spec.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+import fetcher
+import metrics
+from parsers import parse_listing
+
+Row = Dict[str, Optional[str]]
+
+# Tên tham số lọc thường gặp (so khớp không phân biệt hoa thường), phần tử đầu dùng khi phải thêm mới
+FILTER_PARAMS: Dict[str, Tuple[str, ...]] = {
+    "registrar": ("registrar", "zcs", "registrarid"),
+    "min_price": ("minprice", "txtminprice", "pricestart", "price_min", "startprice"),
+    "max_price": ("maxprice", "txtmaxprice", "priceend", "price_max", "endprice"),
+    "page_size": ("pagecount", "pagesize", "size", "rows", "limit"),
+    "page": ("page", "pageindex", "pagenum", "p", "currentpage"),
+}
+
+# Giá trị của <select id="registrar"> trên am.22.cn/ykj/
+REGISTRAR_CODES = {"all": "0", "全部注册商": "0", "22.cn": "1", "爱名网": "1", "other": "2", "其它注册商": "2", "premium": "3", "溢价域名": "3"}
+
+# Khóa JSON -> trường hàng chuẩn
+FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "domain": ("domain", "domainname", "domain_name", "name", "ym"),
+    "summary": ("summary", "intro", "description", "desc", "jianjie", "remark"),
+    "registrar": ("registrar", "registrarname", "zcs"),
+    "price": ("price", "nowprice", "currentprice", "curprice", "jg", "money"),
+    "time_left": ("time_left", "lefttime", "remaintime", "shengyu", "endtime", "enddate"),
+    "registration_date": ("registration_date", "registerdate", "regdate", "regtime", "zcsj"),
+    "days_to_expire": ("days_to_expire", "rexpiredate", "expiredays", "daystoexpire", "dqts"),
+    "detail_url": ("detail_url", "url", "link", "href"),
+}
+_ID_KEYS = ("id", "auctionid", "ykjid", "domainid", "chujiaid")
+
+
+def load_spec(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("endpoints", []) if isinstance(data, dict) else list(data)
+
+
+def pick_endpoint(endpoints: List[Dict[str, Any]], hint: str = "/ykj/") -> Optional[Dict[str, Any]]:
+    """Chọn endpoint danh sách: ưu tiên URL chứa `hint`, response JSON, mẫu response dài nhất."""
+    def score(ep: Dict[str, Any]) -> Tuple[int, int, int]:
+        return (
+            int(hint in str(ep.get("url", ""))),
+            int("json" in str(ep.get("content_type", ""))),
+            len(str(ep.get("response_sample") or "")),
+        )
+
+    return max(endpoints, key=score) if endpoints else None
+
+
+def _set_filter(fields: Dict[str, str], name: str, value: Any, param_map: Dict[str, str]) -> bool:
+    """Ghi đè tham số lọc `name` trong `fields` nếu có khóa khớp; trả về True nếu đã ghi."""
+    if name in param_map:
+        fields[param_map[name]] = str(value)
+        return True
+    lower = {k.lower(): k for k in fields}
+    for alias in FILTER_PARAMS[name]:
+        if alias in lower:
+            fields[lower[alias]] = str(value)
+            return True
+    return False
+
+
+def build_request(
+    endpoint: Dict[str, Any],
+    registrar: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    page_size: Optional[int] = None,
+    page: Optional[int] = None,
+) -> Tuple[str, str, Dict[str, str], Optional[Any]]:
+    """Trả về (method, url, params, data) sẵn sàng cho session.request()."""
+    method = str(endpoint.get("method") or "GET").upper()
+    params: Dict[str, str] = dict(endpoint.get("params") or {})
+    post_params = endpoint.get("post_params")
+    form: Optional[Dict[str, str]] = dict(post_params) if isinstance(post_params, dict) else None
+    param_map: Dict[str, str] = dict(endpoint.get("param_map") or {})
+
+    if registrar is not None:
+        registrar = REGISTRAR_CODES.get(str(registrar), str(registrar))
+    filters = {"registrar": registrar, "min_price": min_price, "max_price": max_price, "page_size": page_size, "page": page}
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, float):
+            value = f"{value:g}"
+        if form is not None and _set_filter(form, name, value, param_map):
+            continue
+        if not _set_filter(params, name, value, param_map):
+            # Chưa có khóa nào khớp: thêm vào nơi request vốn gửi dữ liệu
+            (form if form is not None else params)[FILTER_PARAMS[name][0]] = str(value)
+
+    data: Optional[Any] = form if form is not None else endpoint.get("post_data")
+    return method, str(endpoint["url"]), params, data
+
+
+def _records(payload: Any) -> List[Dict[str, Any]]:
+    """Tìm danh sách dict lớn nhất trong JSON (bất kể lồng ở khóa nào)."""
+    best: List[Dict[str, Any]] = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            dicts = [x for x in node if isinstance(x, dict)]
+            if len(dicts) > len(best):
+                best = dicts
+            stack.extend(node)
+        elif isinstance(node, dict):
+            stack.extend(node.values())
+    return best
+
+
+def rows_from_json(payload: Any, base_url: str) -> List[Row]:
+    rows: List[Row] = []
+    for rec in _records(payload):
+        lower = {str(k).lower(): v for k, v in rec.items()}
+        row: Row = {}
+        for field, aliases in FIELD_ALIASES.items():
+            value = next((lower[a] for a in aliases if lower.get(a) not in (None, "")), None)
+            row[field] = str(value).strip() if value is not None else None
+        domain = row.get("domain")
+        if not domain or "." not in domain:
+            continue
+        if row.get("detail_url"):
+            row["detail_url"] = urljoin(base_url, row["detail_url"])
+        else:
+            listing_id = next((lower[k] for k in _ID_KEYS if lower.get(k) not in (None, "")), None)
+            row["detail_url"] = urljoin(base_url, f"/ykj/chujia_{listing_id}.html") if listing_id is not None else None
+        rows.append(row)
+    return rows
+
+
+def rows_from_html_fragment(text: str, base_url: str) -> List[Row]:
+    if "buynow_list" not in text and "<table" not in text.lower():
+        text = f'<table><tbody id="buynow_list">{text}</tbody></table>'
+    return parse_listing(text, base_url, None)
+
+
+def query_listing(
+    endpoint: Dict[str, Any],
+    session: Optional[requests.Session] = None,
+    timeout: int = 20,
+    **filters: Any,
+) -> List[Row]:
+    """Gọi endpoint danh sách với bộ lọc (registrar, min_price, max_price, page_size, page).
+    Tải qua fetcher.request như mọi trang khác (hạn chót vòng, breaker theo host, thử lại);
+    lỗi tải -> requests.RequestException mang mô tả FetchError."""
+    method, url, params, data = build_request(endpoint, **filters)
+    headers = {"X-Requested-With": "XMLHttpRequest"}
+    headers.update(endpoint.get("headers") or {})
+    s = session or requests.Session()
+    metrics.inc("http_requests")
+    with metrics.span("fetch"):
+        resp, err = fetcher.request(s, url, headers, timeout, method=method, params=params, data=data)
+    if err is not None:
+        metrics.inc("http_errors")
+        raise requests.RequestException(str(err))
+    metrics.inc("bytes_downloaded", len(resp.content))
+    ctype = resp.headers.get("Content-Type", "")
+    text = resp.text
+    if "json" in ctype or text.lstrip()[:1] in ("{", "["):
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            payload = None
+        if payload is not None:
+            # Một số endpoint bọc mảnh HTML trong JSON ({"html": "<tr>..."})
+            rows = rows_from_json(payload, url)
+            if rows:
+                return rows
+            html_parts = [v for v in (payload.values() if isinstance(payload, dict) else []) if isinstance(v, str) and "<tr" in v]
+            return rows_from_html_fragment("".join(html_parts), url) if html_parts else []
+    return rows_from_html_fragment(text, url)
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+listing.py
+
+Dạng hàng có kiểu cho bảng 一口价, thay cho dict 8 chuỗi thô của parser:
+- Listing: một hàng với __slots__; giá (int, nhân dân tệ), mã listing (int), ngày đăng ký (ordinal),
+  thời gian còn lại (giây), số ngày đến hạn (int). Chuỗi thô chỉ được parse MỘT lần khi tạo.
+- ListingBatch: lô dạng cột (array('q') cho các cột số, list cho chuỗi, registrar được intern,
+  detail_url chuẩn không lưu lại) cho crawl toàn catalogue.
+Cả hai vẫn dùng được như dict cũ: row["price"] / row.get("registration_date") trả về đúng chuỗi
+của hàng gốc ("￥88", "2021-08-22", "2时43分", "1天"), nên code cũ chạy nguyên; code mới đọc thẳng
+thuộc tính có kiểu (row.price, row.reg_ordinal...) hoặc cả cột (batch.prices).
+Chuỗi định dạng lại từ giá trị có kiểu khác chuỗi gốc ("￥1,888", "￥88.5", "1天", "15分钟20秒",
+summary None...) thì chuỗi gốc được giữ riêng trong `raw` (thưa: chỉ các trường lệch), nên phần
+tương thích dict không mất dữ liệu; giá trị có kiểu vẫn là dạng đã parse (giá làm tròn về đồng).
+"""
+from __future__ import annotations
+
+import re
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from parsers import listing_id_from_url
+
+FIELDS = ("domain", "summary", "registrar", "price", "time_left", "registration_date", "days_to_expire", "detail_url")
+# Giá trị thay cho None trong các cột array('q')
+MISSING = -(2 ** 63)
+
+_PRICE_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_INT_RE = re.compile(r"-?\d+")
+_DURATION_RE = re.compile(r"(\d+)\s*(天|小时|时|分钟|分|秒)")
+_UNIT_SECONDS = {"天": 86400, "小时": 3600, "时": 3600, "分钟": 60, "分": 60, "秒": 1}
+
+
+def parse_price(text: Optional[str]) -> Optional[float]:
+    """"￥1,888" / "88元" / "88.5" -> số; None nếu không đọc được."""
+    if not text:
+        return None
+    m = _PRICE_RE.search(str(text))
+    if not m:
+        return None
+    try:
+        return float(m.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_int(text: Optional[str]) -> Optional[int]:
+    """"219天" -> 219."""
+    if text is None:
+        return None
+    m = _INT_RE.search(str(text))
+    return int(m.group(0)) if m else None
+
+
+def parse_date_ordinal(text: Optional[str]) -> Optional[int]:
+    """"2021-08-22" (có thể kèm giờ) -> date.toordinal()."""
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(str(text).strip()[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def parse_time_left(text: Optional[str]) -> Optional[int]:
+    """"2时43分" / "1天3小时" / "15分钟20秒" -> số giây."""
+    if not text:
+        return None
+    parts = _DURATION_RE.findall(str(text))
+    if not parts:
+        return None
+    return sum(int(n) * _UNIT_SECONDS[u] for n, u in parts)
+
+
+def format_time_left(seconds: Optional[int]) -> Optional[str]:
+    if seconds is None:
+        return None
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    out = (f"{days}天" if days else "") + f"{hours}时{minutes}分"
+    return out + (f"{secs}秒" if secs else "")
+
+
+class _RowView(Mapping):
+    """Phần tương thích dict: khóa/giá trị chuỗi giống api.get_table_rows."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Optional[str]:
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, "_field_" + key)()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return {k: self[k] for k in FIELDS}
+
+
+class Listing(_RowView):
+    __slots__ = ("id", "domain", "summary", "registrar", "price", "time_left_s", "reg_ordinal", "days_to_expire", "detail_url", "raw")
+
+    def __init__(
+        self,
+        domain: str,
+        id: Optional[int] = None,
+        summary: Optional[str] = None,
+        registrar: Optional[str] = None,
+        price: Optional[int] = None,
+        time_left_s: Optional[int] = None,
+        reg_ordinal: Optional[int] = None,
+        days_to_expire: Optional[int] = None,
+        detail_url: Optional[str] = None,
+        raw: Optional[Dict[str, Optional[str]]] = None,
+    ):
+        self.id = id
+        self.domain = domain
+        self.summary = summary
+        self.registrar = registrar
+        self.price = price
+        self.time_left_s = time_left_s
+        self.reg_ordinal = reg_ordinal
+        self.days_to_expire = days_to_expire
+        self.detail_url = detail_url
+        # Chuỗi gốc của các trường mà dạng định dạng lại không khớp (None = mọi trường khớp)
+        self.raw = raw
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Listing":
+        """Parse một dict hàng thô (của parsers/json_api) thành Listing."""
+        if isinstance(row, Listing):
+            return row
+        price = parse_price(row.get("price"))
+        registrar = row.get("registrar")
+        listing = cls(
+            domain=(row.get("domain") or "").strip(),
+            id=listing_id_from_url(row.get("detail_url")),
+            summary=row.get("summary") or None,
+            registrar=sys.intern(registrar) if registrar else registrar,
+            price=int(round(price)) if price is not None else None,
+            time_left_s=parse_time_left(row.get("time_left")),
+            reg_ordinal=parse_date_ordinal(row.get("registration_date")),
+            days_to_expire=parse_int(row.get("days_to_expire")),
+            detail_url=row.get("detail_url"),
+        )
+        raw = None
+        for key in FIELDS:
+            original = row.get(key)
+            if getattr(listing, "_field_" + key)() != original:
+                if raw is None:
+                    raw = {}
+                raw[key] = original
+        listing.raw = raw
+        return listing
+
+    def __getitem__(self, key: str) -> Optional[str]:
+        raw = self.raw
+        if raw is not None and key in raw:
+            return raw[key]
+        return _RowView.__getitem__(self, key)
+
+    @property
+    def registered_on(self) -> Optional[date]:
+        return date.fromordinal(self.reg_ordinal) if self.reg_ordinal is not None else None
+
+    # --- giá trị chuỗi theo định dạng cũ ---------------------------------------------
+    def _field_domain(self) -> str:
+        return self.domain
+
+    def _field_summary(self) -> Optional[str]:
+        return self.summary if self.summary is not None else ""
+
+    def _field_registrar(self) -> Optional[str]:
+        return self.registrar
+
+    def _field_price(self) -> Optional[str]:
+        return f"￥{self.price}" if self.price is not None else None
+
+    def _field_time_left(self) -> Optional[str]:
+        return format_time_left(self.time_left_s)
+
+    def _field_registration_date(self) -> Optional[str]:
+        return date.fromordinal(self.reg_ordinal).isoformat() if self.reg_ordinal is not None else None
+
+    def _field_days_to_expire(self) -> Optional[str]:
+        return f"{self.days_to_expire}天" if self.days_to_expire is not None else None
+
+    def _field_detail_url(self) -> Optional[str]:
+        return self.detail_url
+
+    def __repr__(self) -> str:
+        return f"Listing({self.domain!r}, id={self.id}, price={self.price})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Listing):
+            return all(getattr(self, s) == getattr(other, s) for s in Listing.__slots__)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def _opt(v: Optional[int]) -> int:
+    return MISSING if v is None else v
+
+
+def _unopt(v: int) -> Optional[int]:
+    return None if v == MISSING else v
+
+
+class ListingBatch:
+    """Lô listing dạng cột. Thêm bằng append()/extend() (dict thô hoặc Listing), đọc bằng
+    batch[i] / for row in batch (Listing, dùng được như dict) hoặc thẳng các cột:
+    ids, prices, time_left, reg_ordinals, days_to_expire (array('q'), MISSING = không có),
+    domains, registrars, summaries (list)."""
+
+    def __init__(self, rows: Iterable[Any] = ()):
+        self.ids = array("q")
+        self.prices = array("q")
+        self.time_left = array("q")
+        self.reg_ordinals = array("q")
+        self.days_to_expire = array("q")
+        self.domains: List[str] = []
+        self.registrars: List[Optional[str]] = []
+        self.summaries: List[Optional[str]] = []
+        # detail_url chỉ lưu khi khác dạng chuẩn <prefix><id><suffix> (prefix/suffix lấy từ hàng đầu)
+        self._urls: Dict[int, Optional[str]] = {}
+        # Chuỗi gốc không đúng dạng chuẩn (Listing.raw), chỉ cho các hàng có
+        self._raw: Dict[int, Dict[str, Optional[str]]] = {}
+        self._url_prefix: Optional[str] = None
+        self._url_suffix: Optional[str] = None
+        self.extend(rows)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]) -> "ListingBatch":
+        return cls(rows)
+
+    def append(self, row: Any) -> None:
+        r = Listing.from_row(row)
+        i = len(self.domains)
+        self.ids.append(_opt(r.id))
+        self.prices.append(_opt(r.price))
+        self.time_left.append(_opt(r.time_left_s))
+        self.reg_ordinals.append(_opt(r.reg_ordinal))
+        self.days_to_expire.append(_opt(r.days_to_expire))
+        self.domains.append(r.domain)
+        self.registrars.append(r.registrar)
+        self.summaries.append(r.summary)
+        url = r.detail_url
+        if url and r.id is not None and self._url_prefix is None:
+            head, sep, tail = url.rpartition(str(r.id))
+            if sep:
+                self._url_prefix, self._url_suffix = head, tail
+        if url != self._canonical_url(r.id):
+            self._urls[i] = url
+        if r.raw is not None:
+            self._raw[i] = r.raw
+
+    def extend(self, rows: Iterable[Any]) -> None:
+        for r in rows:
+            self.append(r)
+
+    def _canonical_url(self, listing_id: Optional[int]) -> Optional[str]:
+        if listing_id is None or self._url_prefix is None:
+            return None
+        return f"{self._url_prefix}{listing_id}{self._url_suffix}"
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def __getitem__(self, i: int) -> Listing:
+        if i < 0:
+            i += len(self)
+        listing_id = _unopt(self.ids[i])
+        return Listing(
+            domain=self.domains[i],
+            id=listing_id,
+            summary=self.summaries[i],
+            registrar=self.registrars[i],
+            price=_unopt(self.prices[i]),
+            time_left_s=_unopt(self.time_left[i]),
+            reg_ordinal=_unopt(self.reg_ordinals[i]),
+            days_to_expire=_unopt(self.days_to_expire[i]),
+            detail_url=self._urls[i] if i in self._urls else self._canonical_url(listing_id),
+            raw=self._raw.get(i),
+        )
+
+    def __iter__(self) -> Iterator[Listing]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name: str) -> List[Optional[Any]]:
+        """Một cột dưới dạng list Python (None thay cho MISSING)."""
+        if name in ("ids", "prices", "time_left", "reg_ordinals", "days_to_expire"):
+            return [_unopt(v) for v in getattr(self, name)]
+        return list(getattr(self, name))
+
+    def to_rows(self) -> List[Dict[str, Optional[str]]]:
+        """Danh sách dict chuỗi như api.get_table_rows (cho code cũ)."""
+        return [r.to_dict() for r in self]
+
+    def nbytes(self) -> int:
+        """Ước lượng bộ nhớ của lô (byte), tính cả chuỗi."""
+        total = sum(a.itemsize * len(a) for a in (self.ids, self.prices, self.time_left, self.reg_ordinals, self.days_to_expire))
+        total += sum(sys.getsizeof(lst) for lst in (self.domains, self.registrars, self.summaries))
+        total += sum(sys.getsizeof(s) for s in self.domains)
+        total += sum(sys.getsizeof(s) for s in set(self.registrars) if s)
+        total += sum(sys.getsizeof(s) for s in self.summaries if s)
+        total += sys.getsizeof(self._urls) + sum(sys.getsizeof(u) for u in self._urls.values() if u)
+        total += sys.getsizeof(self._raw) + sum(sys.getsizeof(r) for r in self._raw.values())
+        return total
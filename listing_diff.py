@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+listing_diff.py
+
+So sánh tăng dần giữa hai lần quét liên tiếp của trang danh sách, sinh sự kiện có kiểu:
+  new         listing (mã listing) chưa từng thấy
+  price_drop  giá (当前价格) thấp hơn lần trước
+  delisted    listing biến mất khỏi danh sách (bán / gỡ / hết hạn)
+- Mỗi listing có dấu vân tay (giá, hạn chót làm tròn theo `tolerance` giây; hạn chót = lúc quan
+  sát + 剩余时间 nên không đổi theo thời gian). Với hàng dict thô (monitor), vân tay tính thẳng từ
+  chuỗi "price" và số giây của chuỗi "time_left" (tra bảng nhớ, mỗi chuỗi chỉ parse một lần), khóa
+  là chuỗi detail_url: hàng trùng vân tay lần trước chỉ tốn vài lần tra dict; chỉ hàng đổi/mới mới
+  được dựng Listing (regex giá, ngày, mã...). ListingBatch được đọc thẳng từ các cột (khóa là mã).
+- Trang chỉ là một cửa sổ (limit hàng) của catalogue: listing bị đẩy ra cuối cửa sổ không phải là
+  bị gỡ. Một listing mất tích chỉ tính "delisted" khi còn listing đứng SAU nó ở lần trước vẫn có mặt
+  (mất từ giữa cửa sổ), hoặc khi caller biết chắc snapshot là toàn bộ catalogue (complete=True,
+  vd. crawl hết mọi trang). Listing ra khỏi cửa sổ được nhớ thêm một thời gian (`remember`) để
+  quay lại không bị coi là "new".
+- Lần quét đầu chỉ làm mốc, không sinh sự kiện (trừ khi emit_initial=True).
+Đăng ký nhận sự kiện: Subscription / parse_subscription (--event trong botte.py), dạng
+  "price_drop: drop>=20 pct>=50 tld=.com price<=100"   giảm ít nhất ￥20 và 50%, điều kiện như rules.py
+  "new: tld=.com len<=5"                                listing mới qua luật
+  "delisted"                                            mọi listing bị gỡ
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import metrics
+from listing import MISSING, Listing, ListingBatch, parse_time_left
+from rules import RuleSet, parse_rule
+
+EVENT_KINDS = ("new", "price_drop", "delisted")
+EVENT_TITLES = {"new": "New listing:", "price_drop": "Price drop:", "delisted": "Delisted:"}
+
+
+class Event:
+    __slots__ = ("kind", "listing", "old_price", "ts")
+
+    def __init__(self, kind: str, listing: Listing, old_price: Optional[int] = None, ts: Optional[float] = None):
+        self.kind = kind
+        self.listing = listing
+        self.old_price = old_price
+        self.ts = time.time() if ts is None else ts
+
+    @property
+    def domain(self) -> str:
+        return self.listing.domain
+
+    @property
+    def price(self) -> Optional[int]:
+        return self.listing.price
+
+    @property
+    def drop(self) -> Optional[int]:
+        if self.old_price is None or self.price is None:
+            return None
+        return self.old_price - self.price
+
+    @property
+    def drop_pct(self) -> Optional[float]:
+        drop = self.drop
+        if drop is None or not self.old_price:
+            return None
+        return 100.0 * drop / self.old_price
+
+    def line(self) -> str:
+        """Một dòng cho tin Telegram."""
+        price = f"￥{self.price}" if self.price is not None else "?"
+        if self.kind == "price_drop":
+            return f"{self.domain} ￥{self.old_price} -> {price} (-{self.drop_pct:.0f}%)"
+        return f"{self.domain} {price}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind, "ts": self.ts, "listing_id": self.listing.id, "domain": self.domain,
+            "price": self.price, "old_price": self.old_price, "time_left_s": self.listing.time_left_s,
+        }
+
+    def __repr__(self) -> str:
+        return f"Event({self.kind!r}, {self.domain!r}, price={self.price}, old_price={self.old_price})"
+
+
+# (vân tay, Listing lần thấy cuối hoặc hàng thô, hạn chót tuyệt đối)
+_Entry = Tuple[int, Any, Optional[int]]
+
+# Chuỗi 剩余时间 -> số giây: ít giá trị khác nhau, parse một lần
+_TIME_LEFT: Dict[str, Optional[int]] = {}
+
+
+def _time_left(text: Optional[str]) -> Optional[int]:
+    if not text:
+        return None
+    seconds = _TIME_LEFT.get(text, MISSING)
+    if seconds == MISSING:
+        if len(_TIME_LEFT) >= 20000:
+            _TIME_LEFT.clear()
+        seconds = _TIME_LEFT[text] = parse_time_left(text)
+    return seconds
+
+
+class SnapshotDiff:
+    """Giữ snapshot trước (mã listing -> vân tay) của MỘT nguồn và so với snapshot mới."""
+
+    def __init__(self, tolerance: int = 180, remember: int = 10000, emit_initial: bool = False):
+        self.tolerance = max(1, tolerance)
+        self.remember = remember
+        self.emit_initial = emit_initial
+        self.stats = {"snapshots": 0, "rows": 0, "changed": 0, "new": 0, "price_drop": 0, "delisted": 0}
+        self._prev: Dict[int, _Entry] = {}
+        self._order: List[int] = []
+        self._gone: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._started = False
+
+    def _fingerprint(self, price: Any, deadline: Optional[int]) -> int:
+        return hash((price, deadline // self.tolerance if deadline is not None else None))
+
+    def _scan(self, rows: Union[ListingBatch, Sequence[Any]], now: int) -> Iterable[Tuple[Any, int, Any, Optional[int]]]:
+        """(khóa, vân tay, nguồn để dựng Listing, hạn chót): khóa là mã listing (ListingBatch) hoặc
+        chuỗi detail_url (hàng dict, không parse gì ngoài bảng nhớ 剩余时间)."""
+        if isinstance(rows, ListingBatch):
+            for i, (lid, price, left) in enumerate(zip(rows.ids, rows.prices, rows.time_left)):
+                if lid == MISSING:
+                    continue
+                deadline = now + left if left != MISSING else None
+                yield lid, self._fingerprint(None if price == MISSING else price, deadline), i, deadline
+            return
+        for row in rows:
+            key = row.get("detail_url")
+            if not key:
+                continue
+            left = _time_left(row.get("time_left"))
+            deadline = now + left if left is not None else None
+            yield key, self._fingerprint(row.get("price"), deadline), row, deadline
+
+    def diff(self, rows: Union[ListingBatch, Sequence[Any]], complete: bool = False, now: Optional[float] = None) -> List[Event]:
+        """So snapshot `rows` với lần trước, trả về các sự kiện. Snapshot rỗng (thường là lỗi tải)
+        bị bỏ qua, không tính mọi listing là đã gỡ."""
+        ts = time.time() if now is None else now
+        now_i = int(ts)
+        events: List[Event] = []
+        prev, gone = self._prev, self._gone
+        cur: Dict[int, _Entry] = {}
+        order: List[int] = []
+        initial = not self._started
+        with metrics.span("diff"):
+            for lid, fp, src, deadline in self._scan(rows, now_i):
+                if lid in cur:
+                    continue
+                order.append(lid)
+                old = prev.get(lid)
+                if old is not None and old[0] == fp:
+                    cur[lid] = old
+                    continue
+                # Hàng đổi / mới: lúc này mới dựng Listing
+                listing = rows[src] if isinstance(src, int) else Listing.from_row(src)
+                if old is None:
+                    old = gone.pop(lid, None)
+                cur[lid] = (fp, listing, deadline)
+                self.stats["changed"] += 1
+                if old is None:
+                    if not initial or self.emit_initial:
+                        events.append(Event("new", listing, ts=ts))
+                elif listing.price is not None and old[1].price is not None and listing.price < old[1].price:
+                    events.append(Event("price_drop", listing, old[1].price, ts))
+            if not cur:
+                return []
+            # Listing mất tích: "delisted" nếu snapshot đầy đủ hoặc mất từ giữa cửa sổ
+            last_present = -1
+            for pos, lid in enumerate(self._order):
+                if lid in cur:
+                    last_present = pos
+            for pos, lid in enumerate(self._order):
+                if lid in cur:
+                    continue
+                entry = prev[lid]
+                if complete or pos < last_present:
+                    events.append(Event("delisted", entry[1], ts=ts))
+                    gone.pop(lid, None)
+                else:
+                    gone[lid] = entry
+                    gone.move_to_end(lid)
+            while len(gone) > self.remember:
+                gone.popitem(last=False)
+        self._prev = cur
+        self._order = order
+        self._started = True
+        self.stats["snapshots"] += 1
+        self.stats["rows"] += len(order)
+        for e in events:
+            self.stats[e.kind] += 1
+            metrics.inc(f"events_{e.kind}")
+        return events
+
+
+class Subscription:
+    """Nhận một loại sự kiện, kèm ngưỡng giảm giá (drop: số tiền, pct: phần trăm) và luật lọc
+    domain (rules.Rule) áp lên listing của sự kiện."""
+
+    def __init__(self, kind: str, name: Optional[str] = None, min_drop: Optional[float] = None, min_pct: Optional[float] = None, rules: Optional[RuleSet] = None, chat_id: Optional[str] = None):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"loại sự kiện không hỗ trợ: {kind!r} (có: {', '.join(EVENT_KINDS)})")
+        self.kind = kind
+        self.name = name or kind
+        self.min_drop = min_drop
+        self.min_pct = min_pct
+        self.rules = rules
+        self.chat_id = chat_id
+
+    @property
+    def title(self) -> str:
+        return EVENT_TITLES[self.kind]
+
+    def select(self, events: Sequence[Event]) -> List[Event]:
+        picked = [e for e in events if e.kind == self.kind]
+        if self.min_drop is not None:
+            picked = [e for e in picked if e.drop is not None and e.drop >= self.min_drop]
+        if self.min_pct is not None:
+            picked = [e for e in picked if e.drop_pct is not None and e.drop_pct >= self.min_pct]
+        if self.rules is not None and picked:
+            hits = self.rules.evaluate([e.listing for e in picked])
+            picked = [e for e, hit in zip(picked, hits) if hit is not None]
+        return picked
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.name!r})"
+
+
+def parse_subscription(text: str) -> Subscription:
+    """"<loại>[: drop>=N pct>=P <điều kiện rules.py>...]" -> Subscription."""
+    kind, _, rest = text.strip().partition(":")
+    kind = kind.strip()
+    min_drop = min_pct = None
+    conditions: List[str] = []
+    for token in rest.split():
+        key, op, value = token.partition(">=")
+        if op and key in ("drop", "pct"):
+            if key == "drop":
+                min_drop = float(value)
+            else:
+                min_pct = float(value.rstrip("%"))
+        else:
+            conditions.append(token)
+    rules = RuleSet([parse_rule(" ".join(conditions), kind)]) if conditions else None
+    return Subscription(kind, text.strip(), min_drop, min_pct, rules)
+
+
+def route(events: Sequence[Event], subscriptions: Iterable[Subscription], sender) -> Dict[str, int]:
+    """Gửi sự kiện khớp từng đăng ký qua hàng đợi Telegram (telegram_queue.TelegramSender).
+    Trả về số sự kiện đã gửi theo tên đăng ký."""
+    sent: Dict[str, int] = {}
+    if not events:
+        return sent
+    for sub in subscriptions:
+        picked = sub.select(events)
+        if picked:
+            sender.enqueue_domains([e.line() for e in picked], title=sub.title, chat_id=sub.chat_id)
+            sent[sub.name] = len(picked)
+    return sent
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+loadtest.py
+
+Load test end-to-end cho botte.monitor() trên server giả lập (mock_server.py): monitor thật poll
+trang /ykj/ giả, lọc, khử trùng lặp, đưa vào hàng đợi Telegram; Telegram giả ghi lại thời điểm
+nhận từng tin. Với mỗi kích thước catalogue (mặc định 10k, 100k, 1M listing) báo cáo:
+  - độ trễ từ lúc listing mới xuất hiện đến lúc cảnh báo tới Telegram (p50/p90/p99/max)
+  - thông lượng: domain cảnh báo/giây, tin/giây, request trang/giây
+  - số listing mới bị lỡ (xuất hiện nhanh hơn khả năng một trang poll bắt kịp); chỉ tính listing
+    xuất hiện trước lúc dừng ít nhất `--settle` giây
+  - số lỗi/429 đã tiêm và số vòng monitor (kể cả vòng bỏ qua vì trang không đổi)
+Mọi state/outbox/cache ghi vào thư mục tạm, không đụng data/ thật.
+
+Chạy:
+  python loadtest.py
+  python loadtest.py --sizes 10000,1000000 --duration 60 --arrival-rate 5 --interval 1 --limit 50 \\
+      --latency-ms 80 --jitter-ms 40 --error-rate 0.02 --rate-limit 0.02 --tg-rate-limit 0.05 --tg-rate 20 --out load.json
+  thêm --verbose để xem log của monitor.
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import mock_server
+import telegram_queue
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(q * (len(s) - 1)))))
+    return s[k]
+
+
+def run_scenario(
+    listings: int,
+    duration: float = 30.0,
+    arrival_rate: float = 2.0,
+    interval: float = 1.0,
+    limit: int = 20,
+    tg_rate: float = 20.0,
+    site_faults: Optional[Dict[str, float]] = None,
+    tg_faults: Optional[Dict[str, float]] = None,
+    settle: float = 5.0,
+    verbose: bool = False,
+) -> Dict[str, object]:
+    import botte
+
+    state = mock_server.MockState(
+        mock_server.Catalogue(listings, arrival_rate),
+        mock_server.Faults(**(site_faults or {})),
+        mock_server.Faults(**(tg_faults or {})),
+    )
+    server = mock_server.start_mock(state)
+    port = server.server_address[1]
+    base = f"http://127.0.0.1:{port}"
+    url = f"{base}/ykj/"
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        # Trỏ mọi đường dẫn ghi của monitor và API Telegram vào môi trường giả
+        saved = (botte.DATA_DIR, botte.OUTBOX_PATH, telegram_queue.API_BASE, os.environ.get("DETAIL_CACHE_PATH"))
+        botte.DATA_DIR = tmp
+        botte.OUTBOX_PATH = os.path.join(tmp, "outbox.sqlite3")
+        telegram_queue.API_BASE = base
+        os.environ["DETAIL_CACHE_PATH"] = os.path.join(tmp, "detail_cache.sqlite3")
+        cycles_before = botte.MONITOR_STATS["cycles"]
+        skipped_before = botte.MONITOR_STATS["skipped_cycles"]
+
+        stop = threading.Event()
+        log = io.StringIO()
+
+        def _run() -> None:
+            with contextlib.ExitStack() as stack:
+                if not verbose:
+                    stack.enter_context(contextlib.redirect_stdout(log))
+                botte.monitor(
+                    url, limit, 1.0 / tg_rate if tg_rate > 0 else 1.0, interval, "", os.path.join(tmp, "sent_state.json"), False,
+                    detail_concurrency=8, stop_event=stop,
+                )
+
+        started = time.time()
+        worker = threading.Thread(target=_run, name="monitor", daemon=True)
+        worker.start()
+        try:
+            time.sleep(duration)
+        finally:
+            stop.set()
+            stop_ts = time.time()
+            # monitor.finally chờ hàng đợi Telegram tối đa 5s trước khi trả về
+            worker.join(timeout=60)
+            server.shutdown()
+            server.server_close()
+            botte.DATA_DIR, botte.OUTBOX_PATH, telegram_queue.API_BASE = saved[:3]
+            if saved[3] is None:
+                os.environ.pop("DETAIL_CACHE_PATH", None)
+            else:
+                os.environ["DETAIL_CACHE_PATH"] = saved[3]
+
+    # Chỉ tính listing xuất hiện trước lúc dừng ít nhất `settle` giây (đủ 1 vòng poll + gửi)
+    arrived_until = state.catalogue.count(stop_ts - settle)
+    alerts = state.alert_times()
+    latencies: List[float] = []
+    missed = 0
+    for i in range(listings, arrived_until):
+        ts = alerts.get(str(state.catalogue.row(i)["domain"]).lower())
+        if ts is None:
+            missed += 1
+        else:
+            latencies.append(ts - state.catalogue.arrival_ts(i))
+    elapsed = stop_ts - started
+    stats = state.stats()
+    arrivals = arrived_until - listings
+    return {
+        "listings": listings,
+        "duration_s": round(elapsed, 2),
+        "arrival_rate": arrival_rate,
+        "interval_s": interval,
+        "limit": limit,
+        "arrivals": arrivals,
+        "alerted_arrivals": len(latencies),
+        "missed": missed,
+        "latency_s": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "throughput": {
+            "alerted_domains_per_s": round(len(alerts) / elapsed, 3) if elapsed else 0.0,
+            "messages_per_s": round(int(stats["messages"]) / elapsed, 3) if elapsed else 0.0,
+            "listing_requests_per_s": round((int(stats["listing"]) + int(stats["listing_304"])) / elapsed, 3) if elapsed else 0.0,
+        },
+        "alerted_domains": len(alerts),
+        "monitor_cycles": botte.MONITOR_STATS["cycles"] - cycles_before,
+        "skipped_cycles": botte.MONITOR_STATS["skipped_cycles"] - skipped_before,
+        "server": stats,
+    }
+
+
+def _fmt(x: Optional[float]) -> str:
+    return "-" if x is None else f"{x:.2f}s"
+
+
+def main() -> int:
+    sizes = [10000, 100000, 1000000]
+    opts: Dict[str, float] = {"duration": 30.0, "arrival_rate": 2.0, "interval": 1.0, "limit": 20, "tg_rate": 20.0, "settle": 5.0}
+    site: Dict[str, float] = {}
+    tg: Dict[str, float] = {}
+    out_path: Optional[str] = None
+    verbose = False
+    fault_keys = ("latency_ms", "jitter_ms", "error_rate", "rate_limit", "retry_after")
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        key = a[2:].replace("-", "_")
+        if a == "--sizes" and i + 1 < len(args):
+            sizes = [int(x) for x in args[i + 1].split(",") if x]
+            i += 1
+        elif a == "--out" and i + 1 < len(args):
+            out_path = args[i + 1]
+            i += 1
+        elif a == "--verbose":
+            verbose = True
+        elif key in opts and i + 1 < len(args):
+            opts[key] = float(args[i + 1])
+            i += 1
+        elif key.startswith("tg_") and key[3:] in fault_keys and i + 1 < len(args):
+            tg[key[3:]] = float(args[i + 1])
+            i += 1
+        elif key in fault_keys and i + 1 < len(args):
+            site[key] = float(args[i + 1])
+            i += 1
+        i += 1
+
+    reports = []
+    for n in sizes:
+        print(f"[loadtest] {n:,} listings, {opts['duration']:g}s, arrival {opts['arrival_rate']:g}/s, site={site} tg={tg} ...", flush=True)
+        r = run_scenario(
+            n, duration=opts["duration"], arrival_rate=opts["arrival_rate"], interval=opts["interval"], limit=int(opts["limit"]),
+            tg_rate=opts["tg_rate"], site_faults=site, tg_faults=tg, settle=opts["settle"], verbose=verbose,
+        )
+        reports.append(r)
+        lat = r["latency_s"]
+        thr = r["throughput"]
+        print(
+            f"[loadtest] {n:,}: arrivals={r['arrivals']} alerted={r['alerted_arrivals']} missed={r['missed']} "
+            f"latency p50={_fmt(lat['p50'])} p90={_fmt(lat['p90'])} p99={_fmt(lat['p99'])} max={_fmt(lat['max'])} | "
+            f"{thr['alerted_domains_per_s']}/s domains, {thr['messages_per_s']}/s msgs, {thr['listing_requests_per_s']}/s page req | "
+            f"cycles={r['monitor_cycles']} skipped={r['skipped_cycles']} 429={r['server']['site_429']}+{r['server']['tg_429']} "
+            f"5xx={r['server']['site_5xx']}+{r['server']['tg_5xx']}",
+            flush=True,
+        )
+
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenarios": reports}, f, ensure_ascii=False, indent=2)
+        print(f"[loadtest] đã ghi {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
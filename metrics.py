@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+
+Đo thời gian từng pha và bộ đếm cho pipeline scrape (tải trang -> đoán encoding -> parse -> lọc
+-> gửi Telegram -> ghi state / domains.jsonl).
+- span("fetch") là context manager đo thời gian một pha; inc("bytes_downloaded", n) cộng bộ đếm.
+- Mặc định TẮT: span() trả về một context rỗng dùng chung, inc() thoát ngay -> gần như không tốn gì.
+  Bật bằng biến môi trường METRICS=1 hoặc enable() (botte.py --metrics-port / --metrics-log).
+- Xuất ra: text Prometheus qua HTTP cục bộ (serve(port) -> GET /metrics) và một dòng JSONL mỗi
+  vòng monitor (write_cycle) chứa phần chênh lệch so với vòng trước.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+PREFIX = "botte"
+# Ngưỡng histogram (giây) cho thời gian các pha
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ENABLED = os.getenv("METRICS", "0").lower() not in ("", "0", "false", "off", "no")
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+# pha -> [số lần, tổng giây, đếm theo từng bucket (không cộng dồn)...]
+_SPANS: Dict[str, List[float]] = {}
+_LAST: Dict[str, Dict[str, float]] = {"counters": {}, "count": {}, "sum": {}}
+_NOOP = nullcontext()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def enable(on: bool = True) -> None:
+    global _ENABLED
+    _ENABLED = on
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _SPANS.clear()
+        for d in _LAST.values():
+            d.clear()
+
+
+def inc(name: str, n: float = 1) -> None:
+    if not _ENABLED:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def observe(phase: str, seconds: float) -> None:
+    if not _ENABLED:
+        return
+    with _LOCK:
+        h = _SPANS.get(phase)
+        if h is None:
+            h = _SPANS[phase] = [0, 0.0] + [0] * (len(BUCKETS) + 1)
+        h[0] += 1
+        h[1] += seconds
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h[2 + i] += 1
+                break
+        else:
+            h[-1] += 1
+
+
+class _Span:
+    __slots__ = ("phase", "t0")
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        observe(self.phase, time.perf_counter() - self.t0)
+        if exc_type is not None:
+            inc(f"{self.phase}_errors")
+
+
+def span(phase: str):
+    """Đo thời gian khối `with` vào pha `phase` (không làm gì khi metrics tắt)."""
+    return _Span(phase) if _ENABLED else _NOOP
+
+
+def snapshot() -> Dict[str, object]:
+    with _LOCK:
+        return {
+            "counters": dict(_COUNTERS),
+            "spans": {p: {"count": int(h[0]), "sum": round(h[1], 6)} for p, h in _SPANS.items()},
+        }
+
+
+def cycle_delta() -> Dict[str, object]:
+    """Chênh lệch bộ đếm và thời gian các pha kể từ lần gọi trước."""
+    with _LOCK:
+        counters = {k: v - _LAST["counters"].get(k, 0) for k, v in _COUNTERS.items() if v != _LAST["counters"].get(k, 0)}
+        spans = {}
+        for p, h in _SPANS.items():
+            count = h[0] - _LAST["count"].get(p, 0)
+            if count:
+                spans[p] = {"count": int(count), "seconds": round(h[1] - _LAST["sum"].get(p, 0.0), 6)}
+            _LAST["count"][p] = h[0]
+            _LAST["sum"][p] = h[1]
+        _LAST["counters"] = dict(_COUNTERS)
+    return {"counters": counters, "spans": spans}
+
+
+def write_cycle(path: str, **extra) -> None:
+    """Ghi một dòng JSONL: thời điểm, các trường `extra` (cycle, fetched, new...) và cycle_delta()."""
+    if not _ENABLED or not path:
+        return
+    rec = {"ts": round(time.time(), 3)}
+    rec.update(extra)
+    rec.update(cycle_delta())
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in f"{PREFIX}_{name}")
+
+
+def render_prometheus() -> str:
+    """Text exposition format 0.0.4 của Prometheus."""
+    lines: List[str] = []
+    with _LOCK:
+        counters = dict(_COUNTERS)
+        spans = {p: list(h) for p, h in _SPANS.items()}
+    for name in sorted(counters):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {counters[name]:g}")
+    if spans:
+        metric = _metric_name("phase_seconds")
+        lines.append(f"# HELP {metric} Thời gian từng pha của pipeline scrape.")
+        lines.append(f"# TYPE {metric} histogram")
+        for phase in sorted(spans):
+            h = spans[phase]
+            cum = 0
+            for i, le in enumerate(BUCKETS):
+                cum += h[2 + i]
+                lines.append(f'{metric}_bucket{{phase="{phase}",le="{le:g}"}} {cum:g}')
+            lines.append(f'{metric}_bucket{{phase="{phase}",le="+Inf"}} {h[0]:g}')
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {h[1]:.6f}')
+            lines.append(f'{metric}_count{{phase="{phase}"}} {h[0]:g}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, ctype = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(snapshot(), ensure_ascii=False).encode("utf-8"), "application/json"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Mở endpoint /metrics (và /metrics.json) trên luồng nền; bật metrics nếu đang tắt."""
+    enable()
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"[metrics] không mở được {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[metrics] http://{host}:{server.server_address[1]}/metrics")
+    return server
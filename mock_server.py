@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+mock_server.py
+
+Server giả lập cục bộ cho load test end-to-end, thay cho am.22.cn và Telegram Bot API:
+  GET  /ykj/ (?page=N&pagecount=M, hoặc cookie pagecount)  trang danh sách 一口价, mới nhất trước
+  GET  /ykj/chujia_<id>.html                                 trang chi tiết
+  POST /bot<token>/sendMessage                               ghi nhận tin (thời điểm nhận + nội dung)
+  GET  /_stats                                               bộ đếm dạng JSON
+Catalogue sinh lười bằng synthetic.make_row (10k..1M listing không tốn bộ nhớ); listing mới xuất hiện
+đều đặn với tốc độ `arrival_rate`/giây, mỗi listing mới có thời điểm xuất hiện để đo độ trễ.
+Tiêm lỗi: độ trễ (latency_ms ± jitter_ms), tỉ lệ lỗi 5xx, tỉ lệ 429 (kèm Retry-After / retry_after),
+cấu hình riêng cho site và cho Telegram.
+
+Chạy độc lập:
+  python mock_server.py --port 8765 --listings 100000 --arrival-rate 2 --latency-ms 50 --error-rate 0.01 --rate-limit 0.02
+  python botte.py http://127.0.0.1:8765/ykj/ --monitor   (với TELEGRAM_API_BASE=http://127.0.0.1:8765)
+Driver đo độ trễ/thông lượng: loadtest.py
+"""
+from __future__ import annotations
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import synthetic
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+_DETAIL_RE = re.compile(r"^/ykj/chujia_(\d+)\.html$")
+_SEND_RE = re.compile(r"^/bot[^/]+/sendMessage$")
+
+
+class Catalogue:
+    """`size` listing có sẵn + listing mới đến đều với `arrival_rate`/giây kể từ lúc tạo."""
+
+    def __init__(self, size: int, arrival_rate: float = 1.0, seed: int = 0, start_id: int = 31000000):
+        self.size = max(0, size)
+        self.arrival_rate = max(0.0, arrival_rate)
+        self.seed = seed
+        self.start_id = start_id
+        self.t0 = time.time()
+
+    def count(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return self.size + int(max(0.0, now - self.t0) * self.arrival_rate)
+
+    def arrival_ts(self, index: int) -> Optional[float]:
+        """Thời điểm listing thứ `index` xuất hiện (None với listing có sẵn từ đầu)."""
+        if index < self.size or not self.arrival_rate:
+            return None
+        return self.t0 + (index - self.size + 1) / self.arrival_rate
+
+    def row(self, index: int) -> Dict[str, object]:
+        return synthetic.make_row(index, self.seed, self.start_id)
+
+    def page(self, page: int, page_size: int, now: Optional[float] = None) -> Tuple[List[Dict[str, object]], int, int]:
+        """Trả về (các hàng của trang, tổng số trang, tổng số listing); mới nhất đứng đầu."""
+        total = self.count(now)
+        top = total - 1 - (page - 1) * page_size
+        rows = [self.row(i) for i in range(top, max(-1, top - page_size), -1)]
+        return rows, max(1, -(-total // page_size)), total
+
+
+class Faults:
+    """Tiêm độ trễ, lỗi 5xx và 429 với xác suất cho trước."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, rate_limit: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """(giây phải chờ, mã lỗi cần trả hoặc None)."""
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            x = self._rng.random()
+        if x < self.rate_limit:
+            return delay, 429
+        if x < self.rate_limit + self.error_rate:
+            return delay, 503
+        return delay, None
+
+
+class MockState:
+    def __init__(self, catalogue: Catalogue, site_faults: Optional[Faults] = None, tg_faults: Optional[Faults] = None):
+        self.catalogue = catalogue
+        self.site_faults = site_faults or Faults()
+        self.tg_faults = tg_faults or Faults()
+        self.lock = threading.Lock()
+        self.messages: List[Tuple[float, str]] = []  # (thời điểm nhận, text) của các sendMessage thành công
+        self.counters: Dict[str, int] = {
+            "listing": 0, "listing_304": 0, "detail": 0, "not_found": 0,
+            "site_429": 0, "site_5xx": 0, "tg_ok": 0, "tg_429": 0, "tg_5xx": 0,
+        }
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[key] += n
+
+    def alert_times(self) -> Dict[str, float]:
+        """domain -> thời điểm Telegram nhận được tin đầu tiên có chứa nó."""
+        out: Dict[str, float] = {}
+        with self.lock:
+            messages = list(self.messages)
+        for ts, text in messages:
+            for line in text.splitlines()[1:]:
+                d = line.strip().lower()
+                if d and d not in out:
+                    out[d] = ts
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            out: Dict[str, object] = dict(self.counters)
+            out["messages"] = len(self.messages)
+        out["listings"] = self.catalogue.count()
+        return out
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "mock22/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state  # type: ignore[attr-defined]
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _inject(self, faults: Faults, prefix: str, as_json: bool) -> bool:
+        """Áp dụng độ trễ/lỗi; trả về True nếu đã trả lời bằng lỗi."""
+        delay, code = faults.draw()
+        if delay:
+            time.sleep(delay)
+        if code is None:
+            return False
+        if code == 429:
+            self.state.count(f"{prefix}_429")
+            retry = f"{faults.retry_after:g}"
+            if as_json:
+                body = json.dumps({"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry}",
+                                   "parameters": {"retry_after": faults.retry_after}}).encode()
+                self._send(429, body, "application/json", {"Retry-After": retry})
+            else:
+                self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": retry})
+        else:
+            self.state.count(f"{prefix}_5xx")
+            self._send(code, b'{"ok":false,"error_code":503}' if as_json else b"Service Unavailable",
+                       "application/json" if as_json else "text/plain")
+        return True
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        if parts.path == "/_stats":
+            self._send(200, json.dumps(self.state.stats()).encode(), "application/json")
+            return
+        m = _DETAIL_RE.match(parts.path)
+        if m:
+            if self._inject(self.state.site_faults, "site", False):
+                return
+            self._detail(int(m.group(1)))
+            return
+        if parts.path.rstrip("/") in ("/ykj", "/ykj/index.html", "/ykj/list.html"):
+            if self._inject(self.state.site_faults, "site", False):
+                return
+            self._listing(parse_qs(parts.query))
+            return
+        self.state.count("not_found")
+        self._send(404, b"Not Found", "text/plain")
+
+    do_HEAD = do_GET
+
+    def _listing(self, query: Dict[str, List[str]]) -> None:
+        page_size = DEFAULT_PAGE_SIZE
+        cookie = re.search(r"pagecount=(\d+)", self.headers.get("Cookie", ""))
+        for raw in (query.get("pagecount", [None])[0], cookie.group(1) if cookie else None):
+            if raw and str(raw).isdigit():
+                page_size = min(MAX_PAGE_SIZE, max(1, int(raw)))
+        try:
+            page = max(1, int(query.get("page", ["1"])[0]))
+        except ValueError:
+            page = 1
+        cat = self.state.catalogue
+        etag = f'"{cat.count()}-{page}-{page_size}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.state.count("listing_304")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        rows, page_count, _ = cat.page(page, page_size)
+        host = f"//{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+        body = synthetic.render_listing(rows, page=page, page_count=page_count, host=host).encode("utf-8")
+        self.state.count("listing")
+        self._send(200, body, "text/html; charset=utf-8", {"ETag": etag, "Cache-Control": "no-cache"})
+
+    def _detail(self, listing_id: int) -> None:
+        cat = self.state.catalogue
+        index = listing_id - cat.start_id
+        if index < 0 or index >= cat.count():
+            self.state.count("not_found")
+            self._send(404, b"Not Found", "text/plain")
+            return
+        self.state.count("detail")
+        self._send(200, synthetic.render_detail(cat.row(index)).encode("utf-8"), "text/html; charset=utf-8")
+
+    def do_POST(self) -> None:
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not _SEND_RE.match(parts.path):
+            self.state.count("not_found")
+            self._send(404, b'{"ok":false,"error_code":404}', "application/json")
+            return
+        if self._inject(self.state.tg_faults, "tg", True):
+            return
+        if "json" in (self.headers.get("Content-Type") or ""):
+            try:
+                data = json.loads(raw.decode("utf-8") or "{}")
+            except ValueError:
+                data = {}
+        else:
+            data = {k: v[0] for k, v in parse_qs(raw.decode("utf-8")).items()}
+        text = str(data.get("text") or "")
+        if not text:
+            self._send(400, b'{"ok":false,"error_code":400,"description":"Bad Request: message text is empty"}', "application/json")
+            return
+        with self.state.lock:
+            self.state.messages.append((time.time(), text))
+            self.state.counters["tg_ok"] += 1
+            message_id = len(self.state.messages)
+        body = json.dumps({"ok": True, "result": {"message_id": message_id, "chat": {"id": data.get("chat_id")}, "text": text}})
+        self._send(200, body.encode("utf-8"), "application/json")
+
+
+def start_mock(state: MockState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Chạy server trên luồng nền; port=0 -> hệ điều hành tự chọn (xem server.server_address)."""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = state  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    host = "127.0.0.1"
+    port = 8765
+    listings = 10000
+    arrival_rate = 1.0
+    seed = 0
+    site = {"latency_ms": 0.0, "jitter_ms": 0.0, "error_rate": 0.0, "rate_limit": 0.0}
+    tg = {"latency_ms": 0.0, "jitter_ms": 0.0, "error_rate": 0.0, "rate_limit": 0.0}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--host" and i + 1 < len(args):
+            host = args[i + 1]; i += 1
+        elif a == "--port" and i + 1 < len(args):
+            port = int(args[i + 1]); i += 1
+        elif a == "--listings" and i + 1 < len(args):
+            listings = int(args[i + 1]); i += 1
+        elif a == "--arrival-rate" and i + 1 < len(args):
+            arrival_rate = float(args[i + 1]); i += 1
+        elif a == "--seed" and i + 1 < len(args):
+            seed = int(args[i + 1]); i += 1
+        elif a.startswith("--tg-") and a[5:].replace("-", "_") in tg and i + 1 < len(args):
+            tg[a[5:].replace("-", "_")] = float(args[i + 1]); i += 1
+        elif a.startswith("--") and a[2:].replace("-", "_") in site and i + 1 < len(args):
+            site[a[2:].replace("-", "_")] = float(args[i + 1]); i += 1
+        i += 1
+
+    state = MockState(Catalogue(listings, arrival_rate, seed), Faults(**site), Faults(**tg))
+    server = start_mock(state, host, port)
+    print(f"[mock] http://{host}:{server.server_address[1]}/ykj/  listings={listings} arrival_rate={arrival_rate}/s site={site} tg={tg}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[mock] {state.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
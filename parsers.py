@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+parsers.py
+
+Các backend parse bảng danh sách 一口价 (tbody#buynow_list). Tất cả trả về cùng dạng dict
+như api.get_table_rows: domain, summary, registrar, price, time_left, registration_date,
+days_to_expire, detail_url.
+
+Backend:
+  - "attrs":      quét thẳng chuỗi HTML trong tbody#buynow_list bằng regex (đọc data-* của
+                  checkbox chkDomain + text các ô), không dựng cây DOM.
+  - "selectolax": dùng selectolax (Lexbor) nếu đã cài.
+  - "lxml":       dùng lxml.html nếu đã cài.
+  - "bs4":        BeautifulSoup + html.parser (cách cũ, chậm nhưng chịu lỗi tốt nhất).
+  - "auto":       thử lần lượt attrs -> selectolax/lxml -> bs4, lấy kết quả không rỗng đầu tiên.
+
+Chọn backend mặc định qua biến môi trường LISTING_PARSER.
+
+Ngoài ra có BuynowStreamParser: parser tăng dần (nhận từng khúc text khi đang tải) để dừng
+tải ngay khi đã đủ số hàng cần thiết.
+"""
+from __future__ import annotations
+
+import codecs
+import html as _html
+import os
+import re
+from html.parser import HTMLParser as _StdHTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+Row = Dict[str, Optional[str]]
+# Một ô: (tên thẻ, text, text của thẻ <a> đầu tiên, href của <a> đầu tiên, có checkbox chkDomain)
+Cell = Tuple[str, str, Optional[str], Optional[str], bool]
+
+_HEADER_KEYS = ("名称", "当前价格", "剩余时间")
+
+try:
+    from selectolax.parser import HTMLParser as _SlxParser
+except Exception:  # chưa cài selectolax
+    _SlxParser = None
+
+try:
+    import lxml.html as _lxml_html
+except Exception:  # chưa cài lxml
+    _lxml_html = None
+
+
+_LISTING_ID_RE = re.compile(r"chujia_(\d+)\.html")
+
+
+def listing_id_from_url(url: Optional[str]) -> Optional[int]:
+    """Lấy mã listing từ link chi tiết /ykj/chujia_<id>.html."""
+    m = _LISTING_ID_RE.search(url or "")
+    return int(m.group(1)) if m else None
+
+
+def _build_row(cells: List[Cell], url: str) -> Optional[Row]:
+    """Dựng dict hàng từ danh sách ô (logic chung cho các backend DOM)."""
+    if not cells or cells[0][0] == "th":
+        # bỏ header
+        return None
+    # Bảng 一口价 có cột checkbox chkDomain ở đầu -> dịch sang phải 1 cột
+    if cells[0][4] and cells[0][3] is None:
+        cells = cells[1:]
+    if not cells:
+        return None
+    _, text0, a_text, a_href, _ = cells[0]
+    domain = a_text if a_text is not None else text0
+    if not domain or "." not in domain:
+        return None
+
+    def col(i: int) -> Optional[str]:
+        return cells[i][1] if len(cells) > i else None
+
+    return {
+        "domain": domain,
+        "summary": col(1),
+        "registrar": col(2),
+        "price": col(3),
+        "time_left": col(4),
+        "registration_date": col(5),
+        "days_to_expire": col(6),
+        "detail_url": urljoin(url, a_href) if a_href is not None else None,
+    }
+
+
+def _collect(rows_cells, url: str, limit: Optional[int]) -> List[Row]:
+    rows: List[Row] = []
+    for cells in rows_cells:
+        try:
+            row = _build_row(cells, url)
+        except Exception:
+            continue
+        if row is not None:
+            rows.append(row)
+            if limit is not None and len(rows) >= limit:
+                break
+    return rows
+
+
+# --- attrs: quét chuỗi -------------------------------------------------------
+
+_TBODY_RE = re.compile(r"<tbody[^>]*\bid\s*=\s*[\"']?buynow_list\b[^>]*>", re.I)
+_TBODY_END_RE = re.compile(r"</tbody\s*>", re.I)
+_TR_SPLIT_RE = re.compile(r"<tr\b[^>]*>", re.I)
+_TD_RE = re.compile(r"<(td|th)\b[^>]*>(.*?)(?=<t[dh]\b|</tr\s*>|$)", re.I | re.S)
+_CHK_RE = re.compile(r"<input\b[^>]*\bname\s*=\s*[\"']?chkDomain\b[^>]*>", re.I)
+_ATTR_RE = re.compile(r"([\w:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))")
+_A_RE = re.compile(r"<a\b([^>]*)>(.*?)</a\s*>", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s*\n\s*|^\s+|\s+$")
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    return {m.group(1).lower(): _html.unescape(m.group(2) or m.group(3) or m.group(4) or "") for m in _ATTR_RE.finditer(tag)}
+
+
+def _text(fragment: str) -> str:
+    # Tương đương get_text(strip=True): strip từng đoạn text rồi nối liền
+    parts = _TAG_RE.split(fragment)
+    return "".join(_html.unescape(p).strip() for p in parts if p)
+
+
+def buynow_region(html: str) -> Optional[str]:
+    """Cắt đoạn HTML bên trong tbody#buynow_list (None nếu không có)."""
+    m = _TBODY_RE.search(html)
+    if not m:
+        return None
+    end = _TBODY_END_RE.search(html, m.end())
+    return html[m.end():end.start() if end else len(html)]
+
+
+def parse_attrs(html: str, url: str, limit: Optional[int] = None) -> List[Row]:
+    """Trích hàng trực tiếp từ chuỗi tbody#buynow_list, không dựng DOM."""
+    region = buynow_region(html)
+    if region is None:
+        return []
+    rows: List[Row] = []
+    for chunk in _TR_SPLIT_RE.split(region)[1:]:
+        cells = [m.group(2) for m in _TD_RE.finditer(chunk)]
+        if not cells:
+            continue
+        chk = _CHK_RE.search(cells[0])
+        if chk:
+            data = _attrs(chk.group(0))
+            cells = cells[1:]
+        else:
+            data = {}
+        if not cells:
+            continue
+        a = _A_RE.search(cells[0])
+        domain = data.get("data-domain") or (_text(a.group(2)) if a else _text(cells[0]))
+        if not domain or "." not in domain:
+            continue
+        href = _attrs(a.group(1)).get("href") if a else None
+        href = href or data.get("data-url")
+
+        def col(i: int) -> Optional[str]:
+            return _text(cells[i]) if len(cells) > i else None
+
+        rows.append({
+            "domain": domain,
+            "summary": col(1),
+            "registrar": col(2),
+            "price": col(3) if len(cells) > 3 else data.get("data-price"),
+            "time_left": col(4),
+            "registration_date": col(5),
+            "days_to_expire": col(6),
+            "detail_url": urljoin(url, href) if href else None,
+        })
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+
+# --- selectolax ---------------------------------------------------------------
+
+def parse_selectolax(html: str, url: str, limit: Optional[int] = None) -> List[Row]:
+    if _SlxParser is None:
+        raise ImportError("selectolax chưa được cài (pip install selectolax)")
+    tree = _SlxParser(html)
+    trs = tree.css("tbody#buynow_list > tr")
+    if not trs:
+        tables = tree.css("table")
+        table = next((t for t in tables if all(k in t.text(separator=" ") for k in _HEADER_KEYS)), None)
+        if table is None and tables:
+            table = tables[0]
+        trs = table.css("tr") if table is not None else []
+
+    def cells_of(tr) -> List[Cell]:
+        out: List[Cell] = []
+        for td in tr.iter():
+            if td.tag not in ("td", "th"):
+                continue
+            a = td.css_first("a")
+            chk = td.css_first('input[name="chkDomain"]') is not None
+            out.append((
+                td.tag,
+                td.text(deep=True, strip=True),
+                a.text(deep=True, strip=True) if a is not None else None,
+                a.attributes.get("href") if a is not None else None,
+                chk,
+            ))
+        return out
+
+    return _collect((cells_of(tr) for tr in trs), url, limit)
+
+
+# --- lxml ---------------------------------------------------------------------
+
+def _lxml_text(el) -> str:
+    return "".join(s.strip() for s in el.itertext())
+
+
+def parse_lxml(html: str, url: str, limit: Optional[int] = None) -> List[Row]:
+    if _lxml_html is None:
+        raise ImportError("lxml chưa được cài (pip install lxml)")
+    doc = _lxml_html.document_fromstring(html)
+    trs = doc.xpath('//tbody[@id="buynow_list"]/tr')
+    if not trs:
+        tables = doc.xpath("//table")
+        table = next((t for t in tables if all(k in t.text_content() for k in _HEADER_KEYS)), None)
+        if table is None and tables:
+            table = tables[0]
+        trs = table.xpath(".//tr") if table is not None else []
+
+    def cells_of(tr) -> List[Cell]:
+        out: List[Cell] = []
+        for td in tr:
+            if not isinstance(td.tag, str) or td.tag not in ("td", "th"):
+                continue
+            links = td.xpath(".//a")
+            a = links[0] if links else None
+            chk = bool(td.xpath('.//input[@name="chkDomain"]'))
+            out.append((
+                td.tag,
+                _lxml_text(td),
+                _lxml_text(a) if a is not None else None,
+                a.get("href") if a is not None else None,
+                chk,
+            ))
+        return out
+
+    return _collect((cells_of(tr) for tr in trs), url, limit)
+
+
+# --- BeautifulSoup (cách cũ) ----------------------------------------------------
+
+def parse_bs4(html: str, url: str, limit: Optional[int] = None) -> List[Row]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Tìm table có các header quen thuộc
+    candidate_tables = soup.find_all("table")
+    table = None
+    for t in candidate_tables:
+        head_text = t.get_text(" ", strip=True)
+        if all(k in head_text for k in _HEADER_KEYS):
+            table = t
+            break
+    if table is None and candidate_tables:
+        table = candidate_tables[0]
+    if not table:
+        return []
+
+    def cells_of(tr) -> List[Cell]:
+        out: List[Cell] = []
+        for td in tr.find_all(["td", "th"]):
+            a = td.find("a")
+            out.append((
+                td.name,
+                td.get_text(strip=True),
+                a.get_text(strip=True) if a else None,
+                a["href"] if a and a.has_attr("href") else None,
+                td.find("input", attrs={"name": "chkDomain"}) is not None,
+            ))
+        return out
+
+    return _collect((cells_of(tr) for tr in table.find_all("tr")), url, limit)
+
+
+BACKENDS: Dict[str, Callable[[str, str, Optional[int]], List[Row]]] = {
+    "attrs": parse_attrs,
+    "selectolax": parse_selectolax,
+    "lxml": parse_lxml,
+    "bs4": parse_bs4,
+}
+
+
+def available_backends() -> List[str]:
+    out = ["attrs"]
+    if _SlxParser is not None:
+        out.append("selectolax")
+    if _lxml_html is not None:
+        out.append("lxml")
+    out.append("bs4")
+    return out
+
+
+def default_backend() -> str:
+    return os.getenv("LISTING_PARSER", "auto").strip().lower() or "auto"
+
+
+def parse_listing(html: str, url: str, limit: Optional[int] = None, backend: Optional[str] = None) -> List[Row]:
+    """Parse bảng danh sách bằng backend đã chọn; "auto" tự fallback về bs4 nếu không ra hàng."""
+    backend = (backend or default_backend()).lower()
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"backend không hỗ trợ: {backend} (có: auto, {', '.join(BACKENDS)})")
+        return BACKENDS[backend](html, url, limit)
+
+    order = ["attrs"] + [b for b in ("selectolax", "lxml") if b in available_backends()][:1] + ["bs4"]
+    for name in order:
+        try:
+            rows = BACKENDS[name](html, url, limit)
+        except Exception:
+            continue
+        if rows:
+            return rows
+    return []
+
+
+# --- Parse tăng dần khi đang tải ----------------------------------------------
+
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([A-Za-z0-9_.:-]+)", re.I)
+_CT_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([A-Za-z0-9_.:-]+)", re.I)
+# Trang Trung Quốc khai báo gb2312 nhưng thực tế dùng ký tự của gbk/gb18030
+_CHARSET_ALIASES = {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030"}
+
+
+def _norm_charset(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    name = name.strip().lower()
+    name = _CHARSET_ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def sniff_encoding(content_type: Optional[str], head: bytes, default: str = "utf-8") -> str:
+    """Chọn encoding từ header Content-Type, BOM hoặc thẻ <meta charset> trong vài KB đầu
+    (không chạy dò charset trên toàn bộ body như resp.apparent_encoding)."""
+    if content_type:
+        m = _CT_CHARSET_RE.search(content_type)
+        enc = _norm_charset(m.group(1)) if m else None
+        if enc:
+            return enc
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    m = _META_CHARSET_RE.search(head[:4096])
+    enc = _norm_charset(m.group(1).decode("ascii", "ignore")) if m else None
+    return enc or default
+
+
+class BuynowStreamParser(_StdHTMLParser):
+    """Parser tăng dần cho tbody#buynow_list: gọi feed() với từng khúc text, đọc .rows.
+    .done = True khi đã gặp </tbody> của danh sách hoặc đã đủ `limit` hàng.
+    """
+
+    def __init__(self, url: str, limit: Optional[int] = None):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.limit = limit
+        self.rows: List[Row] = []
+        self.found = False  # đã thấy tbody#buynow_list chưa
+        self.done = False
+        self._in_body = False
+        self._cells: Optional[List[Cell]] = None
+        self._cell: Optional[list] = None  # [tag, text_parts, a_parts, a_href, chk]
+        self._in_a = False
+        self._depth = 0  # độ sâu tbody lồng nhau bên trong danh sách
+
+    def _finish_cell(self) -> None:
+        c = self._cell
+        if c is not None and self._cells is not None:
+            a_text = "".join(c[2]) if c[2] is not None else None
+            self._cells.append((c[0], "".join(c[1]), a_text, c[3], c[4]))
+        self._cell = None
+        self._in_a = False
+
+    def _finish_row(self) -> None:
+        self._finish_cell()
+        if self._cells is not None:
+            try:
+                row = _build_row(self._cells, self.url)
+            except Exception:
+                row = None
+            if row is not None:
+                self.rows.append(row)
+                if self.limit is not None and len(self.rows) >= self.limit:
+                    self.done = True
+        self._cells = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self._in_body:
+            if tag == "tbody" and dict(attrs).get("id") == "buynow_list":
+                self._in_body = self.found = True
+            return
+        if tag == "tbody":
+            self._depth += 1
+        elif tag == "tr":
+            self._finish_row()
+            self._cells = []
+        elif tag in ("td", "th"):
+            self._finish_cell()
+            if self._cells is None:
+                self._cells = []
+            self._cell = [tag, [], None, None, False]
+        elif self._cell is not None:
+            if tag == "a" and self._cell[2] is None:
+                self._cell[2] = []
+                self._cell[3] = dict(attrs).get("href")
+                self._in_a = True
+            elif tag == "input" and dict(attrs).get("name") == "chkDomain":
+                self._cell[4] = True
+
+    def handle_endtag(self, tag):
+        if self.done or not self._in_body:
+            return
+        if tag == "a":
+            self._in_a = False
+        elif tag in ("td", "th"):
+            self._finish_cell()
+        elif tag == "tr":
+            self._finish_row()
+        elif tag == "tbody":
+            if self._depth:
+                self._depth -= 1
+            else:
+                self._finish_row()
+                self._in_body = False
+                self.done = True
+
+    def handle_data(self, data):
+        if self._cell is None or self.done:
+            return
+        piece = data.strip()
+        if piece:
+            self._cell[1].append(piece)
+            if self._in_a:
+                self._cell[2].append(piece)
+
+    def close(self):
+        super().close()
+        if self._in_body and not self.done:
+            self._finish_row()
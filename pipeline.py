@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+
+Chế độ pipeline cho crawl lớn: tải trang bằng nhiều luồng (I/O, nhả GIL), còn việc parse HTML
+(tốn CPU, nhất là BeautifulSoup) chạy trong ProcessPoolExecutor nên tăng theo số nhân CPU.
+- Luồng tải chỉ lấy bytes thô + Content-Type; worker tự chọn encoding (parsers.sniff_encoding),
+  parse và trả về dạng gọn: ListingBatch cho trang danh sách (mảng cột, pickle nhỏ),
+  dict cho trang chi tiết.
+- `chunk_size` trang gộp thành một task gửi sang worker (giảm chi phí IPC với trang nhỏ).
+- Giới hạn `max_pending` chunk đang tải/parse/chờ lấy: consumer chậm thì việc tải cũng dừng lại
+  (backpressure), bộ nhớ không phình theo độ dài crawl.
+- Kết quả trả về đúng thứ tự đầu vào.
+Dùng: api.py --all --workers 4 [--chunk-size 2], hoặc crawl_batches_parallel()/fetch_details_parallel().
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from listing import ListingBatch
+from parsers import parse_listing, sniff_encoding
+
+# (url, Content-Type, body) — body None nếu tải lỗi (kèm mô tả lỗi ở vị trí Content-Type)
+Fetched = Tuple[str, Optional[str], Optional[bytes]]
+
+
+def _decode(content_type: Optional[str], body: bytes) -> str:
+    return body.decode(sniff_encoding(content_type, body[:4096]), "replace")
+
+
+def _parse_chunk(kind: str, backend: Optional[str], items: List[Fetched]) -> List[Any]:
+    """Chạy trong process worker: parse cả chunk, trả về dạng gọn để gửi ngược qua pickle."""
+    out: List[Any] = []
+    for url, ctype, body in items:
+        if kind == "listing":
+            out.append(ListingBatch(parse_listing(_decode(ctype, body), url, None, backend)) if body is not None else None)
+        else:
+            from api import _empty_details, parse_domain_details
+            if body is None:
+                details = _empty_details(url)
+                details["error"] = ctype
+            else:
+                details = parse_domain_details(_decode(ctype, body), url)
+            out.append(details)
+    return out
+
+
+class _Chunk:
+    __slots__ = ("items", "fetched", "left", "lock", "ready", "result", "error")
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.fetched: List[Optional[Fetched]] = [None] * len(items)
+        self.left = len(items)
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.result: Optional[Future] = None
+        self.error: Optional[BaseException] = None
+
+
+class ParsePipeline:
+    """Tải song song (luồng) + parse song song (tiến trình), trả kết quả theo thứ tự.
+    `fetch(item) -> (url, content_type, body)` chạy trong luồng tải."""
+
+    def __init__(self, workers: Optional[int] = None, fetch_concurrency: int = 8, chunk_size: int = 1, max_pending: Optional[int] = None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.fetch_concurrency = max(1, fetch_concurrency)
+        self.chunk_size = max(1, chunk_size)
+        # Mặc định: đủ chunk để mọi worker và mọi luồng tải đều có việc, thêm một lượt dự phòng
+        self.max_pending = max_pending or 2 * max(self.workers, -(-self.fetch_concurrency // self.chunk_size))
+        self.stats = {"chunks": 0, "items": 0, "fetch_errors": 0}
+        self._procs: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "ParsePipeline":
+        self._procs = ProcessPoolExecutor(max_workers=self.workers)
+        self._threads = ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix="pipe-fetch")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._threads.shutdown(wait=True, cancel_futures=True)
+        self._procs.shutdown(wait=True, cancel_futures=True)
+
+    def _on_fetched(self, chunk: _Chunk, i: int, kind: str, backend: Optional[str], fut: Future) -> None:
+        try:
+            fetched = fut.result()
+        except BaseException as e:  # huỷ khi dừng sớm, hoặc lỗi ngoài dự kiến trong fetch
+            fetched = (str(chunk.items[i]), f"{type(e).__name__}: {e}", None)
+        if fetched[2] is None:
+            self.stats["fetch_errors"] += 1
+        with chunk.lock:
+            chunk.fetched[i] = fetched
+            chunk.left -= 1
+            last = chunk.left == 0
+        if last:
+            try:
+                chunk.result = self._procs.submit(_parse_chunk, kind, backend, chunk.fetched)
+            except BaseException as e:  # pool đã đóng
+                chunk.error = e
+            chunk.ready.set()
+
+    def _start(self, items: List[Any], fetch, kind: str, backend: Optional[str]) -> _Chunk:
+        chunk = _Chunk(items)
+        for i, item in enumerate(items):
+            fut = self._threads.submit(fetch, item)
+            fut.add_done_callback(lambda f, c=chunk, i=i: self._on_fetched(c, i, kind, backend, f))
+        return chunk
+
+    def map(self, kind: str, items: Iterable[Any], fetch, backend: Optional[str] = None) -> Iterator[Any]:
+        """Kết quả parse của từng item theo thứ tự. `kind`: "listing" (-> ListingBatch, None nếu
+        tải lỗi) hoặc "details" (-> dict như get_domain_details, có "error" nếu tải lỗi)."""
+        it = iter(items)
+        pending: "deque[_Chunk]" = deque()
+        try:
+            while True:
+                while len(pending) < self.max_pending:
+                    batch = list(itertools.islice(it, self.chunk_size))
+                    if not batch:
+                        break
+                    pending.append(self._start(batch, fetch, kind, backend))
+                if not pending:
+                    return
+                chunk = pending.popleft()
+                with metrics.span("pipeline.wait"):
+                    chunk.ready.wait()
+                    if chunk.error is not None:
+                        raise chunk.error
+                    results = chunk.result.result()
+                self.stats["chunks"] += 1
+                self.stats["items"] += len(results)
+                yield from results
+        finally:
+            for chunk in pending:
+                if chunk.result is not None:
+                    chunk.result.cancel()
+
+
+def _fetch_raw(url: str, headers: Dict[str, str], timeout: int) -> Fetched:
+    from api import _get_with_error
+    resp, err = _get_with_error(url, headers, timeout)
+    if resp is None:
+        return url, err, None
+    return url, resp.headers.get("Content-Type"), resp.content
+
+
+def crawl_batches_parallel(
+    url: str = "https://am.22.cn/ykj/",
+    page_size: Optional[int] = None,
+    start_page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    concurrency: int = 4,
+    cursor_path: Optional[str] = None,
+    backend: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 1,
+    max_pending: Optional[int] = None,
+    timeout: int = 20,
+) -> Iterator[ListingBatch]:
+    """Như api.crawl_batches nhưng parse trong process pool. Trang đầu được tải trước để đọc số
+    trang; không có "共N页" thì dừng ở trang rỗng đầu tiên. Lỗi mạng: dừng, cursor giữ nguyên."""
+    import api
+
+    page_size = max(1, min(page_size or api.MAX_PAGE_SIZE, api.MAX_PAGE_SIZE))
+    if start_page is None:
+        start_page = (api._load_cursor(cursor_path, url) if cursor_path else None) or 1
+    headers = dict(api._LISTING_HEADERS)
+    headers["Cookie"] = f"{api.PAGE_SIZE_COOKIE}={page_size}"
+
+    first = _fetch_raw(api.page_url(url, start_page, page_size), headers, timeout)
+    if first[2] is None:
+        return
+    page_count, exact = api.find_page_count(_decode(first[1], first[2]))
+    last_page = page_count if exact else None
+    if max_pages is not None:
+        last_page = min(last_page, start_page + max_pages - 1) if last_page else start_page + max_pages - 1
+    pages = range(start_page, last_page + 1) if last_page is not None else itertools.count(start_page)
+
+    def _fetch(page: int) -> Fetched:
+        if page == start_page:
+            return first
+        return _fetch_raw(api.page_url(url, page, page_size), headers, timeout)
+
+    finished = False
+    with ParsePipeline(workers, concurrency, chunk_size, max_pending) as pipe:
+        results = pipe.map("listing", pages, _fetch, backend)
+        try:
+            for page, batch in enumerate(results, start_page):
+                if batch is None:
+                    break
+                if not len(batch):
+                    finished = last_page is None or page >= last_page
+                    if last_page is None:
+                        break
+                    continue
+                yield batch
+                if cursor_path:
+                    api._save_cursor(cursor_path, url, page + 1, page_count)
+                finished = last_page is not None and page >= last_page
+        finally:
+            results.close()
+    if finished and cursor_path and os.path.exists(cursor_path):
+        os.remove(cursor_path)
+
+
+def fetch_details_parallel(
+    detail_urls: Iterable[str],
+    concurrency: int = 8,
+    workers: Optional[int] = None,
+    chunk_size: int = 8,
+    max_pending: Optional[int] = None,
+    timeout: int = 20,
+    use_cache: bool = True,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Iterator[Dict[str, Optional[str]]]:
+    """Như api.get_domain_details_many nhưng parse trong process pool và trả dần. Cache chi tiết
+    (`use_cache`/`fields` như get_domain_details) được tra trước ở tiến trình chính: chỉ URL chưa
+    có trong cache mới đi qua pipeline, kết quả parse thành công được put() lại vào cache."""
+    import api
+
+    urls = list(detail_urls)
+    cache = api.default_cache() if use_cache else None
+    hits: Dict[int, Dict[str, Optional[str]]] = {}
+    for i, u in enumerate(urls):
+        hit = api._cached_details(u, use_cache, fields)[2] if u else None
+        if hit is not None:
+            hit["error"] = None
+            hits[i] = hit
+    misses = [u for i, u in enumerate(urls) if i not in hits]
+    headers = {"User-Agent": api._LISTING_HEADERS["User-Agent"]}
+    with ParsePipeline(workers, concurrency, chunk_size, max_pending) as pipe:
+        results = pipe.map("details", misses, lambda u: _fetch_raw(u, headers, timeout))
+        try:
+            for i, u in enumerate(urls):
+                if i in hits:
+                    yield hits.pop(i)
+                    continue
+                details = next(results)
+                if cache is not None and not details.get("error"):
+                    listing_id = api.listing_id_from_url(u)
+                    if listing_id is not None:
+                        cache.put(listing_id, details)
+                yield details
+        finally:
+            results.close()
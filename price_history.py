@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+price_history.py
+
+Lịch sử giá / thời gian còn lại của từng listing qua các vòng monitor, để phân tích giảm giá
+và tốc độ bán.
+- Chỉ ghi khi có thay đổi (delta): giá (当前价格) khác lần trước, hoặc hạn chót (lúc quan sát +
+  剩余时间) lệch quá `tolerance` giây. 剩余时间 tự giảm theo thời gian nên không tính là thay đổi;
+  nó chỉ đổi khi người bán gia hạn / hạ giá lại.
+- Lưu trong SQLite (WAL): bảng `changes` khóa chính (listing_id, ts) WITHOUT ROWID nên các bản
+  ghi của một listing nằm liền nhau; bảng `listings` giữ trạng thái mới nhất + first/last_seen.
+- Trạng thái mới nhất được giữ trong bộ nhớ (LRU, tối đa `max_cached` listing gặp gần nhất), nên
+  một vòng không có gì đổi chỉ tốn một vòng lặp dict, không đọc/ghi đĩa (last_seen được cập nhật
+  thưa, `touch_every`). Listing bị đẩy khỏi LRU được nạp lại từ bảng `listings` khi gặp lại.
+Truy vấn: history(domain hoặc listing_id), drops(since, until, min_drop).
+CLI: python price_history.py [--db data/price_history.sqlite3] history <domain|id>
+     python price_history.py [--db ...] drops [--since 24h] [--min-drop 10]
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import metrics
+from listing import MISSING, Listing, ListingBatch
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "data", "price_history.sqlite3")
+
+# (giá, hạn chót, last_seen đã ghi)
+_State = Tuple[Optional[int], Optional[int], int]
+
+
+class PriceHistory:
+    def __init__(self, path: str = DEFAULT_PATH, tolerance: int = 180, touch_every: int = 600, max_cached: int = 200_000):
+        self.path = path
+        self.tolerance = tolerance
+        self.touch_every = touch_every
+        self.max_cached = max(1, max_cached)
+        self.stats = {"observed": 0, "changes": 0, "new_listings": 0}
+        self._last: "OrderedDict[int, _State]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " listing_id INTEGER PRIMARY KEY,"
+            " domain TEXT NOT NULL,"
+            " first_seen INTEGER NOT NULL,"
+            " last_seen INTEGER NOT NULL,"
+            " price INTEGER,"
+            " deadline INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS listings_domain ON listings (domain)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            " listing_id INTEGER NOT NULL,"
+            " ts INTEGER NOT NULL,"
+            " price INTEGER,"
+            " deadline INTEGER,"
+            " PRIMARY KEY (listing_id, ts)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS changes_ts ON changes (ts)")
+
+    # --- ghi -----------------------------------------------------------------------------
+    def _observations(self, rows: Union[ListingBatch, Iterable[Any]]) -> Iterable[Tuple[int, str, Optional[int], Optional[int]]]:
+        """(listing_id, domain, giá, giây còn lại) cho các hàng có mã listing."""
+        if isinstance(rows, ListingBatch):
+            for lid, dom, price, left in zip(rows.ids, rows.domains, rows.prices, rows.time_left):
+                if lid != MISSING:
+                    yield lid, dom.lower(), None if price == MISSING else price, None if left == MISSING else left
+            return
+        for row in rows:
+            r = Listing.from_row(row)
+            if r.id is not None:
+                yield r.id, r.domain.lower(), r.price, r.time_left_s
+
+    def _load_missing(self, ids: List[int]) -> None:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for lid, price, deadline, last_seen in self._db.execute(
+                f"SELECT listing_id, price, deadline, last_seen FROM listings WHERE listing_id IN ({marks})", chunk
+            ):
+                self._last[lid] = (price, deadline, last_seen)
+
+    def _changed(self, old: _State, price: Optional[int], deadline: Optional[int]) -> bool:
+        old_price, old_deadline, _ = old
+        if price != old_price:
+            return True
+        if (deadline is None) != (old_deadline is None):
+            return True
+        return deadline is not None and abs(deadline - old_deadline) > self.tolerance
+
+    def record(self, rows: Union[ListingBatch, Iterable[Any]], now: Optional[float] = None) -> int:
+        """Ghi một lần quan sát (các hàng của một trang / một vòng). Trả về số thay đổi đã ghi."""
+        ts = int(time.time() if now is None else now)
+        obs = {}
+        for lid, dom, price, left in self._observations(rows):
+            obs[lid] = (dom, price, ts + left if left is not None else None)
+        if not obs:
+            return 0
+        with self._lock, metrics.span("history"):
+            unknown = [lid for lid in obs if lid not in self._last]
+            if unknown:
+                self._load_missing(unknown)
+            new_rows, change_rows, update_rows, touch_rows = [], [], [], []
+            for lid, (dom, price, deadline) in obs.items():
+                old = self._last.get(lid)
+                if old is not None:
+                    self._last.move_to_end(lid)
+                if old is None:
+                    new_rows.append((lid, dom, ts, ts, price, deadline))
+                    change_rows.append((lid, ts, price, deadline))
+                    self._last[lid] = (price, deadline, ts)
+                elif self._changed(old, price, deadline):
+                    change_rows.append((lid, ts, price, deadline))
+                    update_rows.append((ts, price, deadline, lid))
+                    self._last[lid] = (price, deadline, ts)
+                elif ts - old[2] >= self.touch_every:
+                    touch_rows.append((ts, lid))
+                    self._last[lid] = (old[0], old[1], ts)
+            while len(self._last) > self.max_cached:
+                self._last.popitem(last=False)
+            self.stats["observed"] += len(obs)
+            if new_rows or change_rows or update_rows or touch_rows:
+                with self._db:
+                    self._db.execute("BEGIN")
+                    if new_rows:
+                        self._db.executemany("INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?)", new_rows)
+                    if change_rows:
+                        self._db.executemany("INSERT OR REPLACE INTO changes VALUES (?, ?, ?, ?)", change_rows)
+                    if update_rows:
+                        self._db.executemany("UPDATE listings SET last_seen = ?, price = ?, deadline = ? WHERE listing_id = ?", update_rows)
+                    if touch_rows:
+                        self._db.executemany("UPDATE listings SET last_seen = ? WHERE listing_id = ?", touch_rows)
+            self.stats["new_listings"] += len(new_rows)
+            self.stats["changes"] += len(change_rows)
+        metrics.inc("history_changes", len(change_rows))
+        return len(change_rows)
+
+    # --- truy vấn ------------------------------------------------------------------------
+    def history(self, key: Union[int, str]) -> List[Dict[str, Any]]:
+        """Các thay đổi (cũ -> mới) của một listing (mã số) hoặc mọi listing của một domain."""
+        if isinstance(key, int) or str(key).isdigit():
+            where, arg = "c.listing_id = ?", int(key)
+        else:
+            where, arg = "l.domain = ?", str(key).strip().lower()
+        cur = self._db.execute(
+            "SELECT c.listing_id, l.domain, c.ts, c.price, c.deadline FROM changes c"
+            f" JOIN listings l ON l.listing_id = c.listing_id WHERE {where} ORDER BY c.listing_id, c.ts",
+            (arg,),
+        )
+        return [
+            {"listing_id": lid, "domain": dom, "ts": ts, "price": price, "deadline": deadline,
+             "time_left_s": deadline - ts if deadline is not None else None}
+            for lid, dom, ts, price, deadline in cur
+        ]
+
+    def drops(self, since: float, until: Optional[float] = None, min_drop: float = 0) -> List[Dict[str, Any]]:
+        """Các lần giảm giá trong [since, until), mới nhất trước. `min_drop`: số tiền giảm tối thiểu."""
+        until = time.time() + 1 if until is None else until
+        cur = self._db.execute(
+            "SELECT c.listing_id, l.domain, c.ts, c.price,"
+            " (SELECT p.price FROM changes p WHERE p.listing_id = c.listing_id AND p.ts < c.ts ORDER BY p.ts DESC LIMIT 1)"
+            " FROM changes c JOIN listings l ON l.listing_id = c.listing_id"
+            " WHERE c.ts >= ? AND c.ts < ? ORDER BY c.ts DESC",
+            (int(since), int(until)),
+        )
+        out = []
+        for lid, dom, ts, price, prev in cur:
+            if prev is None or price is None:
+                continue
+            drop = prev - price
+            if drop > 0 and drop >= min_drop:
+                out.append({"listing_id": lid, "domain": dom, "ts": ts, "old_price": prev, "price": price, "drop": drop})
+        return out
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _fmt_ts(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def main() -> None:
+    from exporters import parse_duration
+
+    path = DEFAULT_PATH
+    since = 86400.0
+    min_drop = 0.0
+    rest: List[str] = []
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--db" and i + 1 < len(args):
+            path = args[i + 1]; i += 1
+        elif a == "--since" and i + 1 < len(args):
+            since = parse_duration(args[i + 1]); i += 1
+        elif a == "--min-drop" and i + 1 < len(args):
+            min_drop = float(args[i + 1]); i += 1
+        else:
+            rest.append(a)
+        i += 1
+    if not rest or rest[0] not in ("history", "drops") or (rest[0] == "history" and len(rest) < 2):
+        print("usage: python price_history.py [--db path] history <domain|id> | drops [--since 24h] [--min-drop N]")
+        sys.exit(2)
+    if not os.path.exists(path):
+        print(f"chưa có dữ liệu: {path}")
+        sys.exit(1)
+
+    hist = PriceHistory(path)
+    try:
+        if rest[0] == "history":
+            for h in hist.history(rest[1]):
+                left = f"{h['time_left_s'] // 60}m" if h["time_left_s"] is not None else "-"
+                print(f"{_fmt_ts(h['ts'])}\t{h['listing_id']}\t{h['domain']}\t￥{h['price']}\tcòn {left}")
+        else:
+            for d in hist.drops(time.time() - since, min_drop=min_drop):
+                print(f"{_fmt_ts(d['ts'])}\t{d['domain']}\t￥{d['old_price']} -> ￥{d['price']} (-{d['drop']})")
+    finally:
+        hist.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+profiles.py
+
+Cấu hình nhiều "watch profile" cho một tiến trình monitor (botte.py --profiles profiles.json).
+Mỗi profile có nguồn (URL danh sách), bộ lọc (TLD, khoảng giá, nhà đăng ký, chỉ domain đăng ký
+hôm nay), state khử trùng lặp riêng và chat Telegram riêng. Các profile cùng URL dùng chung
+một lần tải trang mỗi vòng (xem botte.monitor_profiles).
+
+Định dạng file (JSON):
+{
+  "defaults": {"url": "https://am.22.cn/ykj/", "limit": 50, "only_today": false},
+  "profiles": [
+    {"name": "com-re", "tld": ".com", "max_price": 100, "registrars": ["爱名网"]},
+    {"name": "cn", "tld": [".cn", ".com.cn"], "chat_id": "-100123", "state": "data/state_cn.json"},
+    {"name": "net", "url": "https://am.22.cn/ykj/?page=2", "tld": ".net", "min_price": 10}
+  ]
+}
+Khóa của "defaults" áp dụng cho mọi profile chưa tự khai báo.
+Bộ lọc của profile được biên dịch thành một luật của rules.py; khai báo "rules" (danh sách chuỗi
+hoặc dict như --rule) để dùng nhiều luật thay cho các khóa lọc đơn lẻ:
+    {"name": "short", "rules": ["com: tld=.com len<=5", "cn: tld=.cn chars=alpha price<=50"]}
+Luật truyền qua CLI (botte.py --rule/--rules) là bộ luật mặc định cho mọi profile không khai báo
+"rules" (trong profile hoặc "defaults"), thay cho các khóa lọc đơn lẻ của profile đó.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from rules import Rule, RuleSet, compile_rules
+
+DEFAULT_URL = "https://am.22.cn/ykj/"
+
+
+class WatchProfile:
+    """Một bộ lọc + đích gửi. `tlds` rỗng (hoặc "") = mọi TLD."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str = DEFAULT_URL,
+        tlds: Iterable[str] = (),
+        limit: int = 20,
+        only_today: bool = False,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        registrars: Iterable[str] = (),
+        chat_id: Optional[str] = None,
+        state_path: Optional[str] = None,
+        title: str = "New domain found:",
+        rules: Optional[RuleSet] = None,
+    ):
+        self.name = name
+        self.url = url
+        self.tlds: Tuple[str, ...] = tuple(t.lower() for t in tlds if t)
+        self.limit = limit
+        self.only_today = only_today
+        self.min_price = min_price
+        self.max_price = max_price
+        self.registrars = frozenset(r.strip() for r in registrars if r)
+        self.chat_id = chat_id
+        self.state_path = state_path
+        self.title = title
+        self.ruleset = rules if rules else RuleSet([Rule(
+            name=name,
+            tlds=self.tlds,
+            price=(min_price, max_price),
+            registrars=self.registrars,
+            age=(0, 0) if only_today else (None, None),
+        )])
+
+    def matches(self, row: Dict[str, Any], today: Optional[str] = None) -> bool:
+        """Hàng `row` (dict của api.get_table_rows) có qua bộ lọc không. `today`: "yyyy-mm-dd"."""
+        return self.ruleset.evaluate([row], today)[0] is not None
+
+    def __repr__(self) -> str:
+        return f"WatchProfile({self.name!r}, url={self.url!r}, tlds={self.tlds})"
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
+
+
+def profile_from_dict(data: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None, data_dir: str = "data", default_rules: Optional[RuleSet] = None) -> WatchProfile:
+    cfg = dict(defaults or {})
+    cfg.update(data)
+    name = str(cfg.get("name") or "default")
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+    return WatchProfile(
+        name=name,
+        url=str(cfg.get("url") or DEFAULT_URL),
+        tlds=_as_list(cfg.get("tld", cfg.get("tlds"))),
+        limit=int(cfg.get("limit") or 20),
+        only_today=bool(cfg.get("only_today", False)),
+        min_price=float(cfg["min_price"]) if cfg.get("min_price") is not None else None,
+        max_price=float(cfg["max_price"]) if cfg.get("max_price") is not None else None,
+        registrars=_as_list(cfg.get("registrar", cfg.get("registrars"))),
+        chat_id=str(cfg["chat_id"]) if cfg.get("chat_id") is not None else None,
+        state_path=str(cfg.get("state") or os.path.join(data_dir, f"state_{safe}.json")),
+        title=str(cfg.get("title") or "New domain found:"),
+        rules=compile_rules(cfg["rules"]) if cfg.get("rules") else default_rules,
+    )
+
+
+def load_profiles(path: str, data_dir: str = "data", default_rules: Optional[RuleSet] = None) -> List[WatchProfile]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"profiles": data}
+    defaults = data.get("defaults") or {}
+    profiles = [profile_from_dict(p, defaults, data_dir, default_rules) for p in data.get("profiles") or []]
+    names = [p.name for p in profiles]
+    dup = {n for n in names if names.count(n) > 1}
+    if dup:
+        raise ValueError(f"tên profile bị trùng: {', '.join(sorted(dup))}")
+    if not profiles:
+        raise ValueError(f"{path}: không có profile nào")
+    return profiles
+
+
+def group_sources(profiles: Iterable[WatchProfile]) -> Dict[str, int]:
+    """URL nguồn -> số hàng cần lấy (lớn nhất trong các profile dùng URL đó)."""
+    sources: Dict[str, int] = {}
+    for p in profiles:
+        sources[p.url] = max(sources.get(p.url, 0), p.limit)
+    return sources
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+renderer.py
+
+Pool trình duyệt Playwright (Chromium headless) sống lâu trong tiến trình monitor, dùng khi
+bảng danh sách được render bằng JS và requests + parser không lấy được hàng nào.
+- Khởi động trình duyệt một lần; các context được dùng lại qua nhiều vòng poll.
+- Chặn ảnh, font, CSS, media (chỉ cần DOM của bảng).
+- Mỗi context phục vụ tối đa `max_pages_per_context` trang rồi được tạo mới (tránh rò bộ nhớ).
+HTML sau khi render được trả về để parsers.parse_listing xử lý như bình thường.
+`storage_state`: file state của auth.py (cookie đăng nhập) -> các context mới đều đã đăng nhập.
+
+Cần: pip install playwright && python -m playwright install chromium
+Playwright sync API không an toàn đa luồng: chỉ gọi pool từ luồng đã tạo ra nó.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional
+
+BLOCKED_RESOURCES = ("image", "font", "stylesheet", "media")
+
+_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+)
+
+
+class _Slot:
+    def __init__(self, context):
+        self.context = context
+        self.pages_served = 0
+
+
+class RendererPool:
+    def __init__(
+        self,
+        size: int = 1,
+        max_pages_per_context: int = 50,
+        timeout_ms: int = 30000,
+        wait_selector: Optional[str] = "#buynow_list tr",
+        blocked: tuple = BLOCKED_RESOURCES,
+        storage_state: Optional[str] = None,
+    ):
+        self.size = max(1, size)
+        self.max_pages_per_context = max(1, max_pages_per_context)
+        self.timeout_ms = timeout_ms
+        self.wait_selector = wait_selector
+        self.blocked = set(blocked)
+        self.storage_state = storage_state
+        self.stats: Dict[str, int] = {"renders": 0, "errors": 0, "recycled": 0, "blocked_requests": 0}
+        self._pw = None
+        self._browser = None
+        self._slots: List[_Slot] = []
+        self._next = 0
+
+    def start(self) -> "RendererPool":
+        if self._browser is not None:
+            return self
+        try:
+            from playwright.sync_api import sync_playwright
+        except ImportError as e:
+            raise RuntimeError("renderer cần playwright: pip install playwright && python -m playwright install chromium") from e
+        self._pw = sync_playwright().start()
+        self._browser = self._pw.chromium.launch(headless=True)
+        self._slots = [_Slot(self._new_context()) for _ in range(self.size)]
+        return self
+
+    def _new_context(self):
+        # Đọc lại file state mỗi lần tạo context: auth.py có thể vừa đăng nhập lại
+        state = self.storage_state if self.storage_state and os.path.exists(self.storage_state) else None
+        context = self._browser.new_context(user_agent=_USER_AGENT, java_script_enabled=True, storage_state=state)
+
+        def _route(route):
+            if route.request.resource_type in self.blocked:
+                self.stats["blocked_requests"] += 1
+                return route.abort()
+            return route.continue_()
+
+        context.route("**/*", _route)
+        return context
+
+    def _slot(self) -> _Slot:
+        slot = self._slots[self._next % len(self._slots)]
+        self._next += 1
+        if slot.pages_served >= self.max_pages_per_context:
+            # Tái chế context đã phục vụ đủ số trang
+            try:
+                slot.context.close()
+            except Exception:
+                pass
+            slot.context = self._new_context()
+            slot.pages_served = 0
+            self.stats["recycled"] += 1
+        return slot
+
+    def render(self, url: str) -> Optional[str]:
+        """Mở `url` trong một context của pool, chờ bảng render xong và trả về HTML (None nếu lỗi)."""
+        try:
+            self.start()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[renderer] không khởi động được trình duyệt: {e}")
+            return None
+        slot = self._slot()
+        slot.pages_served += 1
+        page = None
+        try:
+            page = slot.context.new_page()
+            page.set_default_timeout(self.timeout_ms)
+            page.goto(url, wait_until="domcontentloaded")
+            if self.wait_selector:
+                try:
+                    page.wait_for_selector(self.wait_selector, timeout=self.timeout_ms)
+                except Exception:
+                    pass  # không có bảng: vẫn trả HTML hiện có để parser/fallback quyết định
+            html = page.content()
+            self.stats["renders"] += 1
+            return html
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        finally:
+            if page is not None:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+
+    def close(self) -> None:
+        for slot in self._slots:
+            try:
+                slot.context.close()
+            except Exception:
+                pass
+        self._slots = []
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._pw is not None:
+            try:
+                self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+
+    def __enter__(self) -> "RendererPool":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
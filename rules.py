@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+rules.py
+
+Bộ lọc domain theo luật, biên dịch một lần rồi chạy theo lô (cả trang 200 hàng hoặc cả catalogue
+khi crawl) thay cho `domain.endswith(tld)` + is_today() từng hàng.
+
+Một luật (Rule) khớp khi MỌI điều kiện của nó đúng; RuleSet khớp khi có ít nhất một luật khớp và
+báo tên luật đầu tiên khớp. Điều kiện:
+  tld            tập hậu tố (".com", ".com.cn"...) - tra set theo từng hậu tố của domain
+  len            độ dài tên (phần trước dấu chấm đầu tiên), dạng min-max
+  chars          lớp ký tự của tên: alpha | digit | alnum | hyphen (alnum có gạch nối) | mixed
+                 (có cả chữ lẫn số), xem CHAR_CLASSES
+  price          khoảng giá, đọc từ "￥1,888"
+  registrar      danh sách nhà đăng ký (so khớp chính xác)
+  expire         khoảng số ngày đến hạn (cột 距到期 "219天")
+  age            khoảng số ngày kể từ ngày đăng ký (today = age 0); so sánh chuỗi yyyy-mm-dd, không strptime
+  re / !re       regex phải khớp / không được khớp (search trên domain)
+  kw / !kw       từ khóa phải có / không được có trong domain
+Các regex, tập hậu tố, danh sách từ khóa được biên dịch sẵn; mỗi lô chỉ tính các cột cần dùng.
+
+Cú pháp chuỗi (--rule, có thể lặp):
+  "short-com: tld=.com,.net len=3-6 chars=alpha price<=100"
+  "today-cn: tld=.cn,.com.cn age=0 !kw=xxx,sex"
+  "ali: registrar=阿里云 expire>=30 re=^[a-z]+\\d*$"
+hoặc JSON: {"name": "short-com", "tld": [".com"], "len": [3, 6], "chars": "alpha", "price": [null, 100]}
+"""
+from __future__ import annotations
+
+import json
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from listing import MISSING, ListingBatch, parse_int, parse_price
+
+Row = Dict[str, Any]
+Range = Tuple[Optional[float], Optional[float]]
+
+
+CHAR_CLASSES: Dict[str, str] = {
+    "alpha": r"[a-z]+",
+    "digit": r"[0-9]+",
+    "alnum": r"[a-z0-9]+",
+    "hyphen": r"[a-z0-9]+(?:-[a-z0-9]+)*",
+    "mixed": r"(?=.*[a-z])(?=.*[0-9])[a-z0-9]+",  # có cả chữ và số
+}
+
+
+def _in_range(value: Optional[float], lo: Optional[float], hi: Optional[float]) -> bool:
+    if value is None:
+        return False
+    return (lo is None or value >= lo) and (hi is None or value <= hi)
+
+
+class Columns:
+    """Các cột của một lô hàng, chỉ tính khi luật nào đó cần (và tính một lần cho cả lô).
+    Với ListingBatch thì dùng thẳng các cột đã parse sẵn, không đọc lại chuỗi."""
+
+    def __init__(self, rows: Sequence[Row], today: Optional[str] = None):
+        self.rows = rows
+        self.today = today or date.today().isoformat()
+        self._cache: Dict[str, list] = {}
+        if isinstance(rows, ListingBatch):
+            self._cache["domain"] = [d.lower() for d in rows.domains]
+            self._cache["registrar"] = [r or "" for r in rows.registrars]
+            self._cache["price"] = [None if v == MISSING else v for v in rows.prices]
+            self._cache["expire"] = [None if v == MISSING else v for v in rows.days_to_expire]
+            ords = {v for v in rows.reg_ordinals if v != MISSING}
+            iso = {o: date.fromordinal(o).isoformat() for o in ords}
+            self._cache["reg_date"] = [iso.get(v, "") for v in rows.reg_ordinals]
+
+    def _col(self, key: str, fn: Callable[[Row], Any]) -> list:
+        col = self._cache.get(key)
+        if col is None:
+            col = self._cache[key] = [fn(r) for r in self.rows]
+        return col
+
+    @property
+    def domain(self) -> List[str]:
+        return self._col("domain", lambda r: (r.get("domain") or "").strip().lower())
+
+    @property
+    def name(self) -> List[str]:
+        col = self._cache.get("name")
+        if col is None:
+            col = self._cache["name"] = [d.split(".", 1)[0] for d in self.domain]
+        return col
+
+    @property
+    def price(self) -> List[Optional[float]]:
+        return self._col("price", lambda r: parse_price(r.get("price")))
+
+    @property
+    def registrar(self) -> List[str]:
+        return self._col("registrar", lambda r: (r.get("registrar") or "").strip())
+
+    @property
+    def reg_date(self) -> List[str]:
+        return self._col("reg_date", lambda r: (r.get("registration_date") or "").strip()[:10])
+
+    @property
+    def expire(self) -> List[Optional[int]]:
+        return self._col("expire", lambda r: parse_int(r.get("days_to_expire")))
+
+
+class Rule:
+    def __init__(
+        self,
+        name: str = "rule",
+        tlds: Iterable[str] = (),
+        length: Range = (None, None),
+        chars: Optional[str] = None,
+        price: Range = (None, None),
+        registrars: Iterable[str] = (),
+        expire: Range = (None, None),
+        age: Range = (None, None),
+        regex: Iterable[str] = (),
+        block_regex: Iterable[str] = (),
+        keywords: Iterable[str] = (),
+        block_keywords: Iterable[str] = (),
+    ):
+        self.name = name
+        self.tlds = frozenset(t.lower() if t.startswith(".") else "." + t.lower() for t in tlds if t)
+        self.length = length
+        if chars and chars not in CHAR_CLASSES:
+            raise ValueError(f"lớp ký tự không hỗ trợ: {chars} (có: {', '.join(CHAR_CLASSES)})")
+        self.chars = chars
+        self._chars_re = re.compile(CHAR_CLASSES[chars]) if chars else None
+        self.price = price
+        self.registrars = frozenset(r.strip() for r in registrars if r)
+        self.expire = expire
+        self.age = age
+        self._regex = [re.compile(p, re.I) for p in regex if p]
+        block = [p for p in block_regex if p]
+        self._block_re = re.compile("|".join(f"(?:{p})" for p in block), re.I) if block else None
+        self._keywords = [k.lower() for k in keywords if k]
+        block_kw = [k.lower() for k in block_keywords if k]
+        self._block_kw_re = re.compile("|".join(re.escape(k) for k in block_kw)) if block_kw else None
+
+    # --- đánh giá theo lô ---------------------------------------------------------
+
+    def _has_tld(self, domain: str) -> bool:
+        tlds = self.tlds
+        i = domain.find(".")
+        while i >= 0:
+            if domain[i:] in tlds:
+                return True
+            i = domain.find(".", i + 1)
+        return False
+
+    def select(self, cols: Columns, idx: List[int]) -> List[int]:
+        """Lọc danh sách chỉ số `idx` (hàng chưa khớp luật nào) -> các chỉ số khớp luật này.
+        Điều kiện rẻ chạy trước, mỗi bước chỉ xét các hàng còn lại."""
+        domain = cols.domain
+        idx = [i for i in idx if domain[i]]
+        if self.tlds and idx:
+            has = self._has_tld
+            idx = [i for i in idx if has(domain[i])]
+        lo, hi = self.length
+        if (lo is not None or hi is not None) and idx:
+            name = cols.name
+            idx = [i for i in idx if _in_range(len(name[i]), lo, hi)]
+        if self.registrars and idx:
+            reg, allowed = cols.registrar, self.registrars
+            idx = [i for i in idx if reg[i] in allowed]
+        lo, hi = self.price
+        if (lo is not None or hi is not None) and idx:
+            price = cols.price
+            idx = [i for i in idx if _in_range(price[i], lo, hi)]
+        lo, hi = self.expire
+        if (lo is not None or hi is not None) and idx:
+            exp = cols.expire
+            idx = [i for i in idx if _in_range(exp[i], lo, hi)]
+        lo, hi = self.age
+        if (lo is not None or hi is not None) and idx:
+            # age trong [lo, hi] ngày <=> ngày đăng ký trong [today-hi, today-lo]: so chuỗi ISO
+            today = date.fromisoformat(cols.today)
+            newest = (today - timedelta(days=lo)).isoformat() if lo is not None else None
+            oldest = (today - timedelta(days=hi)).isoformat() if hi is not None else None
+            reg_date = cols.reg_date
+            idx = [i for i in idx if reg_date[i] and (oldest is None or reg_date[i] >= oldest) and (newest is None or reg_date[i] <= newest)]
+        if self._chars_re is not None and idx:
+            name, fm = cols.name, self._chars_re.fullmatch
+            idx = [i for i in idx if fm(name[i])]
+        for kw in self._keywords:
+            idx = [i for i in idx if kw in domain[i]]
+        if self._block_kw_re is not None and idx:
+            s = self._block_kw_re.search
+            idx = [i for i in idx if not s(domain[i])]
+        for rx in self._regex:
+            idx = [i for i in idx if rx.search(domain[i])]
+        if self._block_re is not None and idx:
+            s = self._block_re.search
+            idx = [i for i in idx if not s(domain[i])]
+        return idx
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r})"
+
+
+class RuleSet:
+    """Danh sách luật theo thứ tự ưu tiên; rỗng = nhận mọi domain."""
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self.rules = list(rules)
+        self.stats: Dict[str, int] = {r.name: 0 for r in self.rules}
+
+    def evaluate(self, rows: Sequence[Row], today: Optional[str] = None) -> List[Optional[str]]:
+        """Tên luật đầu tiên khớp cho từng hàng (None nếu không khớp luật nào)."""
+        cols = Columns(rows, today)
+        if not self.rules:
+            return ["*" if d else None for d in cols.domain]
+        result: List[Optional[str]] = [None] * len(rows)
+        pending = list(range(len(rows)))
+        for rule in self.rules:
+            if not pending:
+                break
+            hit = rule.select(cols, pending)
+            if not hit:
+                continue
+            for i in hit:
+                result[i] = rule.name
+            self.stats[rule.name] = self.stats.get(rule.name, 0) + len(hit)
+            hit_set = set(hit)
+            pending = [i for i in pending if i not in hit_set]
+        return result
+
+    def matches(self, rows: Sequence[Row], today: Optional[str] = None) -> List[Tuple[Row, str]]:
+        return [(r, name) for r, name in zip(rows, self.evaluate(rows, today)) if name is not None]
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+
+# --- cấu hình ------------------------------------------------------------------
+
+def _range(value: Any) -> Range:
+    """[lo, hi] | "lo-hi" | số (= đúng giá trị đó) -> (lo, hi)."""
+    if value is None:
+        return (None, None)
+    if isinstance(value, (int, float)):
+        return (float(value), float(value))
+    if isinstance(value, (list, tuple)):
+        lo = value[0] if len(value) > 0 else None
+        hi = value[1] if len(value) > 1 else None
+        return (float(lo) if lo is not None else None, float(hi) if hi is not None else None)
+    lo, sep, hi = str(value).partition("-")
+    if not sep:
+        return (float(lo), float(lo))
+    return (float(lo) if lo.strip() else None, float(hi) if hi.strip() else None)
+
+
+def _list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
+
+
+def _patterns(value: Any) -> List[str]:
+    # regex có thể chứa dấu phẩy ({2,3}) nên không tách chuỗi như _list
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else [str(v) for v in value]
+
+
+def rule_from_dict(data: Dict[str, Any], default_name: str = "rule") -> Rule:
+    return Rule(
+        name=str(data.get("name") or default_name),
+        tlds=_list(data.get("tld", data.get("tlds"))),
+        length=_range(data.get("len", data.get("length"))),
+        chars=data.get("chars"),
+        price=_range(data.get("price")),
+        registrars=_list(data.get("registrar", data.get("registrars"))),
+        expire=_range(data.get("expire", data.get("days_to_expire"))),
+        age=_range(data.get("age")),
+        regex=_patterns(data.get("re", data.get("regex"))),
+        block_regex=_patterns(data.get("!re", data.get("block_regex"))),
+        keywords=_list(data.get("kw", data.get("keywords"))),
+        block_keywords=_list(data.get("!kw", data.get("block_keywords"))),
+    )
+
+
+_TOKEN_RE = re.compile(r"^(!?[a-z_]+)\s*(<=|>=|=|<|>)\s*(.*)$")
+
+
+def parse_rule(text: str, default_name: str = "rule") -> Rule:
+    """Đọc một luật dạng chuỗi: "[tên:] khóa=giá_trị khóa<=n ..." (xem docstring module)."""
+    text = text.strip()
+    name = default_name
+    head, sep, rest = text.partition(": ")
+    if sep and "=" not in head and "<" not in head and ">" not in head:
+        name, text = head.strip(), rest
+    data: Dict[str, Any] = {"name": name}
+    for token in text.split():
+        if token == "today":
+            data["age"] = [0, 0]
+            continue
+        m = _TOKEN_RE.match(token)
+        if not m:
+            raise ValueError(f"điều kiện không hợp lệ: {token!r}")
+        key, op, value = m.groups()
+        if op != "=":
+            n = float(value)
+            lo, hi = _range(data.get(key))
+            if op in ("<=", "<"):
+                hi = n if op == "<=" else n - (1 if key in ("len", "expire", "age") else 1e-9)
+            else:
+                lo = n if op == ">=" else n + (1 if key in ("len", "expire", "age") else 1e-9)
+            data[key] = [lo, hi]
+        elif key in ("re", "!re"):
+            data.setdefault(key, []).append(value)
+        else:
+            data[key] = value
+    return rule_from_dict(data, name)
+
+
+def read_rule_specs(path: str) -> List[Any]:
+    """File JSON: danh sách luật (dict hoặc chuỗi) hoặc {"rules": [...]}."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules") or []
+    return list(data)
+
+
+def load_rules(path: str) -> RuleSet:
+    return compile_rules(read_rule_specs(path))
+
+
+def compile_rules(specs: Iterable[Any]) -> RuleSet:
+    rules: List[Rule] = []
+    for n, spec in enumerate(specs, 1):
+        default_name = f"rule{n}"
+        rules.append(parse_rule(spec, default_name) if isinstance(spec, str) else rule_from_dict(spec, default_name))
+    return RuleSet(rules)
+
+
+def simple_rules(tld: str = "", only_today: bool = False) -> RuleSet:
+    """Bộ lọc cũ của botte.py (hậu tố --tld, --only-today) dưới dạng một luật."""
+    return RuleSet([Rule(name=f"tld{tld}" if tld else "all", tlds=[tld] if tld else (), age=(0, 0) if only_today else (None, None))])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+scheduler.py
+
+Bộ lập lịch poll thích ứng cho botte.monitor: thay vì ngủ cố định `interval` giây, ước lượng
+tốc độ xuất hiện domain mới (EWMA, domain/giây) rồi chọn khoảng chờ sao cho mỗi lần poll
+bắt được khoảng `target_per_poll` domain mới, trong khoảng [min_interval, max_interval].
+- Không có domain mới: giãn dần khoảng chờ (x idle_growth).
+- Lỗi tải: backoff lũy thừa theo số lỗi liên tiếp.
+- Profile theo giờ trong ngày, ví dụ "08-20:15-120" = từ 8h đến 20h dùng khoảng 15..120 giây.
+explain() trả về khoảng chờ hiện tại kèm lý do để tinh chỉnh.
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# (giờ bắt đầu, giờ kết thúc, min_interval, max_interval); giờ kết thúc < bắt đầu = qua nửa đêm
+Profile = Tuple[int, int, float, float]
+
+
+def parse_profiles(spec: Optional[str]) -> List[Profile]:
+    """Đọc chuỗi "HH-HH:min-max[,HH-HH:min-max...]" thành danh sách profile."""
+    out: List[Profile] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        hours, _, bounds = part.partition(":")
+        h1, _, h2 = hours.partition("-")
+        lo, _, hi = bounds.partition("-")
+        try:
+            out.append((int(h1) % 24, int(h2) % 24, float(lo), float(hi)))
+        except ValueError:
+            raise ValueError(f"profile không hợp lệ: {part!r} (dạng HH-HH:min-max)")
+    return out
+
+
+def _in_hours(hour: int, start: int, end: int) -> bool:
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class AdaptiveScheduler:
+    def __init__(
+        self,
+        base_interval: float = 60.0,
+        min_interval: float = 10.0,
+        max_interval: float = 600.0,
+        target_per_poll: float = 1.0,
+        alpha: float = 0.3,
+        idle_growth: float = 1.5,
+        error_backoff: float = 2.0,
+        profiles: Optional[List[Profile]] = None,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.target_per_poll = target_per_poll
+        self.alpha = alpha
+        self.idle_growth = idle_growth
+        self.error_backoff = error_backoff
+        self.profiles = profiles or []
+        self.rate: Optional[float] = None  # domain mới / giây (EWMA)
+        self.errors = 0  # số lỗi liên tiếp
+        lo, hi, _ = self._bounds()
+        self.interval = self._clamp(base_interval, lo, hi)
+        self.reason = "khởi tạo"
+        self._last_ts: Optional[float] = None
+
+    def _bounds(self, now: Optional[float] = None) -> Tuple[float, float, Optional[str]]:
+        hour = datetime.fromtimestamp(time.time() if now is None else now).hour
+        for start, end, lo, hi in self.profiles:
+            if _in_hours(hour, start, end):
+                return lo, max(hi, lo), f"{start:02d}-{end:02d}"
+        return self.min_interval, self.max_interval, None
+
+    @staticmethod
+    def _clamp(value: float, lo: float, hi: float) -> float:
+        return max(lo, min(hi, value))
+
+    def record(self, new_count: int, error: bool = False, now: Optional[float] = None) -> float:
+        """Ghi nhận kết quả một vòng poll, trả về khoảng chờ (giây) trước vòng kế tiếp."""
+        now = time.time() if now is None else now
+        lo, hi, profile = self._bounds(now)
+        elapsed = now - self._last_ts if self._last_ts is not None else None
+        self._last_ts = now
+
+        if error:
+            self.errors += 1
+            self.interval = self._clamp(self.interval * self.error_backoff, lo, hi)
+            self.reason = f"lỗi tải liên tiếp x{self.errors} -> backoff x{self.error_backoff:g}"
+        else:
+            self.errors = 0
+            if elapsed and elapsed > 0:
+                sample = new_count / elapsed
+                self.rate = sample if self.rate is None else self.alpha * sample + (1 - self.alpha) * self.rate
+            if new_count == 0 and (self.rate is None or self.rate * self.interval < self.target_per_poll):
+                self.interval = self._clamp(self.interval * self.idle_growth, lo, hi)
+                self.reason = f"không có mục mới -> giãn x{self.idle_growth:g}"
+            elif self.rate:
+                self.interval = self._clamp(self.target_per_poll / self.rate, lo, hi)
+                self.reason = f"tốc độ ~{self.rate * 60:.2f}/phút, mục tiêu {self.target_per_poll:g}/lần poll"
+            else:
+                self.interval = self._clamp(self.interval, lo, hi)
+                self.reason = "chưa đủ dữ liệu"
+        if profile:
+            self.reason += f" [profile {profile}: {lo:g}-{hi:g}s]"
+        return self.interval
+
+    def explain(self) -> Dict[str, object]:
+        lo, hi, profile = self._bounds()
+        return {
+            "interval": round(self.interval, 2),
+            "reason": self.reason,
+            "rate_per_min": round(self.rate * 60, 4) if self.rate is not None else None,
+            "consecutive_errors": self.errors,
+            "min_interval": lo,
+            "max_interval": hi,
+            "profile": profile,
+        }
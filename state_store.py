@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+state_store.py
+
+Kho lưu các domain đã gửi (dedupe) cho botte.py, thay cho việc ghi lại toàn bộ sent_state.json
+mỗi vòng.
+
+Backend:
+  - "sqlite": SQLite ở chế độ WAL, khóa chính là domain -> kiểm tra tồn tại qua index,
+              thêm theo lô trong một transaction. (mặc định)
+  - "log":    file append-only, mỗi dòng "domain<TAB>timestamp"; nạp vào dict khi mở,
+              ghi thêm + fsync theo lô, dòng ghi dở khi crash sẽ bị bỏ qua.
+  - "json":   định dạng cũ (list domain), chỉ ghi lại khi có thay đổi, ghi file tạm rồi os.replace.
+
+Khi mở backend sqlite/log từ đường dẫn .json, dữ liệu JSON cũ (dạng list hoặc {"sent": [...]})
+được chuyển sang một lần và file JSON giữ nguyên.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set
+
+import metrics
+
+BACKENDS = ("sqlite", "log", "json")
+
+_DOMAIN_RE = re.compile(r"([a-z0-9-]+(?:\.[a-z0-9-]+)+)", re.I)
+
+
+def _extract_domain(s: str) -> Optional[str]:
+    # Tìm chuỗi có dạng domain ở cuối hoặc trong chuỗi
+    m = _DOMAIN_RE.search(s)
+    return m.group(1).strip().lower() if m else None
+
+
+def read_json_state(path: str) -> Set[str]:
+    """Đọc sent_state.json (list hoặc {"sent": [...]}) thành set domain lowercase."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return set()
+    raw_list: list = []
+    if isinstance(data, list):
+        raw_list = data
+    elif isinstance(data, dict) and isinstance(data.get("sent"), list):
+        raw_list = data["sent"]
+    out: Set[str] = set()
+    for x in raw_list:
+        if not isinstance(x, str):
+            continue
+        d = _extract_domain(x)
+        if d:
+            out.add(d)
+    return out
+
+
+def write_json_state(path: str, keys: Iterable[str]) -> None:
+    """Ghi set domain ra JSON an toàn khi crash (file tạm + os.replace)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sorted(keys), f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class StateStore(ABC):
+    """Giao diện chung: `domain in store`, add_many(), len(), flush(), prune(), close()."""
+
+    retention: Optional[float] = None  # giây; None = giữ vĩnh viễn
+
+    @abstractmethod
+    def __contains__(self, domain: str) -> bool:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def add_many(self, domains: Iterable[str], now: Optional[float] = None) -> int:
+        """Thêm một lô domain, trả về số domain thực sự mới."""
+
+    def update(self, domains: Iterable[str]) -> None:
+        self.add_many(domains)
+
+    def flush(self) -> None:
+        pass
+
+    def prune(self, max_age: Optional[float] = None, now: Optional[float] = None) -> int:
+        """Xóa domain gửi cách đây quá `max_age` giây (mặc định: retention). Trả về số bản ghi bị xóa."""
+        return 0
+
+    def close(self) -> None:
+        self.flush()
+
+
+class JsonStateStore(StateStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._keys = read_json_state(path)
+        self._dirty = False
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add_many(self, domains: Iterable[str], now: Optional[float] = None) -> int:
+        with metrics.span("state.add"):
+            before = len(self._keys)
+            self._keys.update(d for d in domains if d)
+            added = len(self._keys) - before
+            self._dirty = self._dirty or added > 0
+            return added
+
+    def flush(self) -> None:
+        if self._dirty:
+            with metrics.span("state.flush"):
+                write_json_state(self.path, self._keys)
+            self._dirty = False
+
+
+class LogStateStore(StateStore):
+    def __init__(self, path: str, retention: Optional[float] = None):
+        self.path = path
+        self.retention = retention
+        self._seen: Dict[str, float] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # dòng ghi dở lúc crash
+                    domain, _, ts = line.rstrip("\n").partition("\t")
+                    if domain:
+                        try:
+                            self._seen.setdefault(domain, float(ts))
+                        except ValueError:
+                            self._seen.setdefault(domain, 0.0)
+            # Cắt bỏ phần ghi dở để các dòng sau không bị dính vào
+            with open(path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size:
+                    f.seek(max(0, size - 1))
+                    if f.read(1) != b"\n":
+                        f.seek(0)
+                        data = f.read()
+                        f.truncate(data.rfind(b"\n") + 1)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add_many(self, domains: Iterable[str], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        lines: List[str] = []
+        for d in domains:
+            if d and d not in self._seen:
+                self._seen[d] = now
+                lines.append(f"{d}\t{now:.0f}\n")
+        if lines:
+            with metrics.span("state.add"):
+                self._f.write("".join(lines))
+                self._f.flush()
+                os.fsync(self._f.fileno())
+        return len(lines)
+
+    def compact(self) -> None:
+        """Ghi lại log chỉ với các domain còn giữ (file tạm + os.replace)."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for d, ts in self._seen.items():
+                f.write(f"{d}\t{ts:.0f}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._f.close()
+        os.replace(tmp, self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def prune(self, max_age: Optional[float] = None, now: Optional[float] = None) -> int:
+        max_age = self.retention if max_age is None else max_age
+        if not max_age:
+            return 0
+        cutoff = (time.time() if now is None else now) - max_age
+        old = [d for d, ts in self._seen.items() if ts < cutoff]
+        for d in old:
+            del self._seen[d]
+        if old:
+            self.compact()
+        return len(old)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class SqliteStateStore(StateStore):
+    def __init__(self, path: str, retention: Optional[float] = None):
+        self.path = path
+        self.retention = retention
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sent (domain TEXT PRIMARY KEY, first_sent REAL NOT NULL) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sent_first_sent ON sent (first_sent)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._count = self._db.execute("SELECT COUNT(*) FROM sent").fetchone()[0]
+
+    def __contains__(self, domain: str) -> bool:
+        return self._db.execute("SELECT 1 FROM sent WHERE domain = ?", (domain,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add_many(self, domains: Iterable[str], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        batch = [(d, now) for d in dict.fromkeys(domains) if d]
+        if not batch:
+            return 0
+        before = self._db.total_changes
+        with metrics.span("state.add"), self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR IGNORE INTO sent (domain, first_sent) VALUES (?, ?)", batch)
+        added = self._db.total_changes - before
+        self._count += added
+        return added
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def prune(self, max_age: Optional[float] = None, now: Optional[float] = None) -> int:
+        max_age = self.retention if max_age is None else max_age
+        if not max_age:
+            return 0
+        cutoff = (time.time() if now is None else now) - max_age
+        removed = self._db.execute("DELETE FROM sent WHERE first_sent < ?", (cutoff,)).rowcount
+        self._count -= removed
+        return removed
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _store_path(path: str, backend: str) -> str:
+    base, ext = os.path.splitext(path)
+    if backend == "sqlite" and ext.lower() not in (".sqlite3", ".sqlite", ".db"):
+        return base + ".sqlite3"
+    if backend == "log" and ext.lower() != ".log":
+        return base + ".log"
+    return path
+
+
+def open_state_store(path: str, backend: str = "sqlite", retention_days: Optional[float] = None) -> StateStore:
+    """Mở kho state. Với sqlite/log, `path` dạng .json được đổi đuôi và dữ liệu JSON cũ
+    được chuyển sang đúng một lần (file JSON không bị xóa)."""
+    backend = (backend or "sqlite").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"state backend không hỗ trợ: {backend} (có: {', '.join(BACKENDS)})")
+    if backend == "json":
+        return JsonStateStore(path)
+
+    retention = retention_days * 86400 if retention_days else None
+    store_path = _store_path(path, backend)
+    fresh = not os.path.exists(store_path)
+    store: StateStore = SqliteStateStore(store_path, retention) if backend == "sqlite" else LogStateStore(store_path, retention)
+
+    json_path = path if path.lower().endswith(".json") else None
+    if json_path and os.path.exists(json_path):
+        if isinstance(store, SqliteStateStore):
+            need = store.get_meta("migrated_from") is None
+        else:
+            need = fresh
+        if need:
+            added = store.add_many(sorted(read_json_state(json_path)))
+            if isinstance(store, SqliteStateStore):
+                store.set_meta("migrated_from", os.path.abspath(json_path))
+            print(f"[state] đã chuyển {added} domain từ {json_path} sang {store_path}")
+    store.prune()
+    return store
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+synthetic.py
+
+Sinh HTML giả lập trang am.22.cn/ykj/ (bảng 一口价) và trang chi tiết chujia_<id>.html, đúng
+cấu trúc markup thật (checkbox chkDomain với data-*, các cột 名称/简介/注册商/当前价格/剩余时间/
+注册时间/距到期). Dùng cho benchmark parser (bench_parsers.py) và server giả lập khi load test (mock_server.py).
+"""
+from __future__ import annotations
+
+import random
+import string
+from datetime import date, timedelta
+from html import escape
+from typing import Dict, Iterable, List, Optional
+
+TLDS = (".com", ".cn", ".net", ".com.cn", ".top", ".xyz", ".cc")
+REGISTRARS = ("爱名网", "爱名网", "爱名网", "阿里云", "西部数码")
+
+LISTING_HEAD = """<table border="0" cellspacing="0" cellpadding="0" class="paimai-tb zhuanti-tb">
+<thead>
+<tr>
+<th></th>
+<th><font>名称</font></th>
+<th class="none">简介<span style="font-size:12px;color:gray;">（数据仅供参考，价值请自行判断）</span></th>
+<th class="none">注册商</th>
+<th id="price" class="td_click" order=""><font class="orangea">当前价格</font><span class="sortable"></span></th>
+<th id="enddate" class="td_click none td_clickesa" order="a"><font class="orangea">剩余时间</font><span class="sortable"></span></th>
+<th id="registerdate" class="td_click none" order=""><font class="orangea">注册时间</font><span class="sortable"></span></th>
+<th id="rexpiredate" class="td_click none" order=""><font class="orangea">距到期</font><span class="sortable"></span></th>
+<th>操作</th>
+</tr>
+</thead>
+<tbody id="buynow_list">"""
+
+
+def make_row(i: int, seed: int = 0, start_id: int = 31000000, today: Optional[date] = None) -> Dict[str, object]:
+    """Listing thứ `i` của catalogue, chỉ phụ thuộc (seed, i) -> sinh lười được cả triệu mục."""
+    rng = random.Random(seed * 10_000_019 + i)
+    today = today or date(2025, 9, 1)
+    name_len = rng.randint(3, 10)
+    alphabet = string.ascii_lowercase + (string.digits if rng.random() < 0.5 else "")
+    name = "".join(rng.choice(alphabet) for _ in range(name_len))
+    reg = today - timedelta(days=rng.randint(0, 3650))
+    return {
+        "id": start_id + i,
+        "domain": f"{name}{i}{rng.choice(TLDS)}",
+        "price": rng.choice((8, 16, 29, 88, 99, 188, 388, 888, 1888)),
+        "registrar": rng.choice(REGISTRARS),
+        "time_left": f"{rng.randint(0, 23)}时{rng.randint(0, 59)}分",
+        "registration_date": reg.isoformat(),
+        "days_to_expire": rng.randint(1, 365),
+    }
+
+
+def make_rows(n: int, seed: int = 0, start_id: int = 31000000, today: Optional[date] = None) -> List[Dict[str, object]]:
+    """Sinh `n` listing ngẫu nhiên (tái lập được theo `seed`)."""
+    return [make_row(i, seed, start_id, today) for i in range(n)]
+
+
+def listing_row(r: Dict[str, object], host: str = "//am.22.cn") -> str:
+    """Một <tr> giống hệt markup thật của tbody#buynow_list (`host`: gốc của link chi tiết)."""
+    lid = r["id"]
+    dom = escape(str(r["domain"]))
+    return (
+        f'<tr><td><input name="chkDomain" type="checkbox" value="{lid}" data-url="/ykj/chujia_{lid}.html" '
+        f'data-domain="{dom}" data-price="￥{r["price"]}" style="margin-right:3px" data-isdaiguan="0" data-istg="0" '
+        f'onchange="ChangeCheckDomain()"></td> <td style="text-indent:0px"><a class="blue a-price-title" '
+        f'href="{host}/ykj/chujia_{lid}.html" target="_blank">{dom}</a><div class="small-list-text-2"></div></td>'
+        f'<td class="none"><div class="list-tit" title=""></div></td> <td class="none">{escape(str(r["registrar"]))}</td>'
+        f'<td>￥{r["price"]}</td><td class="none">{escape(str(r["time_left"]))}</td>'
+        f'<td class="none">{r["registration_date"]}</td><td class="none">{r["days_to_expire"]}天</td>'
+        f'<td><a class="bnt" target="_blank" href="{host}/ykj/chujia_{lid}.html">购买</a>'
+        f'<a class="bnt ml5 small-none" onclick="concern({lid},2)">关注</a></td></tr>'
+    )
+
+
+def render_listing(rows: Iterable[Dict[str, object]], page: int = 1, page_count: int = 1, charset: str = "utf-8", host: str = "//am.22.cn") -> str:
+    """Trang danh sách đầy đủ: header, bảng, thanh phân trang "共N页"."""
+    body = "".join(listing_row(r, host) for r in rows)
+    pager = " ".join(f'<a href="?page={p}">{p}</a>' for p in range(max(1, page - 2), min(page_count, page + 2) + 1))
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="{charset}"><title>一口价域名_爱名网</title></head><body>'
+        f'<div class="top"><a href="https://www.22.cn/">爱名网</a></div>'
+        f"{LISTING_HEAD}{body}</tbody></table>"
+        f'<div class="pager">共{page_count}页 {pager}</div></body></html>'
+    )
+
+
+def render_detail(r: Dict[str, object]) -> str:
+    """Trang chi tiết chujia_<id>.html rút gọn với các nhãn mà api.parse_domain_details tìm."""
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{escape(str(r["domain"]))} 一口价</title></head><body>'
+        f'<div class="crumbs"><a href="//am.22.cn/ykj/">一口价</a> &gt; {escape(str(r["domain"]))}</div>'
+        f'<h1 class="domain">{escape(str(r["domain"]))}</h1>'
+        f'<ul class="info"><li>当前价格：<b class="orangea">￥{r["price"]}</b></li>'
+        f'<li>注册商：{escape(str(r["registrar"]))}</li>'
+        f'<li>注册时间：{r["registration_date"]}</li>'
+        f'<li>剩余时间：{escape(str(r["time_left"]))}</li>'
+        f'<li>距到期：{r["days_to_expire"]}天</li></ul>'
+        f'<a class="bnt" href="javascript:void(0)">立即购买</a></body></html>'
+    )
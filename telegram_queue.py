@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+telegram_queue.py
+
+Hàng đợi gửi Telegram chạy nền cho botte.py:
+- Một luồng gửi riêng dùng requests.Session (giữ kết nối tới api.telegram.org).
+- Gộp danh sách domain thành các tin nhắn sát giới hạn 4096 ký tự của Telegram.
+- Giới hạn tốc độ bằng token bucket, tôn trọng `retry_after` khi bị 429.
+- Tin chưa gửi được lưu trong SQLite (outbox) nên vẫn còn sau khi khởi động lại.
+Vòng lặp scrape chỉ enqueue() rồi đi tiếp, không bao giờ chờ gửi.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+TELEGRAM_LIMIT = 4096
+REQUEST_TIMEOUT = (10, 20)  # (kết nối, đọc) giây cho một lần gọi sendMessage
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+
+
+def pack_lines(title: str, lines: Iterable[str], limit: int = TELEGRAM_LIMIT) -> List[str]:
+    """Gộp các dòng thành ít tin nhắn nhất, mỗi tin "<title>\\n<dòng>..." không quá `limit` ký tự."""
+    messages: List[str] = []
+    cur: List[str] = [title]
+    size = len(title)
+    for line in lines:
+        line = line[: limit - len(title) - 1]
+        if len(cur) > 1 and size + 1 + len(line) > limit:
+            messages.append("\n".join(cur))
+            cur, size = [title], len(title)
+        cur.append(line)
+        size += 1 + len(line)
+    if len(cur) > 1:
+        messages.append("\n".join(cur))
+    return messages
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 1e-6)  # token/giây
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.ts = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Số giây cần chờ để có 1 token (0 nếu lấy được ngay; khi đó token bị trừ)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Chặn cấp token trong `seconds` giây (dùng khi server trả retry_after)."""
+        self.tokens = 0.0
+        self.ts = time.monotonic() + seconds
+
+
+class TelegramSender:
+    """Gửi tin nhắn Telegram qua hàng đợi bền vững, chạy trên một luồng nền."""
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        spool_path: str,
+        rate: float = 1.0,
+        burst: int = 3,
+        max_attempts: int = 8,
+        api_base: Optional[str] = None,
+    ):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_base = (api_base or API_BASE).rstrip("/")
+        self.max_attempts = max_attempts
+        self.bucket = TokenBucket(rate, burst)
+        self.stats: Dict[str, int] = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        os.makedirs(os.path.dirname(spool_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(spool_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chat_id TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " not_before REAL NOT NULL DEFAULT 0)"
+        )
+
+    # --- phía producer -------------------------------------------------------
+
+    def enqueue(self, text: str, chat_id: Optional[str] = None) -> None:
+        self.enqueue_many([text], chat_id)
+
+    def enqueue_many(self, texts: Iterable[str], chat_id: Optional[str] = None) -> None:
+        now = time.time()
+        rows = [(str(chat_id or self.chat_id), t, now) for t in texts if t]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT INTO outbox (chat_id, text, created) VALUES (?, ?, ?)", rows)
+            self.stats["enqueued"] += len(rows)
+        self._wake.set()
+
+    def enqueue_domains(self, domains: List[str], title: str = "New domain found:", chat_id: Optional[str] = None) -> int:
+        """Gộp domain thành các tin ≤ 4096 ký tự rồi đưa vào hàng đợi. Trả về số tin."""
+        messages = pack_lines(title, domains)
+        self.enqueue_many(messages, chat_id)
+        return len(messages)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    # --- luồng gửi -------------------------------------------------------------
+
+    def start(self) -> "TelegramSender":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+            self._thread.start()
+            if self.pending():
+                self._wake.set()  # còn tin tồn từ lần chạy trước
+        return self
+
+    def stop(self, drain_timeout: float = 0.0) -> None:
+        """Dừng luồng gửi; chờ tối đa `drain_timeout` giây cho hàng đợi rỗng. Tin còn lại giữ trong outbox.
+        Lần gửi đang dở được chờ xong (quá lâu thì luồng gửi tự đóng outbox khi thoát), nên tin đã gửi
+        luôn được xóa khỏi outbox, không bị gửi lại ở lần chạy sau."""
+        deadline = time.monotonic() + drain_timeout
+        while drain_timeout > 0 and self.pending() and time.monotonic() < deadline:
+            self._wake.set()
+            time.sleep(0.1)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=sum(REQUEST_TIMEOUT) + 5)
+            if self._thread.is_alive():
+                return
+        self._close()
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._db.close()
+        self._session.close()
+
+    def _next(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, chat_id, text, attempts, not_before FROM outbox ORDER BY not_before, id LIMIT 1"
+            ).fetchone()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                row = self._next()
+                if row is None:
+                    self._wake.wait(5)
+                    self._wake.clear()
+                    continue
+                msg_id, chat_id, text, attempts, not_before = row
+                wait = not_before - time.time()
+                if wait <= 0:
+                    wait = self.bucket.wait_time()
+                if wait > 0:
+                    self._wake.wait(min(wait, 5))
+                    self._wake.clear()
+                    continue
+                self._deliver(msg_id, chat_id, text, attempts)
+        finally:
+            if self._stop.is_set():
+                self._close()
+
+    def _deliver(self, msg_id: int, chat_id: str, text: str, attempts: int) -> None:
+        api = f"{self.api_base}/bot{self.token}/sendMessage"
+        retry_after: Optional[float] = None
+        permanent = False
+        if attempts:
+            metrics.inc("telegram_retries")
+        try:
+            with metrics.span("telegram.send"):
+                resp = self._session.post(api, data={"chat_id": chat_id, "text": text}, timeout=REQUEST_TIMEOUT)
+            try:
+                payload = resp.json()
+            except Exception:
+                payload = {}
+            if 200 <= resp.status_code < 300 and payload.get("ok", True):
+                with self._lock:
+                    self._db.execute("DELETE FROM outbox WHERE id = ?", (msg_id,))
+                    self.stats["sent"] += 1
+                metrics.inc("telegram_sent")
+                print(f"[send] status={resp.status_code} ok=True text={(text[:60] + '...') if len(text)>60 else text}")
+                return
+            if resp.status_code == 429:
+                self.stats["rate_limited"] += 1
+                metrics.inc("telegram_rate_limited")
+                retry_after = float((payload.get("parameters") or {}).get("retry_after") or resp.headers.get("Retry-After") or 5)
+                self.bucket.pause(retry_after)
+            else:
+                metrics.inc("telegram_errors")
+                # 4xx: lỗi do nội dung/chat_id, gửi lại cũng vô ích
+                permanent = 400 <= resp.status_code < 500
+            print(f"[send] status={resp.status_code} ok=False desc={payload.get('description', '')}")
+        except Exception as e:
+            metrics.inc("telegram_errors")
+            print(f"[send] exception when sending message: {type(e).__name__}")
+
+        attempts += 1
+        with self._lock:
+            if permanent or (retry_after is None and attempts >= self.max_attempts):
+                self._db.execute("DELETE FROM outbox WHERE id = ?", (msg_id,))
+                self.stats["dropped"] += 1
+                return
+            self.stats["failed"] += 1
+            if retry_after is not None:
+                # 429: token bucket đã bị chặn retry_after giây; giữ nguyên thứ tự tin và không tính lần thử
+                return
+            # Lỗi mạng/5xx: backoff lũy thừa cho riêng tin này
+            delay = min(300.0, 2.0 ** attempts)
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, not_before = ? WHERE id = ?",
+                (attempts, time.time() + delay, msg_id),
+            )
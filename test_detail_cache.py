@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Kiểm tra TTL theo từng trường của detail_cache.DetailCache."""
+from __future__ import annotations
+
+import os
+
+from detail_cache import FIELD_TTLS, DetailCache
+
+_DETAILS = {
+    "domain": "abc.com", "price": "88", "registrar": "爱名网", "registration_date": "2021-08-22",
+    "time_left": "2时43分", "days_to_expire": "1天",
+}
+
+
+def _cache(tmp_path) -> DetailCache:
+    cache = DetailCache(os.path.join(str(tmp_path), "details.sqlite3"))
+    cache.put(1, _DETAILS, now=1000.0)
+    return cache
+
+
+def test_stale_price_not_returned(tmp_path):
+    cache = _cache(tmp_path)
+    later = 1000.0 + FIELD_TTLS["price"] + 1
+    hit = cache.get(1, ("domain", "registration_date"), now=later)
+    assert hit["domain"] == "abc.com" and hit["registration_date"] == "2021-08-22"
+    assert hit["price"] is None and hit["time_left"] is None
+    assert hit["registrar"] == "爱名网"
+
+
+def test_fresh_fields_returned(tmp_path):
+    cache = _cache(tmp_path)
+    hit = cache.get(1, ("domain", "price"), now=1000.0 + 30)
+    assert hit["price"] == "88" and hit["time_left"] == "2时43分"
+
+
+def test_requested_stale_price_is_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get(1, ("domain", "price"), now=1000.0 + FIELD_TTLS["price"] + 1) is None
+    assert cache.stats["expired"] == 1
+
+
+def test_empty_domain_not_cached(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put(2, dict(_DETAILS, domain=""), now=1000.0)
+    assert cache.get(2, now=1000.0) is None and cache.stats["skipped"] == 1
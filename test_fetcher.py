@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Kiểm tra máy trạng thái circuit breaker của fetcher.py (không cần mạng)."""
+from __future__ import annotations
+
+import json
+
+import pytest
+import requests
+
+import fetcher
+import json_api
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _Resp:
+    def __init__(self, status: int):
+        self.status_code = status
+        self.reason = "X"
+        self.headers: dict = {}
+
+    def close(self) -> None:
+        pass
+
+
+class _Session:
+    """Trả lần lượt các kết quả đã định: mã HTTP (int) hoặc exception."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        out = self.outcomes.pop(0)
+        if isinstance(out, BaseException):
+            raise out
+        return _Resp(out)
+
+
+def _setup(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(fetcher.time, "monotonic", clock)
+    monkeypatch.setattr(fetcher.time, "sleep", lambda s: None)
+    monkeypatch.setattr(fetcher, "RETRIES", 0)
+    monkeypatch.setattr(fetcher, "HEDGE_AFTER", None)
+    fetcher.reset()
+    return clock
+
+
+def _open_breaker(clock: _Clock, url: str) -> fetcher.CircuitBreaker:
+    session = _Session(*[requests.ConnectionError("down")] * fetcher.BREAKER_FAILURES)
+    for _ in range(fetcher.BREAKER_FAILURES):
+        fetcher.request(session, url, {})
+    breaker = fetcher._host(url).breaker
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h1/ykj/"
+    _open_breaker(clock, url)
+    session = _Session()
+    resp, err = fetcher.request(session, url, {})
+    assert resp is None and err.kind == "circuit_open"
+    assert session.calls == 0
+
+
+def test_half_open_probe_success_closes(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h2/ykj/"
+    breaker = _open_breaker(clock, url)
+    clock.now += breaker.cooldown
+    resp, err = fetcher.request(_Session(200), url, {})
+    assert err is None and breaker.state == "closed"
+
+
+def test_half_open_probe_failure_reopens_with_longer_cooldown(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h3/ykj/"
+    breaker = _open_breaker(clock, url)
+    first = breaker.cooldown
+    clock.now += first
+    fetcher.request(_Session(503), url, {})
+    assert breaker.state == "open" and breaker.cooldown == min(first * 2, fetcher.BREAKER_MAX_COOLDOWN)
+
+
+def test_half_open_probe_4xx_closes(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h4/ykj/"
+    breaker = _open_breaker(clock, url)
+    clock.now += breaker.cooldown
+    resp, err = fetcher.request(_Session(404), url, {})
+    assert err.kind == "http_4xx" and breaker.state == "closed"
+    session = _Session(200)
+    resp, err = fetcher.request(session, url, {})
+    assert err is None and session.calls == 1
+
+
+def test_abandoned_probe_releases_slot(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h5/ykj/"
+    breaker = _open_breaker(clock, url)
+    clock.now += breaker.cooldown
+    assert breaker.allow()  # lượt thử half-open ...
+    assert not breaker.allow()  # ... chỉ một lượt
+    breaker.release()  # bị bỏ vì hết hạn chót
+    session = _Session(200)
+    resp, err = fetcher.request(session, url, {})
+    assert err is None and breaker.state == "closed"
+
+
+def test_4xx_does_not_open_breaker(monkeypatch):
+    clock = _setup(monkeypatch)
+    url = "http://h6/ykj/"
+    session = _Session(*[404] * (fetcher.BREAKER_FAILURES * 2))
+    for _ in range(fetcher.BREAKER_FAILURES * 2):
+        fetcher.request(session, url, {})
+    assert fetcher._host(url).breaker.state == "closed"
+
+
+class _JsonResp(_Resp):
+    def __init__(self, payload: dict):
+        super().__init__(200)
+        self.headers = {"Content-Type": "application/json"}
+        self.text = json.dumps(payload)
+        self.content = self.text.encode("utf-8")
+
+
+class _JsonSession(_Session):
+    def __init__(self, *outcomes):
+        super().__init__(*outcomes)
+        self.requests: list = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, kwargs.get("params"), kwargs.get("data")))
+        out = self.outcomes[0]
+        if isinstance(out, dict):
+            self.outcomes.pop(0)
+            self.calls += 1
+            return _JsonResp(out)
+        return super().request(method, url, **kwargs)
+
+
+def test_json_endpoint_goes_through_breaker(monkeypatch):
+    clock = _setup(monkeypatch)
+    endpoint = {"method": "POST", "url": "http://h7/ykj/list", "post_params": {"page": "1"}}
+    session = _JsonSession({"data": [{"domain": "abc.com", "price": "88"}]})
+    rows = json_api.query_listing(endpoint, session=session, page=2)
+    assert rows[0]["domain"] == "abc.com"
+    assert session.requests == [("POST", {}, {"page": "2"})]
+    _open_breaker(clock, endpoint["url"])
+    session = _JsonSession()
+    with pytest.raises(requests.RequestException, match="circuit_open"):
+        json_api.query_listing(endpoint, session=session)
+    assert session.calls == 0
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Listing / ListingBatch phải trả lại đúng chuỗi của hàng gốc qua phần tương thích dict."""
+from __future__ import annotations
+
+from listing import Listing, ListingBatch
+
+ROWS = [
+    {"domain": "a.com", "summary": None, "registrar": "爱名网", "price": "￥1,888", "time_left": "1天",
+     "registration_date": "2021-08-22", "days_to_expire": "1天", "detail_url": "//am.22.cn/ykj/chujia_1.html"},
+    {"domain": "b.com", "summary": "", "registrar": "爱名网", "price": "￥88.5", "time_left": "15分钟20秒",
+     "registration_date": "2021-08-22 10:00", "days_to_expire": "219天", "detail_url": "//am.22.cn/ykj/chujia_2.html"},
+    {"domain": "c.com", "summary": "", "registrar": "爱名网", "price": "￥88", "time_left": "2时43分",
+     "registration_date": "2021-08-22", "days_to_expire": "219天", "detail_url": "//am.22.cn/ykj/chujia_3.html"},
+]
+
+
+def test_listing_round_trip_keeps_raw_strings():
+    for row in ROWS:
+        assert Listing.from_row(row).to_dict() == row
+
+
+def test_typed_values_are_parsed():
+    a, b, c = (Listing.from_row(r) for r in ROWS)
+    assert (a.price, a.time_left_s) == (1888, 86400)
+    assert (b.price, b.time_left_s) == (88, 15 * 60 + 20)
+    assert c.raw is None  # hàng đúng dạng chuẩn không giữ thêm chuỗi nào
+
+
+def test_batch_round_trip():
+    batch = ListingBatch(ROWS)
+    assert batch.to_rows() == ROWS
+    assert list(batch.prices) == [1888, 88, 88]
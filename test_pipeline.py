@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Chế độ --workers (pipeline.py) phải ra đúng các hàng như đường parse tuần tự, kể cả với giá /
+thời gian còn lại không ở dạng chuẩn ("￥1,888.5", "1天", "15分钟20秒")."""
+from __future__ import annotations
+
+import os
+
+from parsers import parse_listing
+from pipeline import ParsePipeline, _parse_chunk
+
+URL = "https://am.22.cn/ykj/"
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "listing_noncanonical.html")
+
+
+def _body() -> bytes:
+    with open(FIXTURE, "rb") as f:
+        return f.read()
+
+
+def _serial_rows():
+    return parse_listing(_body().decode("utf-8"), URL)
+
+
+def test_parse_chunk_matches_serial_rows():
+    batch = _parse_chunk("listing", None, [(URL, "text/html; charset=utf-8", _body())])[0]
+    rows = _serial_rows()
+    assert [r["price"] for r in rows] == ["￥1,888.5", "￥16"]
+    assert batch.to_rows() == rows
+
+
+def test_pipeline_matches_serial_rows():
+    body = _body()
+    with ParsePipeline(workers=2, fetch_concurrency=2) as pipe:
+        batches = list(pipe.map("listing", range(3), lambda i: (URL, "text/html; charset=utf-8", body)))
+    assert [b.to_rows() for b in batches] == [_serial_rows()] * 3